@@ -4,18 +4,42 @@ Integra Appium/Selenium con el frontend React.
 """
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional
+from fastapi.responses import FileResponse, Response
+from pydantic import BaseModel, TypeAdapter, ValidationError, field_validator
+from typing import Optional, Union
 import asyncio
 import json
 import logging
+import math
+import os
 import traceback
 import threading
+import time
 
 from services.appium_service import AppiumService
 from services.debug_service import DebugService
+from services.flow_optimizer import optimize_recorded_steps, recorded_products, SEARCH_FIELD_NAME
+from services.selector_scoring import score_steps_offline
+from services.replay_scheduler import ReplayScheduler
+from services.load_generator import LoadGenerator, build_schedule, profile_duration
+from services.session_manager import SessionManager
+from services.session_heartbeat import SessionHeartbeat
+from services.init_pipeline import InitPipeline, InitPhaseError
+from services.connectivity_monitor import default_monitor as connectivity, parse_target
+from services.modal_watcher import default_watcher as modal_watcher, BEFORE_SEARCH, AFTER_ADD
 from services.recorder_service import RecorderService
-from services.select_combo_box import select_combo_box_option
+from services.strategy_memory import strategy_memory
+from services.payment_detector import detection_summary
+from services.run_store import run_store
+from services.flow_registry import FlowRegistry
+from services.driver_actor import driver_actor, DriverCancelled, DriverTimeout, CONTROL, RUN, HEALTH, DEBUG
+from services.capture_cache import CaptureCache
+from services.failure_artifacts import failure_artifacts, SCREENSHOT
+from services.selector_lab import selector_lab
+from services.selector_compiler import selector_compiler
+from services.spatial_index import SpatialIndex
+from services.ui_snapshot import UISnapshot
+from services import run_analytics
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(name)s] %(levelname)s: %(message)s")
 logger = logging.getLogger("main")
@@ -34,6 +58,7 @@ app.add_middleware(
 appium_service = AppiumService()
 debug_service = DebugService()
 recorder_service = RecorderService()
+session_manager = SessionManager(appium_service)
 
 # WebSocket connections for real-time logs
 ws_connections: list[WebSocket] = []
@@ -80,6 +105,29 @@ class ConfigPayload(BaseModel):
     radio_button_name: str = ""
     payment_amount: float = 0
     enable_debug: bool = False
+    heartbeat_interval: Optional[float] = None
+    connectivity_target: Optional[str] = None
+    # Rewrite slow selectors to native lookups proven unique on stored UI snapshots
+    compile_selectors: bool = True
+
+    @field_validator("heartbeat_interval")
+    @classmethod
+    def _positive_interval(cls, value: Optional[float]) -> Optional[float]:
+        if value is not None and value <= 0:
+            raise ValueError("heartbeat_interval debe ser positivo")
+        return value
+
+    @field_validator("connectivity_target")
+    @classmethod
+    def _valid_target(cls, value: Optional[str]) -> Optional[str]:
+        if value:
+            try:
+                _, port = parse_target(value)
+            except ValueError:
+                port = 0
+            if not 0 < port < 65536:
+                raise ValueError("connectivity_target debe tener la forma 'host:puerto'")
+        return value
 
 
 class StepPayload(BaseModel):
@@ -90,6 +138,10 @@ class StepPayload(BaseModel):
     value: Optional[str] = None
     wait_time: Optional[int] = None
     enabled: bool = True
+    fallback_selectors: Optional[list[dict]] = None
+    # Original selector when the selector compiler rewrote this step
+    compiled_from: Optional[dict] = None
+    timestamp_ms: Optional[int] = None
 
 
 class FlowPayload(BaseModel):
@@ -98,9 +150,67 @@ class FlowPayload(BaseModel):
     steps: list[StepPayload]
     iterations: int = 1
     start_from_step: int = 0
+    replay_speed: Optional[float] = None
+    # "retry"/"skip"/"stop" answers step failures without asking the frontend (unattended runs)
+    on_failure: Optional[str] = None
     config: ConfigPayload
 
 
+class FlowRefPayload(BaseModel):
+    """Run a registered flow by id; ``overrides`` patch top-level flow fields, ``config_overrides`` the config."""
+    flow_id: str
+    version: Optional[str] = None
+    catalog_id: Optional[str] = None
+    catalog_version: Optional[str] = None
+    overrides: dict = {}
+    config_overrides: dict = {}
+
+
+class LoadFlowPayload(BaseModel):
+    flow: Union[FlowRefPayload, FlowPayload]
+    weight: float = 1.0
+
+
+class LoadPayload(BaseModel):
+    flows: list[LoadFlowPayload]
+    # kind: constant | ramp | step | poisson
+    profile: dict
+    late_threshold_ms: float = 1000
+    max_queue: Optional[int] = None
+    seed: Optional[int] = None
+
+
+class ComparePayload(BaseModel):
+    # Each side: {"run_id"}, {"run_ids": [...]} or {"since", "until"} (epoch seconds)
+    baseline: dict
+    candidate: dict
+    flow_name: Optional[str] = None
+    threshold_pct: float = 20.0
+    alpha: float = 0.05
+    write_report: bool = True
+
+
+class PointPayload(BaseModel):
+    x: float
+    y: float
+    identified: bool = False
+
+
+class RectPayload(BaseModel):
+    x: float
+    y: float
+    width: float
+    height: float
+    contained: bool = False
+
+
+class NearPayload(BaseModel):
+    x: float
+    y: float
+    radius: float = 50
+    limit: int = 10
+
+
 # ── WebSocket ───────────────────────────────────────────
 
 @app.websocket("/ws")
@@ -125,14 +235,21 @@ async def websocket_endpoint(websocket: WebSocket):
 
 # ── Health ──────────────────────────────────────────────
 
+def _ping_driver():
+    # This makes a real HTTP call to Appium server, unlike session_id which is local
+    return appium_service.driver.title
+
+
 def _check_appium_session_alive() -> bool:
     """Actually ping Appium to verify the session is alive (not just check local property)."""
     if appium_service.driver is None:
         return False
     try:
-        # This makes a real HTTP call to Appium server, unlike session_id which is local
-        appium_service.driver.title
+        driver_actor.run(_ping_driver, lane=HEALTH)
         return True
+    except DriverTimeout:
+        # The actor is busy with a long step: the session is in use, not dead
+        return appium_service.driver is not None
     except Exception:
         logger.warning("[SESSION] Appium session is dead. Cleaning up.")
         appium_service.driver = None
@@ -140,16 +257,52 @@ def _check_appium_session_alive() -> bool:
         return False
 
 
+heartbeat = SessionHeartbeat(_check_appium_session_alive)
+
+
+@app.on_event("startup")
+async def start_heartbeat():
+    driver_actor.start()
+    heartbeat.start()
+    connectivity.start()
+    run_store.start()
+
+
+async def _session_alive() -> bool:
+    """Cached liveness; only probes the driver when the cache is stale or negative."""
+    if heartbeat.alive and heartbeat.is_fresh():
+        return True
+    return await asyncio.to_thread(heartbeat.refresh)
+
+
 @app.get("/api/health")
 async def health():
-    appium_connected = await asyncio.to_thread(_check_appium_session_alive)
+    status = heartbeat.status()
     return {
         "status": "ok",
-        "appium_connected": appium_connected,
+        "appium_connected": status["alive"],
+        "session": status,
+        "network": connectivity.status(),
         "version": "1.0.0",
     }
 
 
+@app.get("/api/connectivity")
+async def connectivity_status():
+    """Cached network reachability from the background monitor."""
+    return {"status": "success", **connectivity.status()}
+
+
+@app.post("/api/connectivity")
+async def configure_connectivity(data: dict):
+    """Change the probe target ("host:port", e.g. a local stand-in) and/or interval."""
+    try:
+        connectivity.configure(data.get("target"), data.get("interval"))
+        return {"status": "success", **connectivity.status()}
+    except (ValueError, TypeError) as e:
+        return {"status": "error", "error": str(e)}
+
+
 # ── Load Products from File ─────────────────────────────
 
 @app.post("/api/load-products-file")
@@ -188,126 +341,281 @@ async def load_products_file(data: dict):
 
 # ── Initialization ──────────────────────────────────────
 
+INIT_STEP_LABELS = {
+    "check_appium": "Verificar servidor Appium",
+    "open_app": "Abrir aplicación POS",
+    "connect_appium": "Conectar sesión Appium al POS",
+    "clear_order": "Limpiar pedido anterior",
+    "load_products": "Cargar lista de productos",
+}
+
+
 @app.post("/api/initialize")
 async def initialize(config: ConfigPayload):
-    """Run the full initialization sequence (open app, connect appium, clear order, load products)."""
-    results = []
-
-    # Step 1: Verify Appium server is reachable
-    await broadcast_log("info", "Ejecutando: Verificar servidor Appium...")
-    await broadcast_status("init_step", {"step_id": "check_appium", "status": "running"})
+    """Run the initialization pipeline (Appium check, product load and app launch in parallel,
+    then connect appium and clear order)."""
+
+    async def report(step_id: str, status: str, message: str):
+        label = INIT_STEP_LABELS.get(step_id, step_id)
+        if status == "running":
+            await broadcast_log("info", f"Ejecutando: {label}...")
+        elif status == "success":
+            await broadcast_log("success", f"✓ {label} — {message}")
+        else:
+            await broadcast_log("error", f"✗ {label} — error: {message}")
+            if step_id == "check_appium":
+                await broadcast_log("error", "¿Está corriendo el servidor Appium? Ejecuta: appium")
+        data = {"step_id": step_id, "status": status}
+        if status != "running":
+            data["message"] = message
+        await broadcast_status("init_step", data)
+
+    pipeline = InitPipeline(appium_service, report,
+                            driver_call=lambda fn, *args: driver_actor.call(fn, *args, lane=CONTROL))
     try:
-        import urllib.request
-        req = urllib.request.Request(f"{config.appium_url}/status", method="GET")
-        with urllib.request.urlopen(req, timeout=5) as resp:
-            if resp.status == 200:
-                await broadcast_log("success", f"✓ Servidor Appium disponible en {config.appium_url}")
-                await broadcast_status("init_step", {"step_id": "check_appium", "status": "success", "message": "OK"})
-                results.append({"step": "check_appium", "status": "success"})
-            else:
-                raise RuntimeError(f"Appium respondió con status {resp.status}")
+        outcome = await pipeline.run(config)
+    except InitPhaseError as e:
+        logger.error(f"[INIT] {e.step_id} falló: {e}")
+        return {"status": "error", "step": e.step_id, "error": str(e), "results": pipeline.results}
     except Exception as e:
-        msg = f"✗ Servidor Appium no disponible en {config.appium_url}: {str(e)}"
-        logger.error(f"[INIT] {msg}")
-        await broadcast_log("error", msg)
-        await broadcast_log("error", "¿Está corriendo el servidor Appium? Ejecuta: appium")
-        await broadcast_status("init_step", {"step_id": "check_appium", "status": "error", "message": str(e)})
-        return {"status": "error", "step": "check_appium", "error": str(e), "results": results}
-
-    # Step 2: Open application
-    await broadcast_log("info", "Ejecutando: Abrir aplicación POS...")
-    await broadcast_status("init_step", {"step_id": "open_app", "status": "running"})
-    try:
-        await asyncio.to_thread(appium_service.open_application, config.app_path)
-        await broadcast_log("success", "✓ Aplicación POS abierta")
-        await broadcast_status("init_step", {"step_id": "open_app", "status": "success", "message": "OK"})
-        results.append({"step": "open_app", "status": "success"})
-    except Exception as e:
-        msg = f"✗ Error abriendo aplicación: {str(e)}"
-        logger.error(f"[INIT] {msg}\n{traceback.format_exc()}")
-        await broadcast_log("error", msg)
-        await broadcast_status("init_step", {"step_id": "open_app", "status": "error", "message": str(e)})
-        return {"status": "error", "step": "open_app", "error": str(e), "results": results}
-
-    # Step 3: Connect Appium session to POS window
-    await broadcast_log("info", "Ejecutando: Conectar sesión Appium al POS...")
-    await broadcast_status("init_step", {"step_id": "connect_appium", "status": "running"})
+        logger.error(f"[INIT] Error inesperado: {e}\n{traceback.format_exc()}")
+        return {"status": "error", "error": str(e), "results": pipeline.results}
+
+    session_manager.on_connected(config.appium_url)
+    heartbeat.note_activity()
+    if config.heartbeat_interval:
+        heartbeat.set_interval(config.heartbeat_interval)
+    if config.connectivity_target:
+        connectivity.configure(config.connectivity_target)
+
+    await broadcast_log("success", f"✓ Inicialización completa en {outcome['total_ms']}ms. Listo para ejecutar flujos.")
+    return {"status": "success", "results": outcome["results"], "total_ms": outcome["total_ms"]}
+
+
+# ── Flow Registry ───────────────────────────────────────
+
+flow_registry = FlowRegistry(compile_flow=FlowPayload.model_validate)
+FLOW_OVERRIDES = set(FlowPayload.model_fields) - {"steps", "config"}
+_field_adapters: dict = {}
+
+
+def _validate_fields(model: type, values: dict) -> dict:
+    """``values`` validated against ``model``'s field annotations, one key at a time (raises ValueError)."""
+    validated = {}
+    for name, value in values.items():
+        key = (model, name)
+        if key not in _field_adapters:
+            _field_adapters[key] = TypeAdapter(model.model_fields[name].annotation)
+        try:
+            validated[name] = _field_adapters[key].validate_python(value)
+        except ValidationError as e:
+            raise ValueError(f"Valor no válido para '{name}': {e.errors()[0]['msg']}")
+    return validated
+
+
+def _resolve_flow_ref(ref: FlowRefPayload) -> FlowPayload:
+    """Cached compiled flow for the version, with its catalog and overrides applied.
+
+    Only the override values are validated; the cached steps are reused as is.
+    """
+    unknown = set(ref.overrides) - FLOW_OVERRIDES
+    if unknown:
+        raise ValueError(f"Campos no modificables: {', '.join(sorted(unknown))}")
+    unknown = set(ref.config_overrides) - set(ConfigPayload.model_fields)
+    if unknown:
+        raise ValueError(f"Campos de configuración desconocidos: {', '.join(sorted(unknown))}")
+    version, compiled = flow_registry.flow(ref.flow_id, ref.version)
+    catalog_id = ref.catalog_id or flow_registry.flow_catalog_id(ref.flow_id, version)
+    overrides = _validate_fields(FlowPayload, ref.overrides)
+    config_updates = _validate_fields(ConfigPayload, ref.config_overrides)
+    if catalog_id:
+        config_updates["products"] = flow_registry.catalog(catalog_id, ref.catalog_version)
+    config = compiled.config.model_copy(update=config_updates) if config_updates else compiled.config
+    if not overrides and config is compiled.config:
+        return compiled
+    return compiled.model_copy(update={**overrides, "config": config})
+
+
+def _compile_selectors(flow: FlowPayload) -> tuple:
+    """``(flow, rewrites)`` with slow selectors replaced by native ones proven on snapshots."""
+    if not flow.config.compile_selectors:
+        return flow, []
+    steps, report = selector_compiler.compile_steps([s.model_dump() for s in flow.steps])
+    rewrites = [r for r in report if r["rewritten_to"]]
+    if rewrites:
+        flow = flow.model_copy(update={"steps": [StepPayload.model_validate(s) for s in steps]})
+    return flow, rewrites
+
+
+def _load_flow(flow: Union[FlowRefPayload, FlowPayload]) -> tuple:
+    """Resolve a flow reference and compile its selectors: ``(flow, rewrites)``."""
+    if isinstance(flow, FlowRefPayload):
+        flow = _resolve_flow_ref(flow)
+    return _compile_selectors(flow)
+
+
+async def _log_rewrites(rewrites: list[dict]):
+    if rewrites:
+        detail = ", ".join(f"paso {r['step_index'] + 1} → [{r['rewritten_to']['selector_type']}] "
+                           f"{r['rewritten_to']['selector_value']}" for r in rewrites)
+        await broadcast_log("info", f"⚡ {len(rewrites)} selector(es) compilados a búsqueda nativa: {detail}")
+
+
+@app.post("/api/flows/compile")
+async def compile_flow_selectors(flow: Union[FlowRefPayload, FlowPayload]):
+    """Dry run of the selector compiler: the decision for every step selector, nothing is executed."""
     try:
-        await asyncio.to_thread(appium_service.connect, config.appium_url, config.app_path)
-        await broadcast_log("success", "✓ Sesión Appium conectada al POS")
-        await broadcast_status("init_step", {"step_id": "connect_appium", "status": "success", "message": "OK"})
-        results.append({"step": "connect_appium", "status": "success"})
-    except Exception as e:
-        msg = f"✗ Error conectando sesión Appium: {str(e)}"
-        logger.error(f"[INIT] {msg}\n{traceback.format_exc()}")
-        await broadcast_log("error", msg)
-        await broadcast_status("init_step", {"step_id": "connect_appium", "status": "error", "message": str(e)})
-        return {"status": "error", "step": "connect_appium", "error": str(e), "results": results}
-
-    # Step 4: Clear previous order
-    await broadcast_log("info", "Ejecutando: Limpiar pedido anterior...")
-    await broadcast_status("init_step", {"step_id": "clear_order", "status": "running"})
+        if isinstance(flow, FlowRefPayload):
+            flow = await asyncio.to_thread(_resolve_flow_ref, flow)
+        _, report = await asyncio.to_thread(
+            selector_compiler.compile_steps, [s.model_dump() for s in flow.steps],
+        )
+    except (KeyError, ValueError) as e:
+        return {"status": "error", "error": str(e).strip("'\"")}
+    return {"status": "success", "report": report, "rewrites": sum(1 for r in report if r["rewritten_to"]),
+            "compiler": selector_compiler.stats()}
+
+
+@app.post("/api/flows")
+async def register_flow(data: dict):
+    """Register a flow (``{"flow": {...}, "id": optional}``); its products become a catalog."""
+    flow = data.get("flow") or {}
     try:
-        await asyncio.to_thread(appium_service.clear_order)
-        await broadcast_log("success", "✓ Pedido anterior limpiado")
-        await broadcast_status("init_step", {"step_id": "clear_order", "status": "success", "message": "OK"})
-        results.append({"step": "clear_order", "status": "success"})
-    except Exception as e:
-        msg = f"✗ Error limpiando pedido: {str(e)}"
-        await broadcast_log("error", msg)
-        await broadcast_status("init_step", {"step_id": "clear_order", "status": "error", "message": str(e)})
-        return {"status": "error", "step": "clear_order", "error": str(e), "results": results}
-
-    # Step 4: Load products
-    await broadcast_log("info", "Ejecutando: Cargar lista de productos...")
-    await broadcast_status("init_step", {"step_id": "load_products", "status": "running"})
+        FlowPayload.model_validate(flow)
+    except ValueError as e:
+        return {"status": "error", "error": str(e)}
     try:
-        product_count = await asyncio.to_thread(appium_service.load_products, config.products_file, config.products)
-        await broadcast_log("success", f"✓ {product_count} productos cargados")
-        await broadcast_status("init_step", {"step_id": "load_products", "status": "success", "message": f"{product_count} productos"})
-        results.append({"step": "load_products", "status": "success", "count": product_count})
-    except Exception as e:
-        msg = f"✗ Error cargando productos: {str(e)}"
-        await broadcast_log("error", msg)
-        await broadcast_status("init_step", {"step_id": "load_products", "status": "error", "message": str(e)})
-        return {"status": "error", "step": "load_products", "error": str(e), "results": results}
+        result = await asyncio.to_thread(flow_registry.register_flow, flow, data.get("id"))
+    except ValueError as e:
+        return {"status": "error", "error": str(e)}
+    return {"status": "success", **result}
 
-    await broadcast_log("success", "✓ Inicialización completa. Listo para ejecutar flujos.")
-    return {"status": "success", "results": results}
+
+@app.get("/api/flows")
+async def list_flows():
+    listing = await asyncio.to_thread(flow_registry.listing)
+    return {"status": "success", **listing, "cache": flow_registry.stats()}
+
+
+@app.get("/api/flows/{flow_id}")
+async def get_flow(flow_id: str, version: Optional[str] = None):
+    try:
+        version, flow = flow_registry.flow(flow_id, version)
+    except KeyError as e:
+        return {"status": "error", "error": str(e).strip("'\"")}
+    return {"status": "success", "id": flow_id, "version": version,
+            "catalog_id": flow_registry.flow_catalog_id(flow_id, version), "flow": flow.model_dump()}
+
+
+@app.post("/api/catalogs")
+async def register_catalog(data: dict):
+    """Register a product catalog from ``products`` or a server-side ``file_path``."""
+    catalog_id = data.get("id")
+    if not catalog_id:
+        return {"status": "error", "error": "Se requiere el id del catálogo"}
+    try:
+        result = await asyncio.to_thread(
+            flow_registry.register_catalog, catalog_id, data.get("products"), data.get("file_path"),
+        )
+    except (FileNotFoundError, ValueError) as e:
+        return {"status": "error", "error": str(e)}
+    return {"status": "success", **result}
 
 
 # ── Flow Execution ──────────────────────────────────────
 
+async def _await_failure_decision(flow: FlowPayload, run_id: str, i: int, step: StepPayload,
+                                  error_msg: str) -> Optional[dict]:
+    """Decision for a failed step: the flow's ``on_failure`` policy, or the user's answer (None on timeout)."""
+    # Screenshot + page source of the failure screen, stored in the background
+    artifact_id = failure_artifacts.capture(appium_service.driver, run_id, i, error_msg)
+    if flow.on_failure:
+        return {"action": flow.on_failure}
+    step_failure_event.clear()
+    await broadcast_status("step_failed", {
+        "artifact_id": artifact_id,
+        "step_index": i,
+        "step_description": step.description,
+        "error": error_msg,
+        "selector_type": step.selector_type,
+        "selector_value": step.selector_value,
+        "action_type": step.action_type,
+    })
+    # Wait up to 5 minutes for user response
+    try:
+        await asyncio.wait_for(step_failure_event.wait(), timeout=300)
+    except asyncio.TimeoutError:
+        return None
+    return step_failure_response
+
+
 @app.post("/api/run-flow")
-async def run_flow(flow: FlowPayload):
-    """Execute a complete automation flow with retry/skip support on failure."""
-    alive = await asyncio.to_thread(_check_appium_session_alive)
+async def run_flow(flow: Union[FlowRefPayload, FlowPayload]):
+    """Execute a complete automation flow with retry/skip support on failure.
+
+    Accepts the full flow or a reference to a registered one (``flow_id`` + overrides).
+    """
+    try:
+        flow, rewrites = await asyncio.to_thread(_load_flow, flow)
+    except (KeyError, ValueError) as e:
+        return {"status": "error", "error": str(e).strip("'\"")}
+    await _log_rewrites(rewrites)
+    error = await _ensure_session(flow)
+    if error:
+        return error
+    result = await _run_recorded(flow, "api")
+    if rewrites:
+        result["selector_rewrites"] = rewrites
+    return result
+
+
+async def _ensure_session(flow: FlowPayload) -> Optional[dict]:
+    """Fail over or reconnect an expired session; returns an error response if neither works."""
+    alive = await _session_alive()
     if not alive:
         await broadcast_log("warning", "⚠ Sesión de Appium expirada. Intentando reconectar automáticamente...")
+        if await driver_actor.call(session_manager.failover, lane=CONTROL):
+            alive = True
+            heartbeat.note_activity()
+            await broadcast_log("success", f"✓ Sesión de Appium reemplazada en {session_manager.failovers[-1]['ms']}ms.")
+    if not alive:
         try:
             appium_url = flow.config.appium_url or "http://127.0.0.1:4723"
-            import pygetwindow as gw
-            windows = gw.getWindowsWithTitle("SimiPOS")
-            app_window = None
-            for win in windows:
-                if win.title:
-                    app_window = win
-                    break
-            if not app_window:
-                all_windows = gw.getWindowsWithTitle("")
-                for win in all_windows:
-                    if "SimiPOS" in win.title:
-                        app_window = win
-                        break
-            if not app_window:
+            handle = await asyncio.to_thread(appium_service.locate_window)
+            if not handle:
                 return {"status": "error", "error": "Sesión expirada y no se encontró la ventana del POS para reconectar."}
-            appium_service.handle = hex(app_window._hWnd)
-            await asyncio.to_thread(appium_service.connect, appium_url)
+            await driver_actor.call(appium_service.connect, appium_url, lane=CONTROL)
+            session_manager.on_connected(appium_url)
+            heartbeat.note_activity()
             await broadcast_log("success", "✓ Sesión de Appium reconectada automáticamente.")
         except Exception as e:
             logger.error(f"[RUN-FLOW] Auto-reconnect failed: {e}")
             return {"status": "error", "error": f"Sesión expirada y no se pudo reconectar: {str(e)}"}
+    return None
+
+
+async def _run_recorded(flow: FlowPayload, source: str) -> dict:
+    """Run the flow and persist its outcome, steps and timings in the run store."""
+    run_id = run_store.start_run(flow.name, source)
+    try:
+        result = await _execute_flow(flow, run_id)
+    except asyncio.CancelledError:
+        # Request task cancelled (client gone, shutdown): do not leave the run "running"
+        run_store.finish_run(run_id, "stopped", error="Ejecución cancelada")
+        raise
+    except Exception as e:
+        run_store.finish_run(run_id, "error", error=str(e))
+        raise
+    run_store.finish_run(run_id, result["status"], result.get("steps_executed"), result.get("failed_step"),
+                         result.get("error"))
+    result["run_id"] = run_id
+    return result
+
+
+STOPPED_MSG = "Ejecución detenida por el usuario"
 
+
+async def _execute_flow(flow: FlowPayload, run_id: str) -> dict:
     await broadcast_log("info", f'▶ Iniciando flujo: "{flow.name}"')
     await broadcast_status("execution", {"status": "running"})
 
@@ -317,12 +625,54 @@ async def run_flow(flow: FlowPayload):
     if start_from > 0:
         await broadcast_log("info", f"⏩ Saltando los primeros {start_from} pasos, iniciando desde paso {start_from + 1}")
 
+    # Timing-faithful replay: schedule steps on the recorded timeline
+    scheduler = None
+    if flow.replay_speed is not None:
+        try:
+            scheduler = ReplayScheduler(flow.replay_speed)
+        except ValueError as e:
+            return {"status": "error", "error": str(e)}
+        await broadcast_log("info", f"⏱ Modo reproducción con tiempos grabados (velocidad x{flow.replay_speed})")
+
+    attempts: dict[int, int] = {}
+
+    def record_step(i: int, step: StepPayload, started: float, status: str, error: str = None, **trace):
+        elapsed = time.perf_counter() - started
+        run_store.record_step(
+            run_id, i, action_type=step.action_type, description=step.description,
+            selector_type=step.selector_type, selector_value=step.selector_value, status=status,
+            attempt=attempts.get(i, 0) + 1, started_at=time.time() - elapsed,
+            duration_ms=round(elapsed * 1000, 1), error=error, **trace,
+        )
+
+    async def stopped(i: int, step: StepPayload, started: float) -> dict:
+        """The step's driver job was cancelled by /api/stop-flow before it started."""
+        record_step(i, step, started, "stopped", STOPPED_MSG)
+        # The cancelled job never reached execute_step, which would have reset the flag
+        appium_service.stop_requested = False
+        await broadcast_status("execution", {"status": "stopped", "step_index": i})
+        return {"status": "stopped", "failed_step": i, "error": STOPPED_MSG}
+
     i = start_from
     while i < len(enabled_steps):
         step = enabled_steps[i]
+        # Pause here, not inside a driver job, so the picker can still use the driver
+        paused_at = time.monotonic()
+        while appium_service.paused:
+            await asyncio.sleep(0.5)
+        if scheduler:
+            scheduler.shift(time.monotonic() - paused_at)
+        if scheduler:
+            # Recorded waits are redundant once the timeline provides the timing
+            if step.action_type == "wait" and step.timestamp_ms is not None:
+                i += 1
+                continue
+            await scheduler.wait_until(step.timestamp_ms)
         # Handle search_product: select random products and search them (matching original main.py)
         if step.action_type == "search_product":
-            all_products = flow.config.products or appium_service.products
+            # Collapsed from a recording: replay exactly the recorded products
+            fixed_products = recorded_products(step.value)
+            all_products = fixed_products or flow.config.products or appium_service.products
             if not all_products:
                 await broadcast_log("warning", f"⚠ No hay productos cargados. Omitiendo paso {i + 1}.")
                 i += 1
@@ -331,12 +681,13 @@ async def run_flow(flow: FlowPayload):
             # Select random products for this iteration (matching original logic)
             import random
             products_per_iter = flow.config.products_per_iteration or len(all_products)
-            if products_per_iter >= len(all_products):
+            if fixed_products or products_per_iter >= len(all_products):
                 selected_products = all_products[:]
             else:
                 selected_products = random.sample(all_products, min(products_per_iter, len(all_products)))
 
             await broadcast_log("info", f"Paso {i + 1}/{len(enabled_steps)}: {step.description} — {len(selected_products)} productos seleccionados de {len(all_products)} disponibles")
+            step_started = time.perf_counter()
             try:
                 for pi, product in enumerate(selected_products):
                     code = product.get("code", "")
@@ -353,13 +704,8 @@ async def run_flow(flow: FlowPayload):
 
                         driver = appium_service.driver
 
-                        # Close possible modals first
-                        try:
-                            modal = driver.find_element(By.NAME, "Aceptar")
-                            modal.click()
-                            _time.sleep(0.5)
-                        except:
-                            pass
+                        # Close possible modals first (one snapshot when the screen is clean)
+                        modal_watcher.check(driver, BEFORE_SEARCH)
 
                         # Find and type in search box
                         wait = WebDriverWait(driver, 10)
@@ -384,52 +730,44 @@ async def run_flow(flow: FlowPayload):
                                 logger.info(f"[SEARCH] Producto {code} agregado ({q+1}/{qty})")
                                 _time.sleep(0.5)
 
-                                # Handle recommendation windows
-                                try:
-                                    rec_elements = driver.find_elements(
-                                        By.XPATH,
-                                        "//*[contains(@Name, 'Oportunidad') or contains(@Name, 'Recomendación')]"
-                                    )
-                                    if rec_elements:
-                                        try:
-                                            accept_btn = driver.find_element(By.NAME, "Aceptar")
-                                            accept_btn.click()
-                                            logger.info("[SEARCH] Ventana de recomendación aceptada")
-                                            _time.sleep(0.5)
-                                        except:
-                                            pass
-                                except:
-                                    pass
+                                # Recommendation windows and modals, evaluated on one snapshot
+                                modal_watcher.check(driver, AFTER_ADD)
                             except Exception as e:
                                 logger.warning(f"[SEARCH] No se pudo hacer clic en Agregar para {code}: {e}")
 
-                    await asyncio.to_thread(_search_and_add_product, code, qty)
+                    product_started = time.perf_counter()
+                    try:
+                        await driver_actor.call(_search_and_add_product, code, qty, lane=RUN)
+                    except Exception as e:
+                        run_store.record_product(run_id, i, code=code, quantity=qty, status="failed", error=str(e),
+                                                 duration_ms=round((time.perf_counter() - product_started) * 1000, 1))
+                        raise
+                    run_store.record_product(run_id, i, code=code, quantity=qty, status="ok",
+                                             duration_ms=round((time.perf_counter() - product_started) * 1000, 1))
+                    heartbeat.note_activity()
                     await broadcast_log("success", f"  ✓ {code} x{qty} agregado")
 
                 await broadcast_log("success", f"✓ {len(selected_products)} productos procesados")
+                record_step(i, step, step_started, "ok")
                 i += 1
                 continue
+            except DriverCancelled:
+                return await stopped(i, step, step_started)
             except Exception as e:
                 error_msg = str(e)
+                record_step(i, step, step_started, "failed", error_msg)
                 logger.error(f"[RUN-FLOW] search_product falló: {error_msg}\n{traceback.format_exc()}")
                 await broadcast_log("error", f"✗ Error buscando productos: {error_msg}")
-                step_failure_event.clear()
-                await broadcast_status("step_failed", {
-                    "step_index": i,
-                    "step_description": step.description,
-                    "error": error_msg,
-                    "selector_type": step.selector_type,
-                    "selector_value": step.selector_value,
-                    "action_type": step.action_type,
-                })
-                try:
-                    await asyncio.wait_for(step_failure_event.wait(), timeout=300)
-                except asyncio.TimeoutError:
+                response = await _await_failure_decision(flow, run_id, i, step, error_msg)
+                if scheduler:
+                    # The failed attempt and the decision are not part of the recording
+                    scheduler.rebase(step.timestamp_ms)
+                if response is None:
                     await broadcast_log("error", "Tiempo de espera agotado.")
                     return {"status": "error", "failed_step": i, "error": "Timeout"}
-                response = step_failure_response
                 action = response.get("action", "stop")
                 if action == "retry":
+                    attempts[i] = attempts.get(i, 0) + 1
                     continue
                 elif action == "skip":
                     i += 1
@@ -440,37 +778,36 @@ async def run_flow(flow: FlowPayload):
         await broadcast_status("execution", {"status": "running", "step_index": i})
         await broadcast_log("info", f"Paso {i + 1}/{len(enabled_steps)}: {step.description}")
 
+        step_started = time.perf_counter()
         try:
-            result = await asyncio.to_thread(
-                appium_service.execute_step, step.model_dump(), flow.config.model_dump()
+            result = await driver_actor.call(
+                appium_service.execute_step, step.model_dump(), flow.config.model_dump(), lane=RUN
             )
+            record_step(i, step, step_started, "ok", **appium_service.step_trace)
+            heartbeat.note_activity()
             await broadcast_log("success", f"✓ {step.description} — completado")
+            if result.get("sale_cycle"):
+                cycle = result["sale_cycle"]
+                await broadcast_log("info", f"  🧾 Ciclo de venta {' → '.join(cycle['path'])} en {cycle['total_ms']}ms")
+                await broadcast_status("sale_cycle", cycle)
             i += 1
+        except DriverCancelled:
+            return await stopped(i, step, step_started)
         except Exception as e:
             error_msg = str(e)
+            record_step(i, step, step_started, "failed", error_msg, **appium_service.step_trace)
             logger.error(f"[RUN-FLOW] Paso {i+1} falló: {error_msg}\n{traceback.format_exc()}")
             await broadcast_log("error", f"✗ {step.description} — falló: {error_msg}")
 
             # Notify frontend of failure and wait for user decision
-            step_failure_event.clear()
-            await broadcast_status("step_failed", {
-                "step_index": i,
-                "step_description": step.description,
-                "error": error_msg,
-                "selector_type": step.selector_type,
-                "selector_value": step.selector_value,
-                "action_type": step.action_type,
-            })
-
-            # Wait up to 5 minutes for user response
-            try:
-                await asyncio.wait_for(step_failure_event.wait(), timeout=300)
-            except asyncio.TimeoutError:
+            response = await _await_failure_decision(flow, run_id, i, step, error_msg)
+            if scheduler:
+                # The failed attempt and the decision are not part of the recording
+                scheduler.rebase(step.timestamp_ms)
+            if response is None:
                 await broadcast_log("error", "Tiempo de espera agotado. Deteniendo flujo.")
                 await broadcast_status("execution", {"status": "error", "step_index": i})
                 return {"status": "error", "failed_step": i, "error": "Timeout esperando respuesta"}
-
-            response = step_failure_response
             action = response.get("action", "stop")
 
             if action == "retry":
@@ -483,6 +820,7 @@ async def run_flow(flow: FlowPayload):
                     step_data["selector_type"] = new_selector_type
                     step_data["selector_value"] = new_selector_value
                     enabled_steps[i] = StepPayload(**step_data)
+                attempts[i] = attempts.get(i, 0) + 1
                 await broadcast_log("info", f"🔄 Reintentando paso {i + 1}...")
                 continue  # retry same step
             elif action == "skip":
@@ -495,13 +833,17 @@ async def run_flow(flow: FlowPayload):
 
     await broadcast_status("execution", {"status": "completed"})
     await broadcast_log("success", f'✓ Flujo "{flow.name}" completado exitosamente.')
-    return {"status": "completed", "steps_executed": len(enabled_steps)}
+    result = {"status": "completed", "steps_executed": len(enabled_steps)}
+    if scheduler:
+        result["replay"] = scheduler.stats()
+    return result
 
 
 @app.post("/api/stop-flow")
 async def stop_flow():
     """Stop the currently running flow."""
     appium_service.stop_requested = True
+    driver_actor.cancel_pending((RUN,))
     await broadcast_log("warning", "⏹ Flujo detenido por el usuario.")
     await broadcast_status("execution", {"status": "stopped"})
     return {"status": "stopped"}
@@ -525,44 +867,352 @@ async def resume_flow():
     return {"status": "running"}
 
 
+# ── Run Results ─────────────────────────────────────────
+
+@app.get("/api/runs")
+async def recent_runs(limit: int = 20, flow_name: Optional[str] = None):
+    runs = await asyncio.to_thread(run_store.recent_runs, limit, flow_name)
+    return {"status": "success", "runs": runs, "store": run_store.stats()}
+
+
+@app.get("/api/runs/{run_id}")
+async def run_detail(run_id: str):
+    run = await asyncio.to_thread(run_store.get_run, run_id)
+    if run is None:
+        return {"status": "error", "error": f"Ejecución '{run_id}' no encontrada"}
+    return {"status": "success", "run": run}
+
+
+@app.post("/api/analytics/steps")
+async def analytics_steps(data: dict):
+    """Per-step latency distributions for ``run_id``/``run_ids`` or a ``since``/``until`` window."""
+    try:
+        steps = await asyncio.to_thread(run_analytics.step_distributions, run_store, data, data.get("flow_name"))
+    except ValueError as e:
+        return {"status": "error", "error": str(e)}
+    return {"status": "success", "steps": steps}
+
+
+@app.post("/api/analytics/compare")
+async def analytics_compare(data: ComparePayload):
+    """Compare two runs or windows and flag steps whose p95 regressed beyond the threshold."""
+    try:
+        result = await asyncio.to_thread(
+            run_analytics.compare, run_store, data.baseline, data.candidate, data.flow_name,
+            data.threshold_pct, data.alpha,
+        )
+    except ValueError as e:
+        return {"status": "error", "error": str(e)}
+    if data.write_report:
+        reports = os.path.join(os.path.dirname(run_store.path), "reports")
+        result["report"] = await asyncio.to_thread(run_analytics.write_report, result, reports)
+    return {"status": "regressed" if result["regressions"] else "success", **result}
+
+
+@app.get("/api/artifacts")
+async def list_artifacts(run_id: Optional[str] = None):
+    """Failure artifacts (newest first), optionally for one run."""
+    items = await asyncio.to_thread(failure_artifacts.listing, run_id)
+    return {"status": "success", "artifacts": items, **failure_artifacts.stats()}
+
+
+@app.get("/api/artifacts/{artifact_id}/screenshot")
+async def artifact_screenshot(artifact_id: str):
+    file_path = failure_artifacts.path(artifact_id, SCREENSHOT)
+    if not file_path:
+        return Response(status_code=404)
+    return FileResponse(file_path, media_type="image/png")
+
+
+@app.get("/api/artifacts/{artifact_id}/page-source")
+async def artifact_page_source(artifact_id: str):
+    xml = await asyncio.to_thread(failure_artifacts.page_source, artifact_id)
+    if xml is None:
+        return Response(status_code=404)
+    return Response(xml, media_type="application/xml")
+
+
+# ── Selector Lab ────────────────────────────────────────
+
+@app.post("/api/lab/snapshots")
+async def add_lab_snapshot(data: dict = None):
+    """Store a snapshot: ``page_source``, a failure's ``artifact_id``, or (neither) the live screen."""
+    data = data or {}
+    try:
+        if data.get("page_source"):
+            xml, source = data["page_source"], "upload"
+        elif data.get("artifact_id"):
+            xml, source = await asyncio.to_thread(failure_artifacts.page_source, data["artifact_id"]), "failure"
+            if xml is None:
+                return {"status": "error", "error": f"Artefacto '{data['artifact_id']}' sin page source"}
+        else:
+            if appium_service.driver is None:
+                return {"status": "error", "error": "Appium no conectado"}
+            xml, source = await driver_actor.call(lambda: appium_service.driver.page_source, lane=DEBUG,
+                                                  label="lab_snapshot"), "capture"
+        info = await asyncio.to_thread(selector_lab.add, xml, source, data.get("label"),
+                                       artifact_id=data.get("artifact_id"))
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
+    return {"status": "success", "snapshot": info}
+
+
+@app.get("/api/lab/snapshots")
+async def list_lab_snapshots(source: Optional[str] = None):
+    return {"status": "success", "snapshots": await asyncio.to_thread(selector_lab.listing, source)}
+
+
+@app.post("/api/lab/evaluate")
+async def evaluate_lab_selectors(data: dict):
+    """Evaluate ``selectors`` (or one ``selector_type``/``selector_value``) on ``snapshot_ids`` (default: latest)."""
+    selectors = data.get("selectors") or [{"selector_type": data.get("selector_type"),
+                                           "selector_value": data.get("selector_value")}]
+    try:
+        results = await asyncio.to_thread(selector_lab.evaluate, selectors, data.get("snapshot_ids"))
+    except KeyError as e:
+        return {"status": "error", "error": str(e).strip("'\"")}
+    return {"status": "success", "results": results}
+
+
+# ── Load Generation ─────────────────────────────────────
+
+load_generator: Optional[LoadGenerator] = None
+
+
+def _session_executors() -> list:
+    """Executors for the load generator: a single one, as the POS has a single window.
+
+    The standby session (SessionManager) attaches to that same window and is
+    only a failover, so it cannot run a second sale alongside the first.
+    """
+    async def execute(flow: FlowPayload) -> dict:
+        error = await _ensure_session(flow)
+        if error:
+            return error
+        # Unattended: a failed step ends that sale instead of waiting for the user
+        return await _run_recorded(flow.model_copy(update={"on_failure": flow.on_failure or "stop"}), "load")
+    return [execute]
+
+
+@app.post("/api/load/start")
+async def start_load(data: LoadPayload):
+    """Start an open-loop run: sales start on the profile's schedule, not when the previous one ends."""
+    global load_generator
+    if load_generator and load_generator.running:
+        return {"status": "error", "error": "Ya hay una generación de carga en curso"}
+    try:
+        schedule = build_schedule(data.profile)
+        loaded = [await asyncio.to_thread(_load_flow, f.flow) for f in data.flows]
+        load_generator = LoadGenerator(
+            _session_executors(), schedule,
+            [(flow, f.weight) for (flow, _), f in zip(loaded, data.flows)],
+            late_threshold_ms=data.late_threshold_ms, max_queue=data.max_queue, seed=data.seed,
+            duration_s=profile_duration(data.profile),
+        )
+    except (ValueError, KeyError) as e:
+        return {"status": "error", "error": str(e)}
+
+    generator = load_generator
+    await _log_rewrites([r for _, rewrites in loaded for r in rewrites])
+
+    async def _run():
+        summary = await generator.run()
+        # A stop that arrived as the last sale was finishing is never consumed
+        appium_service.stop_requested = False
+        await broadcast_status("load", summary)
+        await broadcast_log("info", f"📈 Carga terminada: {summary['achieved_per_hour']}/h logradas de "
+                                    f"{summary['offered_per_hour']}/h ofrecidas, {summary['late_starts']} inicios tardíos")
+
+    asyncio.create_task(_run())
+    await broadcast_log("info", f"📈 Generación de carga iniciada: {len(schedule)} ventas programadas "
+                                f"(perfil {data.profile.get('kind', 'constant')})")
+    return {"status": "started", "scheduled": len(schedule), "sessions": len(generator.executors)}
+
+
+@app.get("/api/load/status")
+async def load_status():
+    if load_generator is None:
+        return {"status": "idle"}
+    return {"status": "running" if load_generator.running else "finished", **load_generator.summary()}
+
+
+@app.post("/api/load/stop")
+async def stop_load():
+    if load_generator is None or not load_generator.running:
+        return {"status": "idle"}
+    load_generator.stop()
+    if load_generator.in_flight:
+        # Only a running sale consumes the flag; set while idle it would abort the next /api/run-flow
+        appium_service.stop_requested = True
+    await broadcast_log("warning", "⏹ Generación de carga detenida.")
+    return {"status": "stopped", **load_generator.summary()}
+
+
 # ── Debug ───────────────────────────────────────────────
 
+capture_cache = CaptureCache()
+# Spatial index over the last picker capture: (elements list, index, captured_at)
+picker_index: Optional[tuple] = None
+
+
+async def _cached_capture(key: str, fn, data: Optional[dict]) -> tuple:
+    """Single-flight capture keyed by the UI-state version; ``{"fresh": true}`` bypasses the TTL cache."""
+    version = driver_actor.ui_version
+    # Odd version: a run/control job is changing the screen right now, only share in-flight captures
+    fresh = bool((data or {}).get("fresh")) or version % 2 == 1
+    return await capture_cache.get(key, version, lambda: driver_actor.call(fn, lane=DEBUG), fresh=fresh)
+
+
 @app.post("/api/debug/capture-elements")
-async def capture_elements():
+async def capture_elements(data: dict = None):
     """Capture all UI elements from the current screen."""
     await broadcast_log("info", "[DEBUG] Capturando elementos de pantalla...")
     try:
-        elements = await asyncio.to_thread(debug_service.capture_elements, appium_service.driver)
-        await broadcast_log("success", f"[DEBUG] {len(elements)} elementos capturados")
-        return {"status": "success", "elements": elements}
+        elements, source, age_ms = await _cached_capture(
+            "capture", lambda: debug_service.capture_elements(appium_service.driver), data,
+        )
+        await broadcast_log("success", f"[DEBUG] {len(elements)} elementos capturados ({source})")
+        return {"status": "success", "elements": elements, "source": source, "age_ms": age_ms}
     except Exception as e:
         await broadcast_log("error", f"[DEBUG] Error: {str(e)}")
         return {"status": "error", "error": str(e)}
 
 
 @app.post("/api/debug/pick-elements")
-async def pick_elements():
+async def pick_elements(data: dict = None):
     """Capture visible UI elements for the visual element picker."""
-    alive = await asyncio.to_thread(_check_appium_session_alive)
+    alive = await _session_alive()
     if not alive:
         return {"status": "error", "error": "session_expired", "message": "La sesión de Appium expiró. Usa 'Reconectar' o reinicia el sistema."}
     try:
-        elements = await asyncio.to_thread(appium_service.capture_elements_for_picker)
-        return {"status": "success", "elements": elements, "count": len(elements)}
+        elements, source, age_ms = await _cached_capture("pick", appium_service.capture_elements_for_picker, data)
+        _index_picker_elements(elements, age_ms)
+        return {"status": "success", "elements": elements, "count": len(elements), "source": source, "age_ms": age_ms}
     except Exception as e:
         error_str = str(e)
         if "terminated or not started" in error_str:
             appium_service.driver = None
             appium_service.handle = None
+            heartbeat.mark_dead()
             return {"status": "error", "error": "session_expired", "message": "La sesión de Appium expiró."}
         return {"status": "error", "error": error_str}
 
 
+def _index_picker_elements(elements: list[dict], age_ms: float):
+    """Rebuild the picker's spatial index when a new capture comes back (shared captures reuse it)."""
+    global picker_index
+    if picker_index is None or picker_index[0] is not elements:
+        picker_index = (elements, SpatialIndex.from_elements(elements), time.time() - age_ms / 1000)
+
+
+def _geometry_error(data: BaseModel) -> Optional[dict]:
+    """Error response for non-finite coordinates or negative sizes, None when the payload is usable."""
+    values = data.model_dump()
+    bad = [k for k, v in values.items() if isinstance(v, float) and not math.isfinite(v)]
+    bad += [k for k in ("width", "height", "radius") if k in values and k not in bad and values[k] < 0]
+    if values.get("limit", 1) < 1:
+        bad.append("limit")
+    if bad:
+        return {"status": "error", "error": f"Valores no válidos: {', '.join(bad)}"}
+    return None
+
+
+def _picker_index_or_error() -> tuple:
+    if picker_index is None:
+        return None, {"status": "error", "error": "Sin captura: usa /api/debug/pick-elements primero"}
+    return picker_index, None
+
+
+def _picker_hit(node, elements: list[dict], **extra) -> dict:
+    return {**elements[node.index], **extra}
+
+
+@app.post("/api/debug/element-at")
+async def element_at(data: PointPayload):
+    """Element under a point of the last picker capture (deepest, then smallest); no driver call."""
+    current, error = _picker_index_or_error()
+    error = error or _geometry_error(data)
+    if error:
+        return error
+    elements, index, captured_at = current
+    hits = index.all_at(data.x, data.y)
+    if data.identified:
+        hits = [n for n in hits if n.name or n.automation_id]
+    return {"status": "success", "element": _picker_hit(hits[0], elements) if hits else None,
+            "stack": [_picker_hit(n, elements) for n in hits[1:5]],
+            "age_ms": round((time.time() - captured_at) * 1000)}
+
+
+@app.post("/api/debug/elements-in-rect")
+async def elements_in_rect(data: RectPayload):
+    """Elements of the last picker capture overlapping (or ``contained`` in) a rectangle, smallest first."""
+    current, error = _picker_index_or_error()
+    error = error or _geometry_error(data)
+    if error:
+        return error
+    elements, index, captured_at = current
+    hits = index.in_rect(data.x, data.y, data.width, data.height, contained=data.contained)
+    return {"status": "success", "elements": [_picker_hit(n, elements) for n in hits], "count": len(hits),
+            "age_ms": round((time.time() - captured_at) * 1000)}
+
+
+@app.post("/api/debug/elements-near")
+async def elements_near(data: NearPayload):
+    """Neighbours of the element under ``x``/``y`` within ``radius`` px, closest first."""
+    current, error = _picker_index_or_error()
+    error = error or _geometry_error(data)
+    if error:
+        return error
+    elements, index, captured_at = current
+    node = index.at(data.x, data.y)
+    if node is None:
+        return {"status": "success", "element": None, "near": []}
+    near = index.near(node, data.radius, data.limit)
+    return {"status": "success", "element": _picker_hit(node, elements),
+            "near": [_picker_hit(n, elements, gap_px=gap) for n, gap in near],
+            "age_ms": round((time.time() - captured_at) * 1000)}
+
+
+@app.get("/api/debug/modal-stats")
+async def modal_stats():
+    """Modal watcher rule table and hit counts."""
+    return {"status": "success", **modal_watcher.stats()}
+
+
+@app.get("/api/debug/click-strategies")
+async def click_strategies():
+    """Success rate and latency per ClickButtonService strategy, and the learned preference per target."""
+    return {"status": "success", **strategy_memory.summary()}
+
+
+@app.get("/api/debug/payment-detection")
+async def payment_detection():
+    """Which signal detected recent payments and how long after the charge."""
+    return {"status": "success", **detection_summary()}
+
+
+@app.get("/api/debug/driver-actor")
+async def driver_actor_stats():
+    """Queue depth, wait and run time per lane of the driver actor, and the job running now."""
+    return {"status": "success", **driver_actor.stats(), "capture_cache": capture_cache.stats()}
+
+
+@app.get("/api/debug/import-profile")
+async def import_profile():
+    """Import-time profile of the API (runs a fresh interpreter)."""
+    from services.import_profile import profile_imports
+    try:
+        report = await asyncio.to_thread(profile_imports, "main")
+        return {"status": "success", "report": report}
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
+
+
 @app.post("/api/debug/analyze-window")
 async def analyze_window():
     """Analyze the current window properties."""
     try:
-        info = debug_service.analyze_window(appium_service.driver)
+        info = await driver_actor.call(debug_service.analyze_window, appium_service.driver, lane=DEBUG)
         return {"status": "success", "window_info": info}
     except Exception as e:
         await broadcast_log("error", f"[DEBUG] Error analyzing window: {str(e)}")
@@ -576,29 +1226,43 @@ async def analyze_window():
 
 # ── Recording ───────────────────────────────────────────
 
+def _recorder_snapshot() -> UISnapshot:
+    """Current screen for the recorder's spatial index (recorder worker thread, low-priority lane)."""
+    return driver_actor.run(UISnapshot.capture, appium_service.driver, lane=DEBUG, label="recorder_index")
+
+
+def _recorder_driver_call(fn, *args):
+    """Driver work from the recorder worker (live selector scoring), serialized by the actor."""
+    return driver_actor.run(fn, *args, lane=DEBUG, label=getattr(fn, "__name__", "recorder"))
+
+
 @app.post("/api/record/start")
-async def start_recording():
+async def start_recording(data: dict = None):
     """Start recording user interactions with the POS."""
     if not appium_service.driver:
         await broadcast_log("error", "[RECORD] Appium no conectado. Inicializa primero.")
         return {"status": "error", "error": "Appium no conectado"}
 
+    loop = asyncio.get_running_loop()
+
     def on_step_captured(step_dict):
-        """Called when a new step is captured during recording."""
-        import asyncio
+        """Called from the recorder worker thread when a new step is captured."""
         try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                asyncio.ensure_future(broadcast_status("recorded_step", step_dict))
-                asyncio.ensure_future(broadcast_log(
-                    "info",
-                    f"[REC] ● {step_dict.get('action_type', '?')}: {step_dict.get('description', '?')}"
-                ))
+            asyncio.run_coroutine_threadsafe(broadcast_status("recorded_step", step_dict), loop)
+            asyncio.run_coroutine_threadsafe(broadcast_log(
+                "info",
+                f"[REC] ● {step_dict.get('action_type', '?')}: {step_dict.get('description', '?')}"
+            ), loop)
         except Exception as e:
             logger.warning(f"[RECORD] Error broadcasting step: {e}")
 
     try:
-        recorder_service.start(appium_service.driver, on_step_captured, window_handle=appium_service.handle)
+        await driver_actor.call(
+            recorder_service.start, appium_service.driver, on_step_captured, window_handle=appium_service.handle,
+            score_selectors=bool((data or {}).get("score_selectors", False)), lane=CONTROL,
+            snapshot_source=_recorder_snapshot if (data or {}).get("spatial_index", True) else None,
+            driver_call=_recorder_driver_call,
+        )
         await broadcast_log("success", "[RECORD] 🔴 Grabación iniciada. Interactúa con la aplicación POS...")
         return {"status": "recording"}
     except Exception as e:
@@ -611,7 +1275,13 @@ async def start_recording():
 async def stop_recording():
     """Stop recording and return captured steps."""
     try:
-        steps = recorder_service.stop()
+        steps = await asyncio.to_thread(recorder_service.stop)
+        if appium_service.driver is not None:
+            # Keep the screen the recording ended on for offline selector testing
+            driver_actor.submit(
+                lambda: selector_lab.add(appium_service.driver.page_source, "recording", steps=len(steps)),
+                lane=DEBUG, label="lab_snapshot",
+            )
         await broadcast_log("success", f"[RECORD] ⏹ Grabación detenida. {len(steps)} pasos capturados.")
         return {"status": "stopped", "steps": steps, "count": len(steps)}
     except Exception as e:
@@ -626,9 +1296,69 @@ async def record_status():
         "recording": recorder_service.recording,
         "steps_count": len(recorder_service.steps),
         "steps": recorder_service.get_steps(),
+        "metrics": recorder_service.get_metrics(),
     }
 
 
+def _search_field_ids() -> list[str]:
+    """AutomationIds of the product search box, from the last picker capture or the latest lab snapshot."""
+    ids = set()
+    if picker_index is not None:
+        ids.update(el.get("automationId") for el in picker_index[0] if el.get("name") == SEARCH_FIELD_NAME)
+    latest = selector_lab.recent_ids(1)
+    if latest:
+        try:
+            snapshot, indexes = selector_lab.matches(latest[0], "name", SEARCH_FIELD_NAME)
+            ids.update(snapshot.nodes[i].automation_id for i in indexes)
+        except (KeyError, ValueError):
+            pass
+    return sorted(i for i in ids if i)
+
+
+@app.post("/api/record/optimize")
+async def optimize_recording(data: dict = None):
+    """Compact a recorded step list (defaults to the last recording) and report the time saved."""
+    data = data or {}
+    steps = data.get("steps") or recorder_service.get_steps()
+    if not steps:
+        return {"status": "error", "error": "No hay pasos grabados para optimizar"}
+    try:
+        search_field_ids = data.get("search_field_ids") or await asyncio.to_thread(_search_field_ids)
+        result = optimize_recorded_steps(
+            steps,
+            settle_ms=data.get("settle_ms", 500),
+            collapse_searches=data.get("collapse_searches", True),
+            search_field_ids=tuple(search_field_ids),
+        )
+        report = result["report"]
+        await broadcast_log(
+            "info",
+            f"[RECORD] Flujo optimizado: {report['original_steps']} → {report['optimized_steps']} pasos "
+            f"(ahorro estimado {report['expected_time_saved_ms']}ms)"
+        )
+        return {"status": "success", **result}
+    except Exception as e:
+        logger.error(f"[RECORD] Error optimizing: {e}", exc_info=True)
+        return {"status": "error", "error": str(e)}
+
+
+@app.post("/api/record/score-selectors")
+async def score_recorded_selectors(data: dict = None):
+    """Offline pass: re-rank recorded step selectors against a captured element snapshot."""
+    data = data or {}
+    steps = data.get("steps") or recorder_service.get_steps()
+    elements = data.get("elements")
+    if not elements:
+        return {"status": "error", "error": "Se requiere una captura de elementos ('elements')"}
+    try:
+        scored = score_steps_offline(steps, elements)
+        changed = sum(1 for old, new in zip(steps, scored) if old.get("selector_value") != new.get("selector_value"))
+        return {"status": "success", "steps": scored, "changed": changed}
+    except Exception as e:
+        logger.error(f"[RECORD] Error scoring selectors: {e}", exc_info=True)
+        return {"status": "error", "error": str(e)}
+
+
 # ── Reconnect ───────────────────────────────────────────
 
 @app.post("/api/reconnect")
@@ -638,31 +1368,25 @@ async def reconnect(data: dict = None):
     if data:
         appium_url = data.get("appium_url", appium_url)
 
+    # Fast path: promote the standby session or reuse cached reconnect parameters
+    if not (data or {}).get("rediscover") and await driver_actor.call(session_manager.failover, lane=CONTROL):
+        heartbeat.note_activity()
+        elapsed = session_manager.failovers[-1]["ms"]
+        await broadcast_log("success", f"✓ Sesión de Appium reconectada en {elapsed}ms.")
+        return {"status": "success", "handle": appium_service.handle, "failover_ms": elapsed}
+
     try:
-        # Try to find the POS window
-        import pygetwindow as gw
-        windows = gw.getWindowsWithTitle("SimiPOS")
-        app_window = None
-        for win in windows:
-            if win.title:
-                app_window = win
-                break
-
-        if not app_window:
-            all_windows = gw.getWindowsWithTitle("")
-            for win in all_windows:
-                if "SimiPOS" in win.title:
-                    app_window = win
-                    break
-
-        if not app_window:
+        # Find the POS window (cached handle is revalidated first)
+        handle = await asyncio.to_thread(appium_service.locate_window)
+        if not handle:
             return {"status": "error", "error": "No se encontró la ventana del POS. ¿Está abierto SimiPOS?"}
 
-        appium_service.handle = hex(app_window._hWnd)
         logger.info(f"[RECONNECT] Handle encontrado: {appium_service.handle}")
 
         # Connect Appium
-        await asyncio.to_thread(appium_service.connect, appium_url)
+        await driver_actor.call(appium_service.connect, appium_url, lane=CONTROL)
+        session_manager.on_connected(appium_url)
+        heartbeat.note_activity()
         await broadcast_log("success", "✓ Sesión de Appium reconectada exitosamente.")
         return {"status": "success", "handle": appium_service.handle}
     except Exception as e:
@@ -670,6 +1394,12 @@ async def reconnect(data: dict = None):
         return {"status": "error", "error": str(e)}
 
 
+@app.get("/api/session/status")
+async def session_status():
+    """Hot-standby session state and failover timings."""
+    return {"status": "success", **session_manager.status(), "capabilities": appium_service.capabilities.to_dict()}
+
+
 # ── Disconnect ──────────────────────────────────────────
 
 @app.post("/api/disconnect")
@@ -677,8 +1407,13 @@ async def disconnect():
     """Disconnect Appium session."""
     try:
         if recorder_service.recording:
-            recorder_service.stop()
-        appium_service.disconnect()
+            await asyncio.to_thread(recorder_service.stop)
+        driver_actor.cancel_pending()
+        session_manager.shutdown()
+        if appium_service.driver is not None:
+            strategy_memory.forget_session(appium_service.driver.session_id)
+        await driver_actor.call(appium_service.disconnect, lane=CONTROL)
+        heartbeat.mark_dead()
         await broadcast_log("info", "Sesión de Appium cerrada.")
         return {"status": "disconnected"}
     except Exception as e:
@@ -1,7 +1,7 @@
 """
 AppiumService — Integrates with the existing Python automation scripts.
 Bridges the FastAPI endpoints with Appium/Selenium WebDriver.
-Uses pygetwindow for window detection (matching user's working scripts).
+Uses WindowLocator (pygetwindow-backed) for window detection.
 """
 import subprocess
 import time
@@ -9,73 +9,110 @@ import os
 import logging
 from typing import Optional
 
-import pygetwindow as gw
-from appium import webdriver
-from appium.options.windows import WindowsOptions
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from services.click_button_service import ClickButtonService
+# appium/selenium are imported inside the methods that drive the POS, so the
+# API can start (and be tested) on machines without the driver stack.
+from services.window_locator import WindowLocator, default_locator
+from services.driver_capabilities import (
+    DriverCapabilities, probe_capabilities, SCRIPT, WINDOWS_KEYS, ACTIVE_ELEMENT,
+)
 
 logger = logging.getLogger("appium_service")
 
+# send_keys step values -> "windows: keys" tokens
+WINDOWS_KEY_TOKENS = {
+    "Enter": "{ENTER}",
+    "Tab": "{TAB}",
+    "Escape": "{ESC}",
+    "F5": "{F5}",
+    "Backspace": "{BACKSPACE}",
+    "Delete": "{DELETE}",
+}
+
 
 class AppiumService:
-    def __init__(self):
+    def __init__(self, window_locator: WindowLocator = None):
         self.driver = None
+        self.window_locator = window_locator or default_locator
         self.app_process = None
         self.products: list[dict] = []
         self.stop_requested = False
         self.paused = False
         self.handle = None
+        self.appium_url = None
+        self.last_sale_cycle: Optional[dict] = None
+        self.capabilities = DriverCapabilities()
+        # How the last step found and clicked its element (read by the run store)
+        self.step_trace: dict = {}
 
     # ── Initialization Steps ────────────────────────────
 
-    def open_application(self, app_path: str):
-        """Open the POS application using pygetwindow (matching working script)."""
+    def open_application(self, app_path: str, timeout: float = 30):
+        """Open the POS application and wait until its window is ready.
+
+        Readiness is detected by WindowLocator polling window state with
+        backoff: visible, not minimized and a stable rect across two polls.
+        """
         logger.info(f"[OPEN_APP] Abriendo aplicación: {app_path}")
         if not os.path.exists(app_path):
             raise FileNotFoundError(f"No se encontró la aplicación en: {app_path}")
 
-        previous_windows = gw.getWindowsWithTitle("SimiPOS")
+        previous_windows = self.window_locator.windows()
         logger.info(f"[OPEN_APP] Ventanas antes de abrir: {len(previous_windows)}")
 
+        started = time.monotonic()
         self.app_process = subprocess.Popen(app_path)
-        time.sleep(3)
-
-        app_window = None
-        logger.info("[OPEN_APP] Buscando ventanas con título 'SimiPOS'...")
-        windows = gw.getWindowsWithTitle("SimiPOS")
-        logger.info(f"[OPEN_APP] Se encontraron {len(windows)} ventanas")
-
-        for i, win in enumerate(windows):
-            logger.info(f"[OPEN_APP] Ventana {i+1}: '{win.title}' (handle: {hex(win._hWnd)})")
-            if win.title:
-                app_window = win
-                break
-
-        if not app_window:
-            # Flexible search
-            logger.info("[OPEN_APP] Búsqueda flexible por contenido del título...")
-            all_windows = gw.getWindowsWithTitle("")
-            for win in all_windows:
-                if "SimiPOS" in win.title:
-                    app_window = win
-                    logger.info(f"[OPEN_APP] Encontrada ventana flexible: '{win.title}'")
-                    break
 
+        app_window = self.window_locator.wait_for_window(timeout)
         if not app_window:
             raise RuntimeError("No se encontró la ventana de la aplicación 'SimiPOS'.")
 
-        self.handle = hex(app_window._hWnd)
-        logger.info(f"[OPEN_APP] Aplicación abierta. Handle: {self.handle}")
+        self.handle = app_window.hex_handle
+        logger.info(f"[OPEN_APP] Aplicación abierta y ventana lista en {time.monotonic() - started:.2f}s. "
+                    f"Handle: {self.handle}")
+        return self.handle
 
-        logger.info("[OPEN_APP] Esperando a que la interfaz gráfica se cargue...")
-        time.sleep(3)
-        logger.info("[OPEN_APP] Aplicación abierta y UI cargada.")
+    def locate_window(self) -> Optional[str]:
+        """Find the running POS window (cached) and store its handle."""
+        app_window = self.window_locator.find()
+        if not app_window:
+            return None
+        self.handle = app_window.hex_handle
         return self.handle
 
+    def wait_for_ui_ready(self, timeout: float = 10) -> bool:
+        """Wait until the POS main screen is interactive (search box present)."""
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+
+        if not self.driver:
+            raise RuntimeError("Appium no conectado")
+        try:
+            WebDriverWait(self.driver, timeout, poll_frequency=0.2).until(
+                EC.presence_of_element_located((By.NAME, "Buscar producto"))
+            )
+            return True
+        except Exception:
+            logger.warning(f"[OPEN_APP] La pantalla principal no respondió en {timeout}s. Continuando...")
+            return False
+
+    def create_session(self, appium_url: str, handle: str):
+        """Create a new WebDriver session attached to the given window handle."""
+        from appium import webdriver
+        from appium.options.windows import WindowsOptions
+
+        options = WindowsOptions()
+        options.set_capability("appTopLevelWindow", handle)
+        options.set_capability("newCommandTimeout", 300)
+        # Minimal capabilities to avoid pointer issues while maintaining element detection
+        options.set_capability("automationName", "Windows")
+        options.set_capability("platformName", "Windows")
+
+        return webdriver.Remote(
+            command_executor=appium_url,
+            options=options
+        )
+
     def connect(self, appium_url: str, app_path: str = None):
         """Connect to Appium using the window handle (matching working script)."""
         handle = self.handle
@@ -85,51 +122,46 @@ class AppiumService:
         logger.info(f"[CONNECT] Conectando con Appium usando handle: {handle}...")
 
         try:
-            options = WindowsOptions()
-            options.set_capability("appTopLevelWindow", handle)
-            options.set_capability("newCommandTimeout", 300)
-            # Minimal capabilities to avoid pointer issues while maintaining element detection
-            options.set_capability("automationName", "Windows")
-            options.set_capability("platformName", "Windows")
-
-            self.driver = webdriver.Remote(
-                command_executor=appium_url,
-                options=options
-            )
+            self.driver = self.create_session(appium_url, handle)
+            self.appium_url = appium_url
             logger.info(f"[CONNECT] Conexión establecida. Sesión: {self.driver.session_id}")
-            time.sleep(1)
-            logger.info("[CONNECT] Esperando a que inicie Punto de venta.")
+            # Same server and app for every later session (standby/failover), so probe once here
+            self.capabilities = probe_capabilities(self.driver)
 
         except Exception as e:
             logger.error(f"[CONNECT] ERROR: {e}", exc_info=True)
             raise RuntimeError(f"No se pudo conectar con Appium: {e}")
 
-    def clear_order(self):
-        """Clear previous order (matching working clear_order.py)."""
+    def clear_order(self, timeout: float = 2):
+        """Clear the previous order through the sale cycle ('Borrar pedido'). Never raises on a miss."""
+        from services.sale_cycle import SaleCycle, SaleCycleError, READY
+
         if not self.driver:
             raise RuntimeError("Appium no conectado")
 
         logger.info("[CLEAR] Intentando borrar el pedido...")
-        max_intentos = 1
-        intento = 0
-
-        while intento < max_intentos:
-            try:
-                wait = WebDriverWait(self.driver, 2)
-                boton_borrar = wait.until(
-                    EC.presence_of_element_located((By.NAME, "Borrar pedido"))
-                )
-                boton_borrar.click()
-                logger.info("[CLEAR] Pedido borrado correctamente.")
-                return True
-            except Exception as e:
-                intento += 1
-                if intento < max_intentos:
-                    logger.info(f"[CLEAR] Intento {intento} fallido. Reintentando en 4 segundos...")
-                    time.sleep(4)
-
-        logger.warning("[CLEAR] No se pudo borrar el pedido. Continuando ejecución...")
-        return False
+        try:
+            report = SaleCycle(self.driver, clear=True, timeout=timeout).run(READY)
+        except SaleCycleError as e:
+            logger.warning(f"[CLEAR] No se pudo borrar el pedido ({e}). Continuando ejecución...")
+            return False
+        logger.info(f"[CLEAR] Pedido borrado correctamente en {report['total_ms']}ms.")
+        return True
+
+    def complete_sale(self, amount: float, timeout: float = 60) -> dict:
+        """Drive the sale from its current screen to a ready, empty POS (pay and continue)."""
+        from services.sale_cycle import SaleCycle, SaleCycleError, READY
+        from services.connectivity_monitor import default_monitor
+
+        cycle = SaleCycle(self.driver, amount=amount, timeout=timeout,
+                          should_stop=lambda: self.stop_requested, connectivity=default_monitor)
+        try:
+            report = cycle.run(READY)
+        except SaleCycleError as e:
+            logger.error(f"[SALE] {e}. Tiempo por estado: {e.report.get('time_in_state_ms')}")
+            raise RuntimeError(str(e))
+        self.last_sale_cycle = report
+        return report
 
     def load_products(self, products_file: str, products: list[dict]) -> int:
         """Load products from file or provided list."""
@@ -154,6 +186,10 @@ class AppiumService:
 
     def execute_step(self, step: dict, config: dict):
         """Execute a single automation step with retry and delay support."""
+        from selenium.webdriver.common.keys import Keys
+        from services.click_button_service import ClickButtonService
+
+        self.step_trace = {}
         logger.info(f"[STEP] Ejecutando: action={step.get('action_type')}, selector=[{step.get('selector_type')}] {step.get('selector_value')}, value={step.get('value')}")
 
         if not self.driver:
@@ -190,27 +226,39 @@ class AppiumService:
 
         element = None
         if selector_type and selector_value:
-            element = self._find_element_with_retry(selector_type, selector_value, retry_attempts, retry_delay)
+            element = self._find_element_with_retry(
+                selector_type, selector_value, retry_attempts, retry_delay,
+                fallbacks=step.get("fallback_selectors"),
+            )
+
+        # A compiled step picks its click strategy from the selector it was compiled from
+        origin = step.get("compiled_from") or {}
+        click_type = origin.get("selector_type") or selector_type
+        click_value = origin.get("selector_value") or selector_value
 
         if action == "click":
             if element:
                 # Special handling for unfocusable buttons and AutomationId elements
-                if selector_type == "xpath" and "AutomationId" in selector_value:
+                if click_type == "xpath" and "AutomationId" in click_value:
                     logger.info(f"[CLICK] Using ClickButtonService for unfocusable button...")
+                    click_service = ClickButtonService(self.driver)
                     try:
-                        click_service = ClickButtonService(self.driver)
-                        click_service.click_unfocusable_button(selector_type, selector_value, f"Button ({selector_value})")
+                        click_service.click_unfocusable_button(click_type, click_value, f"Button ({click_value})")
                     except Exception as e:
                         logger.warning(f"[CLICK] ClickButtonService failed: {e}, falling back to regular click...")
                         element.click()
-                elif selector_value == "Cobrar" or "Cobro" in selector_value:
+                    self.step_trace.update(click_strategy=click_service.last_strategy or "element_click",
+                                           strategy_fallbacks=click_service.fallbacks)
+                elif click_value == "Cobrar" or "Cobro" in click_value:
                     logger.info(f"[CLICK] Using ClickButtonService for Cobrar button...")
+                    click_service = ClickButtonService(self.driver)
                     try:
-                        click_service = ClickButtonService(self.driver)
-                        click_service.click_unfocusable_button(selector_type, selector_value, "Cobrar")
+                        click_service.click_unfocusable_button(click_type, click_value, "Cobrar")
                     except Exception as e:
                         logger.warning(f"[CLICK] ClickButtonService failed: {e}, falling back to regular click...")
                         element.click()
+                    self.step_trace.update(click_strategy=click_service.last_strategy or "element_click",
+                                           strategy_fallbacks=click_service.fallbacks)
                 else:
                     element.click()
             else:
@@ -218,13 +266,18 @@ class AppiumService:
 
         elif action == "double_click":
             if element:
-                # For WPF apps, use JavaScript instead of ActionChains
-                try:
-                    self.driver.execute_script("arguments[0].click();", element)
-                    time.sleep(0.1)
-                    self.driver.execute_script("arguments[0].click();", element)
-                except Exception as e:
-                    logger.warning(f"[DOUBLE_CLICK] JavaScript approach failed: {e}, trying direct click twice...")
+                # For WPF apps, use JavaScript instead of ActionChains (skipped when the driver runs no scripts)
+                clicked = False
+                if self.capabilities.allows(SCRIPT):
+                    try:
+                        self.driver.execute_script("arguments[0].click();", element)
+                        time.sleep(0.1)
+                        self.driver.execute_script("arguments[0].click();", element)
+                        clicked = True
+                    except Exception as e:
+                        self.capabilities.observe_failure(SCRIPT, e)
+                        logger.warning(f"[DOUBLE_CLICK] JavaScript approach failed: {e}, trying direct click twice...")
+                if not clicked:
                     element.click()
                     time.sleep(0.1)
                     element.click()
@@ -254,48 +307,31 @@ class AppiumService:
             if element:
                 element.send_keys(key)
             else:
-                # For WPF applications, try alternative methods without ActionChains
+                # No element: go straight to the driver-level path the capability probe found working
                 logger.warning(f"[SEND_KEYS] No element found, trying driver level methods...")
-                # Try sending key directly to the driver's active element if available
-                try:
-                    self.driver.switch_to.active_element.send_keys(key)
-                except Exception as e2:
-                        # If that fails, try using Windows-specific keys method which is available for WPF
+                sent = False
+                if self.capabilities.allows(ACTIVE_ELEMENT):
+                    try:
+                        self.driver.switch_to.active_element.send_keys(key)
+                        sent = True
+                    except Exception as e2:
+                        self.capabilities.observe_failure(ACTIVE_ELEMENT, e2)
                         logger.warning(f"[SEND_KEYS] Direct send_keys failed: {e2}. Trying Windows keys method...")
-                        try:
-                            # Use Windows-specific execute method with proper format
-                            if key == Keys.ENTER:
-                                self.driver.execute_script("windows: keys", ["{ENTER}"])
-                                logger.info(f"[SEND_KEYS] Windows keys method sent: Enter")
-                            elif key == Keys.TAB:
-                                self.driver.execute_script("windows: keys", ["{TAB}"])
-                                logger.info(f"[SEND_KEYS] Windows keys method sent: Tab")
-                            elif key == Keys.ESCAPE:
-                                self.driver.execute_script("windows: keys", ["{ESC}"])
-                                logger.info(f"[SEND_KEYS] Windows keys method sent: Escape")
-                            elif value == "F5":
-                                self.driver.execute_script("windows: keys", ["{F5}"])
-                                logger.info(f"[SEND_KEYS] Windows keys method sent: F5")
-                            elif value == "Backspace":
-                                self.driver.execute_script("windows: keys", ["{BACKSPACE}"])
-                                logger.info(f"[SEND_KEYS] Windows keys method sent: Backspace")
-                            elif value == "Delete":
-                                self.driver.execute_script("windows: keys", ["{DELETE}"])
-                                logger.info(f"[SEND_KEYS] Windows keys method sent: Delete")
-                            else:
-                                # For other values, try to send as string
-                                self.driver.execute_script("windows: keys", [str(value)])
-                                logger.info(f"[SEND_KEYS] Windows keys method sent: {value}")
-                        except Exception as e3:
-                            logger.warning(f"[SEND_KEYS] Windows keys method failed: {e3}")
-                            # For certain keys like Enter that are commonly used, don't fail hard
-                            if value in ["Enter", "Tab", "Escape"]:
-                                logger.info(f"[SEND_KEYS] Key '{value}' is commonly used, continuing without sending...")
-                                return {"status": "success", "message": f"Key '{value}' not sent but continuing"}
-                            else:
-                                raise RuntimeError(f"No se pudo enviar la tecla '{value}' sin un elemento válido")
-                        # If all else fails, log warning and continue (the step might still work)
-                        logger.warning(f"[SEND_KEYS] All methods failed to send key {key}. Continuing...")
+                if not sent and self.capabilities.allows(WINDOWS_KEYS):
+                    try:
+                        # Use Windows-specific execute method with proper format
+                        self.driver.execute_script("windows: keys", [WINDOWS_KEY_TOKENS.get(value, str(value))])
+                        logger.info(f"[SEND_KEYS] Windows keys method sent: {value}")
+                        sent = True
+                    except Exception as e3:
+                        self.capabilities.observe_failure(WINDOWS_KEYS, e3)
+                        logger.warning(f"[SEND_KEYS] Windows keys method failed: {e3}")
+                if not sent:
+                    # For certain keys like Enter that are commonly used, don't fail hard
+                    if value in ["Enter", "Tab", "Escape"]:
+                        logger.info(f"[SEND_KEYS] Key '{value}' is commonly used, continuing without sending...")
+                        return {"status": "success", "message": f"Key '{value}' not sent but continuing"}
+                    raise RuntimeError(f"No se pudo enviar la tecla '{value}' sin un elemento válido")
 
         elif action == "wait":
             time.sleep(wait_time / 1000)
@@ -328,11 +364,15 @@ class AppiumService:
                 raise RuntimeError(f"Elemento no encontrado: {selector_value}")
 
         elif action == "scroll":
-            if element:
+            if element and not self.capabilities.allows(SCRIPT):
+                # Scroll is not critical and every scroll path here is a script
+                logger.info("[SCROLL] El driver no ejecuta scripts; se omite el scroll.")
+            elif element:
                 # For WPF apps, use JavaScript instead of ActionChains
                 try:
                     self.driver.execute_script("arguments[0].scrollIntoView(true);", element)
                 except Exception as e:
+                    self.capabilities.observe_failure(SCRIPT, e)
                     logger.warning(f"[SCROLL] JavaScript scroll failed: {e}, trying element scroll...")
                     try:
                         # Try native element scroll as fallback
@@ -342,18 +382,27 @@ class AppiumService:
                         # Scroll is not critical, continue without it
                         pass
 
+        elif action == "complete_sale":
+            amount = config.get("payment_amount") if value in (None, "", "{{payment_amount}}") else value
+            report = self.complete_sale(float(amount) if amount else None)
+            return {"status": "success", "sale_cycle": report}
+
         elif action == "search_product":
             # This action is handled at flow level (iterates products), not here
             # If called directly, just type the value
-            if element and value and value != "{{products}}":
+            if element and value and value != "{{products}}" and not value.startswith("["):
                 element.click()
                 element.clear()
                 element.send_keys(value)
 
         return {"status": "success"}
 
-    def _find_element(self, selector_type: str, selector_value: str):
+    def _find_element(self, selector_type: str, selector_value: str, timeout: float = 5):
         """Find element by selector type (single attempt)."""
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+
         by_map = {
             "name": By.NAME,
             "xpath": By.XPATH,
@@ -366,7 +415,7 @@ class AppiumService:
 
         try:
             # Try the primary selector first
-            element = WebDriverWait(self.driver, 5).until(
+            element = WebDriverWait(self.driver, timeout).until(
                 EC.presence_of_element_located((by, selector_value))
             )
             if element:
@@ -403,14 +452,30 @@ class AppiumService:
 
         return None
 
-    def _find_element_with_retry(self, selector_type: str, selector_value: str, max_retries: int = 3, retry_delay: int = 2000):
-        """Find element with retry logic for slow-loading screens."""
+    def _find_element_with_retry(self, selector_type: str, selector_value: str, max_retries: int = 3,
+                                 retry_delay: int = 2000, fallbacks: Optional[list[dict]] = None):
+        """Find element with retry logic for slow-loading screens.
+
+        Ranked ``fallbacks`` (from selector scoring) are tried with a short wait
+        whenever the primary selector misses on an attempt.
+        """
         for attempt in range(1, max_retries + 1):
+            self.step_trace["lookup_attempts"] = attempt
             element = self._find_element(selector_type, selector_value)
             if element is not None:
                 if attempt > 1:
                     logger.info(f"[RETRY] Elemento encontrado en intento {attempt}: [{selector_type}] {selector_value}")
                 return element
+            for fallback in fallbacks or []:
+                fb_type, fb_value = fallback.get("selector_type"), fallback.get("selector_value")
+                # An ambiguous fallback (older recordings) would act on whichever element matches first
+                if not fb_type or not fb_value or fallback.get("unique") is False:
+                    continue
+                element = self._find_element(fb_type, fb_value, timeout=1)
+                if element is not None:
+                    logger.info(f"[FALLBACK] Elemento encontrado con selector alternativo: [{fb_type}] {fb_value}")
+                    self.step_trace["fallback_selector"] = f"{fb_type}:{fb_value}"
+                    return element
             if attempt < max_retries:
                 logger.warning(f"[RETRY] Intento {attempt}/{max_retries} fallido para [{selector_type}] {selector_value}. Esperando {retry_delay}ms...")
                 time.sleep(retry_delay / 1000)
@@ -418,6 +483,8 @@ class AppiumService:
 
     def _select_combo(self, combo_name: str, option: str):
         """Select a combo box option (matching working select_combo_box.py)."""
+        from selenium.webdriver.common.by import By
+
         try:
             combo = self.driver.find_element(By.NAME, combo_name)
             combo.click()
@@ -449,6 +516,9 @@ class AppiumService:
     
     def _select_radio_fallback(self, radio_name: str):
         """Fallback method using the original implementation."""
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.common.keys import Keys
+
         logger.info(f"[RADIO] Usando método fallback para '{radio_name}'...")
 
         max_wait = 60
@@ -746,6 +816,8 @@ class AppiumService:
 
     def capture_elements_for_picker(self) -> list[dict]:
         """Capture visible UI elements for the visual element picker."""
+        from selenium.webdriver.common.by import By
+
         if not self.driver:
             raise RuntimeError("Appium no conectado")
 
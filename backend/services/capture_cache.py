@@ -0,0 +1,58 @@
+"""
+CaptureCache — Single-flight, short-TTL cache for full UI captures.
+Concurrent identical capture requests share one in-flight capture instead of
+each walking the whole UI tree. A finished capture is reused for a short TTL
+as long as the UI-state version (bumped by every run/control job on the
+driver) has not changed; the TTL bounds staleness from manual interaction.
+"""
+import asyncio
+import time
+import logging
+from typing import Awaitable, Callable
+
+logger = logging.getLogger("capture_cache")
+
+FRESH = "fresh"
+COALESCED = "coalesced"
+CACHED = "cached"
+
+
+class CaptureCache:
+    def __init__(self, ttl: float = 2.0):
+        self.ttl = ttl
+        self._entries: dict = {}    # key -> (version, captured_at, value)
+        self._inflight: dict = {}   # key -> (version, task)
+        self.counts = {FRESH: 0, COALESCED: 0, CACHED: 0}
+
+    async def get(self, key: str, version, loader: Callable[[], Awaitable], fresh: bool = False) -> tuple:
+        """``(value, source, age_ms)``; ``fresh`` skips the TTL cache but still joins an in-flight capture."""
+        entry = self._entries.get(key)
+        if not fresh and entry and entry[0] == version and time.monotonic() - entry[1] < self.ttl:
+            self.counts[CACHED] += 1
+            return entry[2], CACHED, round((time.monotonic() - entry[1]) * 1000)
+
+        inflight = self._inflight.get(key)
+        if inflight and inflight[0] == version:
+            self.counts[COALESCED] += 1
+            value = await asyncio.shield(inflight[1])
+            return value, COALESCED, 0
+
+        task = asyncio.ensure_future(loader())
+        self._inflight[key] = (version, task)
+        try:
+            value = await asyncio.shield(task)
+        finally:
+            if self._inflight.get(key, (None, None))[1] is task:
+                del self._inflight[key]
+        self._entries[key] = (version, time.monotonic(), value)
+        self.counts[FRESH] += 1
+        return value, FRESH, 0
+
+    def invalidate(self, key: str = None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        return {"ttl": self.ttl, **self.counts}
@@ -1,33 +1,17 @@
-import time
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.by import By
+from services.sale_cycle import SaleCycle, SaleCycleError, READY
 
 class ClearOrderError(Exception):
     """Excepción personalizada para errores al borrar el pedido."""
     pass
 
-def clear_order(driver):
-    """Limpia el pedido actual haciendo clic en 'Borrar pedido', con hasta 2 intentos. Si falla, continúa."""
+def clear_order(driver, timeout=2):
+    """Limpia el pedido actual con el ciclo de venta (clic en 'Borrar pedido'). Si falla, continúa."""
     print("[INICIANDO] Intentando borrar el pedido...")
-    max_intentos = 1
-    intento = 0
-
-    while intento < max_intentos:
-        try:
-            wait = WebDriverWait(driver, 2)
-            boton_borrar = wait.until(
-                EC.presence_of_element_located((By.NAME, "Borrar pedido"))
-            )
-            boton_borrar.click()
-            print("[ÉXITO] Pedido borrado correctamente.")
-            return True
-        except Exception as e:
-            intento += 1
-            print(f"[INFO] Intento {intento} fallido. {('Reintentando en 4 segundos...' if intento < max_intentos else 'No se pudo borrar el pedido.')}")
-            if intento < max_intentos:
-                time.sleep(4)
-
-    # No lanzar excepción: solo avisar
-    print("[ADVERTENCIA] No se pudo borrar el pedido después de 2 intentos. Continuando ejecución...")
-    return False
+    try:
+        report = SaleCycle(driver, clear=True, timeout=timeout).run(READY)
+        print(f"[ÉXITO] Pedido borrado correctamente ({report['total_ms']}ms).")
+        return True
+    except SaleCycleError as e:
+        # No lanzar excepción: solo avisar
+        print(f"[ADVERTENCIA] No se pudo borrar el pedido ({e}). Continuando ejecución...")
+        return False
@@ -9,14 +9,25 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
+from services.strategy_memory import StrategyMemory, strategy_memory
+from services.payment_detector import PaymentDetector, MODAL_PENDING
+
 logger = logging.getLogger(__name__)
 
+
 class ClickButtonService:
-    def __init__(self, driver):
+    def __init__(self, driver, memory: StrategyMemory = None):
         self.driver = driver
+        self.memory = memory or strategy_memory
+        self.last_strategy = None
+        self.fallbacks = 0  # strategies tried before the one that worked
 
     def click_unfocusable_button(self, selector_type: str, selector_value: str, description: str = "Button"):
-        """Click a button that cannot receive keyboard focus using multiple strategies."""
+        """Click a button that cannot receive keyboard focus using multiple strategies.
+
+        The strategy that last worked for this target in this session is tried
+        first; attempts and latencies are recorded per strategy.
+        """
         logger.info(f"[CLICK_BUTTON] Attempting to click unfocusable button: {description}")
         
         strategies = [
@@ -27,16 +38,28 @@ class ClickButtonService:
             self._strategy_coordinate_click,
             self._strategy_windows_native_click,
         ]
+        session_id = getattr(self.driver, "session_id", None)
+        target = f"{selector_type}:{selector_value}"
+        ordered = self.memory.order(session_id, target, strategies)
         
-        for i, strategy in enumerate(strategies, 1):
+        for i, strategy in enumerate(ordered, 1):
+            started = time.perf_counter()
+            ok = False
+            error = None
             try:
                 logger.info(f"[CLICK_BUTTON] Strategy {i}: {strategy.__name__}")
-                if strategy(selector_type, selector_value, description):
-                    logger.info(f"[CLICK_BUTTON] ✓ Button '{description}' clicked successfully with strategy {i}")
-                    return True
+                ok = bool(strategy(selector_type, selector_value, description))
             except Exception as e:
-                logger.warning(f"[CLICK_BUTTON] Strategy {i} failed: {e}")
-                if i < len(strategies):
+                error = e
+            self.memory.record(session_id, target, strategy.__name__, ok, (time.perf_counter() - started) * 1000)
+            if ok:
+                self.last_strategy, self.fallbacks = strategy.__name__, i - 1
+                logger.info(f"[CLICK_BUTTON] ✓ Button '{description}' clicked successfully with strategy {i} "
+                            f"({strategy.__name__})")
+                return True
+            if error is not None:
+                logger.warning(f"[CLICK_BUTTON] Strategy {i} failed: {error}")
+                if i < len(ordered):
                     time.sleep(0.5)  # Small delay between strategies
         
         raise RuntimeError(f"Failed to click unfocusable button '{description}' after all strategies")
@@ -164,10 +187,10 @@ class ClickButtonService:
                 
                 for x, y in positions_to_try:
                     try:
+                        detector = PaymentDetector(self.driver).arm()
                         self.driver.execute("windows", "click", [{"x": x, "y": y}])
-                        time.sleep(0.5)
-                        # Check if payment was processed by looking for success indicators
-                        if self._check_payment_success():
+                        # Check if payment was processed: returns as soon as a completion signal fires
+                        if self._check_payment_success(detector):
                             return True
                     except:
                         continue
@@ -196,33 +219,12 @@ class ClickButtonService:
             pass
         return False
 
-    def _check_payment_success(self):
-        """Check if payment was successfully processed."""
+    def _check_payment_success(self, detector: PaymentDetector = None, timeout: float = 1.5):
+        """Check if payment was successfully processed (event-based, see PaymentDetector)."""
         try:
-            # Look for success indicators like absence of payment dialog
-            time.sleep(1)
-            
-            # Try to find payment elements - if they're gone, payment succeeded
-            payment_elements = self.driver.find_elements(By.XPATH, "//*[@Name='Métodos de pago']")
-            if not payment_elements:
-                # Also check for success dialogs or completion indicators
-                success_indicators = [
-                    "//*[contains(@Name, 'exitoso')]",
-                    "//*[contains(@Name, 'completado')]", 
-                    "//*[contains(@Name, 'éxito')]",
-                    "//dialog[@Name='']"
-                ]
-                
-                for indicator in success_indicators:
-                    try:
-                        element = self.driver.find_element(By.XPATH, indicator)
-                        if element:
-                            return True
-                    except:
-                        continue
-                
-                # If no payment elements found, assume success
-                return True
-        except:
-            pass
-        return False
\ No newline at end of file
+            detector = detector or PaymentDetector(self.driver).arm()
+            outcome = detector.wait(timeout)
+            # A modal right after the click means the click landed; the caller handles the modal
+            return outcome["completed"] or outcome["signal"] == MODAL_PENDING
+        except Exception:
+            return False
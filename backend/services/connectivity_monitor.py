@@ -0,0 +1,144 @@
+"""
+ConnectivityMonitor — Background network reachability probe.
+Probes a configurable TCP target (Google DNS by default, or a local stand-in)
+from a background thread with a per-connection timeout, so global socket
+settings are never touched. Publishes a cached status and lets callers block
+until the network is back, waking them as soon as a probe succeeds.
+"""
+import socket
+import threading
+import time
+import logging
+from typing import Optional
+
+logger = logging.getLogger("connectivity_monitor")
+
+DEFAULT_TARGET = ("8.8.8.8", 53)
+
+
+def parse_target(target) -> tuple:
+    """Accept ``(host, port)`` or ``"host:port"`` (port defaults to 53)."""
+    if isinstance(target, (tuple, list)):
+        return (str(target[0]), int(target[1]))
+    host, _, port = str(target).strip().rpartition(":")
+    if not host:
+        return (port, 53)
+    return (host, int(port))
+
+
+class ConnectivityMonitor:
+    def __init__(self, target=DEFAULT_TARGET, interval: float = 5.0, offline_interval: float = 1.0,
+                 timeout: float = 3.0):
+        self.target = parse_target(target)
+        self.interval = interval
+        self.offline_interval = offline_interval
+        self.timeout = timeout
+        self._online: Optional[bool] = None
+        self._checked_at: Optional[float] = None
+        self._last_change: Optional[float] = None
+        self._lock = threading.Lock()
+        self._online_event = threading.Event()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.probes = 0
+        self.outages = 0
+
+    # ── Lifecycle ───────────────────────────────────────
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="connectivity-monitor", daemon=True)
+        self._thread.start()
+        logger.info(f"[NET] Monitor iniciado ({self.target[0]}:{self.target[1]}, intervalo {self.interval}s)")
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def configure(self, target=None, interval: float = None):
+        """Change target and/or interval; the next probe runs immediately."""
+        if target:
+            self.target = parse_target(target)
+        if interval is not None:
+            if interval <= 0:
+                raise ValueError("El intervalo de conectividad debe ser positivo")
+            self.interval = interval
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.refresh()
+            # Probe faster while offline so waiters resume promptly
+            self._wake.wait(self.interval if self._online else self.offline_interval)
+            self._wake.clear()
+
+    # ── Probing ─────────────────────────────────────────
+
+    def probe(self) -> bool:
+        """One TCP connect with its own timeout (no socket.setdefaulttimeout)."""
+        try:
+            with socket.create_connection(self.target, timeout=self.timeout):
+                return True
+        except OSError:
+            return False
+
+    def refresh(self) -> bool:
+        online = self.probe()
+        self.probes += 1
+        self._publish(online)
+        return online
+
+    def _publish(self, online: bool):
+        with self._lock:
+            changed = self._online != online
+            if changed and self._online is not None:
+                logger.info(f"[NET] Conexión {'restablecida' if online else 'perdida'} "
+                            f"({self.target[0]}:{self.target[1]})")
+                if not online:
+                    self.outages += 1
+            if changed:
+                self._last_change = time.time()
+            self._online = online
+            self._checked_at = time.time()
+        if online:
+            self._online_event.set()
+        else:
+            self._online_event.clear()
+
+    # ── Consumers ───────────────────────────────────────
+
+    @property
+    def online(self) -> bool:
+        """Cached status; probes once (blocking) if nothing has been checked yet."""
+        if self._online is None:
+            return self.refresh()
+        return self._online
+
+    def wait_until_online(self, timeout: float = None) -> bool:
+        """Block until a probe succeeds. Returns False if ``timeout`` passes first."""
+        self.start()
+        if self.online:
+            return True
+        self._wake.set()
+        return self._online_event.wait(timeout)
+
+    def status(self) -> dict:
+        with self._lock:
+            checked_at = self._checked_at
+            return {
+                "online": self._online,
+                "target": f"{self.target[0]}:{self.target[1]}",
+                "checked_at": checked_at,
+                "age_ms": round((time.time() - checked_at) * 1000) if checked_at else None,
+                "last_change": self._last_change,
+                "interval": self.interval,
+                "probes": self.probes,
+                "outages": self.outages,
+            }
+
+
+# Shared monitor used by continue_sale and the API
+default_monitor = ConnectivityMonitor()
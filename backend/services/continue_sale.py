@@ -1,59 +1,36 @@
-import time
-import socket
-import pygetwindow as gw
+from services.window_locator import get_current_windows, wait_for_window_change
+from services.sale_cycle import SaleCycle, CONTINUE
+from services.connectivity_monitor import default_monitor
 
 class ContinueSaleError(Exception):
     """Excepción personalizada para errores al continuar con la venta."""
     pass
 
 def check_internet_connection(timeout=3):
-    """Verifica si hay conexión a internet intentando conectarse a Google DNS."""
-    try:
-        socket.setdefaulttimeout(timeout)
-        host = socket.gethostbyname("8.8.8.8")
-        s = socket.create_connection((host, 53), timeout)
-        s.close()
-        return True
-    except Exception:
-        return False
-
-def get_current_windows():
-    """Obtiene una lista actual de ventanas con título 'SimiPOS'."""
-    return gw.getWindowsWithTitle("SimiPOS")
+    """Estado de conexión cacheado por el monitor en segundo plano (sin tocar el timeout global de sockets)."""
+    default_monitor.start()
+    return default_monitor.online
 
-def continue_sale(driver):
+def continue_sale(driver, timeout=60):
     """Hace clic en el botón 'Continuar' solo si hay internet, asegurando que el clic fue exitoso."""
     try:
-        # Espera hasta que haya internet
-        while not check_internet_connection():
-            print("[ADVERTENCIA] No hay conexión a internet. Esperando para reintentar...")
-            time.sleep(5)
+        # Espera hasta que haya internet (despierta en cuanto el monitor detecta la reconexión)
+        if not check_internet_connection():
+            print("[ADVERTENCIA] No hay conexión a internet. Esperando reconexión...")
+            default_monitor.wait_until_online()
 
         # Capturar ventanas antes de hacer clic en continuar
         previous_windows = get_current_windows()
         print(f"[INFO] Ventanas antes de hacer clic en 'Continuar': {len(previous_windows)}")
 
-        # Intenta hacer clic hasta que el botón desaparezca
-        while True:
-            try:
-                continuar_btn = driver.find_element("name", "Continuar")
-                continuar_btn.click()
-                print("[INFO] Se hizo clic en 'Continuar'. Verificando si desaparece el botón...")
-                time.sleep(2)
-                # Verifica si el botón sigue presente
-                driver.find_element("name", "Continuar")
-                print("[ADVERTENCIA] El botón 'Continuar' sigue presente. Reintentando clic...")
-                time.sleep(2)
-            except Exception:
-                print("[ÉXITO] Botón 'Continuar' ya no está presente. Continuando con la venta...")
-                break
-        
+        # Ciclo de venta: clic en 'Continuar' hasta que la pantalla avance
+        report = SaleCycle(driver, timeout=timeout).run(CONTINUE)
+        print(f"[ÉXITO] Botón 'Continuar' ya no está presente ({report['total_ms']}ms). Continuando con la venta...")
+
         # Esperar a que cambie de ventana después de continuar
         print("[INFO] Esperando cambio de ventana después de continuar con la venta...")
-        time.sleep(1)  # Pequeño retraso inicial
         if len(previous_windows) > 0:
-            # Usar la función auxiliar para esperar cambio de ventana
-            from main import wait_for_window_change
+            # Usar el localizador compartido para esperar cambio de ventana
             wait_for_window_change(previous_windows, timeout=5)
         else:
             print("[INFO] No hay ventanas previas para comparar, continuando...")
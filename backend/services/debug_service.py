@@ -2,8 +2,11 @@
 DebugService — Screen element capture and analysis.
 Integrates logic from debug_elements.py, debug_tool.py, config_debug.py, screen_debug.py.
 """
+import logging
 from typing import Optional
 
+logger = logging.getLogger("debug_service")
+
 
 class DebugService:
     def capture_elements(self, driver) -> list[dict]:
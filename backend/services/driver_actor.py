@@ -0,0 +1,213 @@
+"""
+DriverActor — Single owner thread for all commands on a driver session.
+Selenium sessions are not safe to drive from several threads at once, and
+runs, health probes and debug captures used to race through arbitrary
+``asyncio.to_thread`` workers. Every driver job now goes through one thread
+fed by a priority queue (control > run > health > debug), so a queued run step
+is never stuck behind a picker capture. Jobs carry a timeout and can be
+cancelled while still queued; a job that is already running cannot be
+interrupted (the WebDriver call has to return), only abandoned.
+"""
+import asyncio
+import itertools
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import CancelledError as FutureCancelled, Future, TimeoutError as FutureTimeout
+from typing import Callable, Optional
+
+logger = logging.getLogger("driver_actor")
+
+# Lanes, lower runs first
+CONTROL = 0
+RUN = 1
+HEALTH = 2
+DEBUG = 3
+LANE_NAMES = {CONTROL: "control", RUN: "run", HEALTH: "health", DEBUG: "debug"}
+
+# Lanes whose jobs may change what is on screen (bump the UI version)
+MUTATING_LANES = (CONTROL, RUN)
+
+# Default end-to-end timeout per lane (queue wait + execution), seconds; None waits forever
+DEFAULT_TIMEOUTS = {CONTROL: None, RUN: None, HEALTH: 5.0, DEBUG: 30.0}
+
+
+class DriverTimeout(TimeoutError):
+    pass
+
+
+class DriverCancelled(RuntimeError):
+    """The job was cancelled while still queued (``cancel_pending``), not the caller itself."""
+
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "lane", "future", "queued_at", "started_at", "label")
+
+    def __init__(self, fn: Callable, args: tuple, kwargs: dict, lane: int, label: str):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.lane = lane
+        self.future: Future = Future()
+        self.queued_at = time.perf_counter()
+        self.started_at: Optional[float] = None
+        self.label = label
+
+
+class DriverActor:
+    def __init__(self, name: str = "driver-actor"):
+        self.name = name
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._current: Optional[_Job] = None
+        self._ui_version = 0
+        self._stats = {lane: {"done": 0, "failed": 0, "cancelled": 0, "timeouts": 0,
+                              "wait_ms": 0.0, "run_ms": 0.0, "max_wait_ms": 0.0} for lane in LANE_NAMES}
+
+    # ── Lifecycle ───────────────────────────────────────
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            _, _, job = self._queue.get()
+            if not job.future.set_running_or_notify_cancel():
+                self._stats[job.lane]["cancelled"] += 1
+                continue
+            job.started_at = time.perf_counter()
+            waited = (job.started_at - job.queued_at) * 1000
+            self._current = job
+            mutating = job.lane in MUTATING_LANES
+            if mutating:
+                self._ui_version += 1
+            try:
+                job.future.set_result(job.fn(*job.args, **job.kwargs))
+                outcome = "done"
+            except BaseException as e:
+                job.future.set_exception(e)
+                outcome = "failed"
+            finally:
+                self._current = None
+                if mutating:
+                    self._ui_version += 1
+            stats = self._stats[job.lane]
+            stats[outcome] += 1
+            stats["wait_ms"] += waited
+            stats["max_wait_ms"] = max(stats["max_wait_ms"], waited)
+            stats["run_ms"] += (time.perf_counter() - job.started_at) * 1000
+
+    @property
+    def ui_version(self) -> int:
+        """Changes whenever a control/run job starts or ends; odd while one is running."""
+        return self._ui_version
+
+    @property
+    def on_actor_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    # ── Submission ──────────────────────────────────────
+
+    def submit(self, fn: Callable, *args, lane: int = RUN, label: str = None, **kwargs) -> Future:
+        """Queue a job; the returned future can be cancelled until the job starts."""
+        job = _Job(fn, args, kwargs, lane, label or getattr(fn, "__name__", "job"))
+        if self.on_actor_thread:
+            # Nested call from a running job: run inline instead of deadlocking on our own queue
+            job.future.set_running_or_notify_cancel()
+            try:
+                job.future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                job.future.set_exception(e)
+            return job.future
+        self.start()
+        self._queue.put((lane, next(self._seq), job))
+        return job.future
+
+    def _timeout(self, lane: int, timeout):
+        return DEFAULT_TIMEOUTS[lane] if timeout is ... else timeout
+
+    def _on_timeout(self, future: Future, lane: int, label: str, timeout: float):
+        started = not future.cancel()
+        self._stats[lane]["timeouts"] += 1
+        logger.warning(f"[ACTOR] '{label}' ({LANE_NAMES[lane]}) superó {timeout}s "
+                       f"{'en ejecución' if started else 'en cola; cancelado'}")
+        return DriverTimeout(f"Operación del driver '{label}' excedió {timeout}s")
+
+    def run(self, fn: Callable, *args, lane: int = RUN, timeout=..., label: str = None, **kwargs):
+        """Blocking call from a plain thread (heartbeat, recorder...)."""
+        label = label or getattr(fn, "__name__", "job")
+        timeout = self._timeout(lane, timeout)
+        future = self.submit(fn, *args, lane=lane, label=label, **kwargs)
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            raise self._on_timeout(future, lane, label, timeout) from None
+        except FutureCancelled:
+            raise DriverCancelled(f"Operación del driver '{label}' cancelada") from None
+
+    async def call(self, fn: Callable, *args, lane: int = RUN, timeout=..., label: str = None, **kwargs):
+        """Await a driver job from the event loop without blocking it."""
+        label = label or getattr(fn, "__name__", "job")
+        timeout = self._timeout(lane, timeout)
+        future = self.submit(fn, *args, lane=lane, label=label, **kwargs)
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            raise self._on_timeout(future, lane, label, timeout) from None
+        except asyncio.CancelledError:
+            if future.cancelled():
+                # Cancelled in the queue by cancel_pending: a normal error for the caller, not a task cancel
+                raise DriverCancelled(f"Operación del driver '{label}' cancelada") from None
+            future.cancel()
+            raise
+
+    def cancel_pending(self, lanes: tuple = None) -> int:
+        """Cancel every queued (not yet started) job, optionally only in some lanes."""
+        cancelled = 0
+        with self._queue.mutex:
+            for _, _, job in self._queue.queue:
+                if (lanes is None or job.lane in lanes) and job.future.cancel():
+                    cancelled += 1
+        if cancelled:
+            logger.info(f"[ACTOR] {cancelled} operación(es) en cola canceladas")
+        return cancelled
+
+    # ── Introspection ───────────────────────────────────
+
+    def stats(self) -> dict:
+        current = self._current
+        with self._queue.mutex:
+            pending = [job for _, _, job in self._queue.queue if not job.future.cancelled()]
+        lanes = {}
+        for lane, st in self._stats.items():
+            finished = st["done"] + st["failed"]
+            lanes[LANE_NAMES[lane]] = {
+                "queued": sum(1 for job in pending if job.lane == lane),
+                "done": st["done"],
+                "failed": st["failed"],
+                "cancelled": st["cancelled"],
+                "timeouts": st["timeouts"],
+                "avg_wait_ms": round(st["wait_ms"] / finished, 1) if finished else None,
+                "max_wait_ms": round(st["max_wait_ms"], 1),
+                "avg_run_ms": round(st["run_ms"] / finished, 1) if finished else None,
+            }
+        return {
+            "ui_version": self._ui_version,
+            "running": {
+                "label": current.label,
+                "lane": LANE_NAMES[current.lane],
+                "elapsed_ms": round((time.perf_counter() - current.started_at) * 1000, 1),
+            } if current else None,
+            "lanes": lanes,
+        }
+
+
+# Owner of the POS driver session
+driver_actor = DriverActor()
@@ -0,0 +1,89 @@
+"""
+DriverCapabilities — One-time probe of what the connected driver supports.
+Run at connect time so step handlers can go straight to the input path that
+works on this driver (WinAppDriver rejects JavaScript, for example) instead of
+paying for the same failing attempt on every step.
+"""
+import time
+import logging
+from typing import Optional
+
+logger = logging.getLogger("driver_capabilities")
+
+# Capability names
+SCRIPT = "script"                  # execute_script with JavaScript
+WINDOWS_KEYS = "windows_keys"      # execute_script("windows: keys", ...)
+ACTIVE_ELEMENT = "active_element"  # switch_to.active_element
+
+# Error fragments that mean "this driver does not implement the command";
+# anything else (bad arguments, no focused element...) means it does.
+UNSUPPORTED_MARKERS = (
+    "not implemented", "unknown command", "unknowncommand", "not supported", "unsupported",
+    "unknown method", "javascript", "unrecognized command",
+)
+
+
+def _is_unsupported(error: Exception) -> bool:
+    message = str(error).lower()
+    return any(marker in message for marker in UNSUPPORTED_MARKERS)
+
+
+class DriverCapabilities:
+    def __init__(self, results: dict = None, probe_ms: float = None):
+        self.results = dict(results or {})
+        self.probe_ms = probe_ms
+
+    def supports(self, name: str) -> Optional[bool]:
+        """True/False once probed; None when the capability was never probed (callers try it)."""
+        return self.results.get(name)
+
+    def allows(self, name: str) -> bool:
+        """Whether a path is worth trying: probed as supported, or unknown."""
+        return self.results.get(name) is not False
+
+    def observe_failure(self, name: str, error: Exception):
+        """A step hit an "unsupported command" error at runtime: stop trying that path."""
+        if _is_unsupported(error) and self.results.get(name) is not False:
+            self.results[name] = False
+            logger.info(f"[CAPS] {name} marcado como no soportado: {error}")
+
+    def to_dict(self) -> dict:
+        return {"results": dict(self.results), "probe_ms": self.probe_ms}
+
+
+def _probe_script(driver) -> bool:
+    driver.execute_script("return 1;")
+    return True
+
+
+def _probe_windows_keys(driver) -> bool:
+    # Same argument form as AppiumService's send_keys fallback; an empty token types nothing
+    driver.execute_script("windows: keys", [""])
+    return True
+
+
+def _probe_active_element(driver) -> bool:
+    return driver.switch_to.active_element is not None
+
+
+PROBES = {
+    SCRIPT: _probe_script,
+    WINDOWS_KEYS: _probe_windows_keys,
+    ACTIVE_ELEMENT: _probe_active_element,
+}
+
+
+def probe_capabilities(driver) -> DriverCapabilities:
+    """Run every probe once against a fresh session; never raises."""
+    started = time.perf_counter()
+    results = {}
+    for name, probe in PROBES.items():
+        try:
+            results[name] = bool(probe(driver))
+        except Exception as e:
+            results[name] = not _is_unsupported(e)
+            logger.debug(f"[CAPS] {name}: {e}")
+    probe_ms = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(f"[CAPS] Capacidades del driver en {probe_ms}ms: "
+                f"{', '.join(f'{k}={v}' for k, v in results.items())}")
+    return DriverCapabilities(results, probe_ms)
@@ -0,0 +1,154 @@
+"""
+FailureArtifacts — Screenshot and page source captured at the moment a step fails.
+The two driver reads run as one high-priority job on the driver actor, before
+the operator gets a chance to change the screen; compression and disk writes
+happen in a background process so the runner never waits for them. Artifacts
+live in a bounded on-disk ring (oldest removed first), one folder per failure,
+linked to the run id and step index.
+"""
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from services.driver_actor import DriverActor, CONTROL, driver_actor
+
+logger = logging.getLogger("failure_artifacts")
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "artifacts")
+SCREENSHOT = "screenshot.png"
+PAGE_SOURCE = "page_source.xml.gz"
+META = "meta.json"
+
+
+def _store(root: str, artifact_id: str, meta: dict, png: Optional[bytes], xml: Optional[str], keep: int) -> dict:
+    """Runs in the worker process: compress, write the artifact folder, trim the ring."""
+    folder = os.path.join(root, artifact_id)
+    os.makedirs(folder, exist_ok=True)
+    if png:
+        with open(os.path.join(folder, SCREENSHOT), "wb") as f:
+            f.write(png)
+    if xml:
+        with gzip.open(os.path.join(folder, PAGE_SOURCE), "wb", compresslevel=6) as f:
+            f.write(xml.encode("utf-8"))
+    meta = {**meta, "bytes": sum(os.path.getsize(os.path.join(folder, n)) for n in os.listdir(folder))}
+    with open(os.path.join(folder, META), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    # Ids start with a timestamp, so name order is age order
+    folders = sorted(n for n in os.listdir(root) if os.path.isdir(os.path.join(root, n)))
+    for old in folders[:max(0, len(folders) - keep)]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return meta
+
+
+class FailureArtifacts:
+    def __init__(self, root: str = DEFAULT_ROOT, keep: int = 50, actor: DriverActor = None):
+        self.root = root
+        self.keep = keep
+        self.actor = actor or driver_actor
+        self._pool: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self.captured = 0
+        self.failed = 0
+
+    def _executor(self) -> Executor:
+        with self._lock:
+            if self._pool is None:
+                try:
+                    self._pool = ProcessPoolExecutor(max_workers=1)
+                except (OSError, NotImplementedError) as e:
+                    # No process support (restricted host): keep it off the hot path with a thread
+                    logger.info(f"[ARTIFACTS] Sin procesos en segundo plano ({e}); usando un hilo")
+                    self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="artifacts")
+            return self._pool
+
+    def capture(self, driver, run_id: str = None, step_index: int = None, error: str = None) -> Optional[str]:
+        """Queue the capture and return the artifact id immediately (None without a driver)."""
+        if driver is None:
+            return None
+        now = time.time()
+        artifact_id = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}{int(now * 1000) % 1000:03d}-{uuid.uuid4().hex[:6]}"
+        meta = {"id": artifact_id, "run_id": run_id, "step_index": step_index, "error": error, "at": time.time()}
+
+        def grab():
+            started = time.perf_counter()
+            png = xml = None
+            try:
+                png = driver.get_screenshot_as_png()
+            except Exception as e:
+                logger.info(f"[ARTIFACTS] Sin captura de pantalla: {e}")
+            try:
+                xml = driver.page_source
+            except Exception as e:
+                logger.info(f"[ARTIFACTS] Sin page source: {e}")
+            return png, xml, round((time.perf_counter() - started) * 1000, 1)
+
+        def stored(future):
+            try:
+                future.result()
+                self.captured += 1
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"[ARTIFACTS] No se pudo guardar {artifact_id}: {e}")
+
+        def captured(future):
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+                return
+            png, xml, capture_ms = future.result()
+            try:
+                self._executor().submit(
+                    _store, self.root, artifact_id, {**meta, "capture_ms": capture_ms}, png, xml, self.keep,
+                ).add_done_callback(stored)
+            except RuntimeError as e:  # pool shut down
+                self.failed += 1
+                logger.warning(f"[ARTIFACTS] No se pudo encolar {artifact_id}: {e}")
+
+        # Highest lane: grab the screen before anything else touches it
+        self.actor.submit(grab, lane=CONTROL, label="failure_artifacts").add_done_callback(captured)
+        return artifact_id
+
+    # ── Queries ─────────────────────────────────────────
+
+    def path(self, artifact_id: str, name: str) -> Optional[str]:
+        if not artifact_id or os.sep in artifact_id or "/" in artifact_id or ".." in artifact_id:
+            return None
+        file_path = os.path.join(self.root, artifact_id, name)
+        return file_path if os.path.exists(file_path) else None
+
+    def meta(self, artifact_id: str) -> Optional[dict]:
+        file_path = self.path(artifact_id, META)
+        if not file_path:
+            return None
+        with open(file_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def page_source(self, artifact_id: str) -> Optional[str]:
+        file_path = self.path(artifact_id, PAGE_SOURCE)
+        if not file_path:
+            return None
+        with gzip.open(file_path, "rb") as f:
+            return f.read().decode("utf-8")
+
+    def listing(self, run_id: str = None) -> list[dict]:
+        if not os.path.isdir(self.root):
+            return []
+        items = []
+        for artifact_id in sorted(os.listdir(self.root), reverse=True):
+            meta = self.meta(artifact_id)
+            if meta and (run_id is None or meta.get("run_id") == run_id):
+                items.append(meta)
+        return items
+
+    def stats(self) -> dict:
+        return {"root": self.root, "keep": self.keep, "captured": self.captured, "failed": self.failed}
+
+
+# Shared store used by the flow runner
+failure_artifacts = FailureArtifacts()
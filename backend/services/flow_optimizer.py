@@ -0,0 +1,234 @@
+"""
+FlowOptimizer — Post-processing of recorded step lists.
+Compacts what RecorderService captured (think-time waits, duplicate clicks,
+focus clicks before typing, repeated search/add sequences) into a flow that
+replays as fast as the POS allows, and estimates the time saved.
+"""
+import json
+import logging
+import re
+from typing import Optional
+
+logger = logging.getLogger("flow_optimizer")
+
+# Estimated cost of one element-bound step (lookup + command round trips)
+STEP_OVERHEAD_MS = 300
+# Wait kept before steps that cannot poll for their own element
+DEFAULT_SETTLE_MS = 500
+
+SEARCH_FIELD_NAME = "Buscar producto"
+ADD_BUTTON_NAME = "Agregar"
+# A single search/add is kept as recorded; only repeated ones become a search_product step
+MIN_SEARCH_PRODUCTS = 2
+
+# Target label at the end of recorded descriptions: "Escribir 'x' en 'Buscar producto'"
+_FIELD_LABEL = re.compile(r" en '(.*)'$")
+
+
+def _selector(step: dict) -> tuple:
+    return step.get("selector_type"), step.get("selector_value")
+
+
+def _has_selector(step: dict) -> bool:
+    return bool(step.get("selector_type") and step.get("selector_value"))
+
+
+def _field_label(step: dict) -> Optional[str]:
+    match = _FIELD_LABEL.search(step.get("description") or "")
+    return match.group(1) if match else None
+
+
+def _is_search_type(step: dict, search_field_ids: frozenset = frozenset()) -> bool:
+    """A 'type' into the product search box, whether recorded by name or by accessibility id."""
+    if step.get("action_type") != "type":
+        return False
+    selector_type, selector_value = _selector(step)
+    if selector_value == SEARCH_FIELD_NAME or _field_label(step) == SEARCH_FIELD_NAME:
+        return True
+    if selector_type in ("accessibility_id", "id") and selector_value in search_field_ids:
+        return True
+    return any(f.get("selector_type") == "name" and f.get("selector_value") == SEARCH_FIELD_NAME
+               for f in step.get("fallback_selectors") or [])
+
+
+def recorded_products(value: Optional[str]) -> Optional[list[dict]]:
+    """Products stored in a collapsed search_product step (None for the ``{{products}}`` placeholder)."""
+    if not value or not value.startswith("["):
+        return None
+    try:
+        products = json.loads(value)
+    except ValueError:
+        return None
+    return [p for p in products if isinstance(p, dict) and p.get("code")] or None
+
+
+def _is_add_click(step: dict) -> bool:
+    return step.get("action_type") == "click" and step.get("selector_value") == ADD_BUTTON_NAME
+
+
+def _merge_typing(steps: list[dict], report: dict) -> list[dict]:
+    """Merge consecutive 'type' steps on the same field into one."""
+    result = []
+    for step in steps:
+        prev = result[-1] if result else None
+        if (prev and step.get("action_type") == "type" and prev.get("action_type") == "type"
+                and _selector(prev) == _selector(step)):
+            merged = dict(prev)
+            merged["value"] = (prev.get("value") or "") + (step.get("value") or "")
+            merged["description"] = f"Escribir '{merged['value']}'"
+            label = _field_label(prev) or step.get("selector_value")
+            if label:
+                merged["description"] += f" en '{label}'"
+            result[-1] = merged
+            report["merged_typing"] += 1
+            report["saved_ms"] += STEP_OVERHEAD_MS
+            continue
+        result.append(step)
+    return result
+
+
+def _collapse_search_sequences(steps: list[dict], report: dict, min_products: int,
+                               search_field_ids: frozenset = frozenset()) -> list[dict]:
+    """Turn runs of 'type code in search box [+ Enter] + N x Agregar' into one search_product step.
+
+    The step carries the recorded products (JSON list in ``value``), so replay
+    adds exactly what was recorded instead of sampling ``config.products``.
+    """
+    result = []
+    i = 0
+    while i < len(steps):
+        products = []
+        end = i  # one past the last 'Agregar' of the run
+        j = i
+        while j < len(steps) and _is_search_type(steps[j], search_field_ids):
+            k = j + 1
+            if k < len(steps) and steps[k].get("action_type") == "send_keys" and steps[k].get("value") == "Enter":
+                k += 1
+            quantity = 0
+            last_add = k
+            while k < len(steps) and (_is_add_click(steps[k]) or steps[k].get("action_type") == "wait"):
+                if _is_add_click(steps[k]):
+                    quantity += 1
+                    last_add = k + 1
+                k += 1
+            if quantity == 0:
+                break
+            products.append({"code": steps[j].get("value", ""), "quantity": quantity})
+            end = last_add
+            # Think-time waits between products are part of the run; the ones after
+            # the last product belong to whatever follows it
+            j = k
+        consumed = end - i
+
+        if len(products) >= min_products:
+            collapsed = {
+                "action_type": "search_product",
+                "description": f"Buscar productos ({len(products)} grabados)",
+                "value": json.dumps(products, ensure_ascii=False),
+                "enabled": True,
+            }
+            if steps[i].get("timestamp_ms") is not None:
+                collapsed["timestamp_ms"] = steps[i]["timestamp_ms"]
+            result.append(collapsed)
+            report["collapsed_searches"] += len(products)
+            report["products"].extend(products)
+            report["saved_ms"] += sum(
+                STEP_OVERHEAD_MS for s in steps[i:i + consumed] if s.get("action_type") != "wait"
+            ) - STEP_OVERHEAD_MS
+            report["saved_ms"] += sum(
+                s.get("wait_time") or 0 for s in steps[i:i + consumed] if s.get("action_type") == "wait"
+            )
+            i += consumed
+            continue
+
+        result.append(steps[i])
+        i += 1
+    return result
+
+
+def _drop_redundant_clicks(steps: list[dict], report: dict) -> list[dict]:
+    """Remove duplicate clicks and clicks that only focus a field typed right after."""
+    result = []
+    for idx, step in enumerate(steps):
+        if step.get("action_type") == "click" and _has_selector(step):
+            nxt = next((s for s in steps[idx + 1:] if s.get("action_type") != "wait"), None)
+            # 'type' already clicks its element before sending keys
+            if nxt and nxt.get("action_type") == "type" and _selector(nxt) == _selector(step):
+                report["removed_focus_clicks"] += 1
+                report["saved_ms"] += STEP_OVERHEAD_MS
+                continue
+            prev = result[-1] if result else None
+            if (prev and prev.get("action_type") == "click" and _selector(prev) == _selector(step)
+                    and not _is_add_click(step)):
+                report["removed_duplicate_clicks"] += 1
+                report["saved_ms"] += STEP_OVERHEAD_MS
+                continue
+        result.append(step)
+    return result
+
+
+def _shrink_waits(steps: list[dict], report: dict, settle_ms: int) -> list[dict]:
+    """Drop think-time waits before element-bound steps; shrink the rest to a settle delay."""
+    result = []
+    for idx, step in enumerate(steps):
+        if step.get("action_type") != "wait":
+            result.append(step)
+            continue
+        wait_ms = step.get("wait_time") or 0
+        nxt = next((s for s in steps[idx + 1:] if s.get("action_type") != "wait"), None)
+        # Element lookups already poll for presence; that is the settle condition
+        if nxt is None or _has_selector(nxt) or nxt.get("action_type") == "search_product":
+            report["dropped_waits"] += 1
+            report["saved_ms"] += wait_ms
+            continue
+        if result and result[-1].get("action_type") == "wait":
+            report["dropped_waits"] += 1
+            report["saved_ms"] += wait_ms
+            continue
+        if wait_ms > settle_ms:
+            shrunk = dict(step)
+            shrunk["wait_time"] = settle_ms
+            shrunk["description"] = f"Esperar {settle_ms}ms (estabilizar)"
+            report["shrunk_waits"] += 1
+            report["saved_ms"] += wait_ms - settle_ms
+            result.append(shrunk)
+            continue
+        result.append(step)
+    return result
+
+
+def optimize_recorded_steps(steps: list[dict], settle_ms: int = DEFAULT_SETTLE_MS,
+                            min_search_products: int = MIN_SEARCH_PRODUCTS, collapse_searches: bool = True,
+                            search_field_ids: tuple = ()) -> dict:
+    """Optimize a recorded step list.
+
+    Returns a dict with the optimized ``steps`` and a ``report`` including the
+    recorded ``products`` (also stored in each collapsed search_product step)
+    and the expected time saved in milliseconds. ``search_field_ids`` are the
+    accessibility ids of the product search box, for steps recorded by id.
+    """
+    report = {
+        "original_steps": len(steps),
+        "merged_typing": 0,
+        "removed_focus_clicks": 0,
+        "removed_duplicate_clicks": 0,
+        "collapsed_searches": 0,
+        "dropped_waits": 0,
+        "shrunk_waits": 0,
+        "products": [],
+        "saved_ms": 0,
+    }
+
+    optimized = [dict(s) for s in steps if s.get("enabled", True)]
+    optimized = _merge_typing(optimized, report)
+    optimized = _drop_redundant_clicks(optimized, report)
+    if collapse_searches:
+        optimized = _collapse_search_sequences(optimized, report, max(MIN_SEARCH_PRODUCTS, min_search_products),
+                                               frozenset(search_field_ids))
+    optimized = _shrink_waits(optimized, report, settle_ms)
+
+    report["optimized_steps"] = len(optimized)
+    report["expected_time_saved_ms"] = max(0, report.pop("saved_ms"))
+    logger.info(f"[OPTIMIZE] {report['original_steps']} → {report['optimized_steps']} pasos, "
+                f"ahorro estimado {report['expected_time_saved_ms']}ms")
+    return {"steps": optimized, "report": report}
@@ -0,0 +1,193 @@
+"""
+FlowRegistry — Server-side flows and product catalogs with content-hash versions.
+A flow or catalog is stored once and referenced by id (latest version) or by
+id + version, so a run no longer has to post the whole flow and product list.
+Versions are the SHA-256 of the canonical JSON, so re-registering identical
+content is a no-op. Compiled flows and parsed catalogs are cached per version
+and shared across runs.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+import logging
+from typing import Callable, Optional
+
+logger = logging.getLogger("flow_registry")
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "registry")
+FLOWS = "flows"
+CATALOGS = "catalogs"
+
+
+def content_version(content) -> str:
+    canonical = json.dumps(content, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def slugify(name: str) -> str:
+    ascii_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "-", ascii_name.lower()).strip("-") or "flow"
+
+
+def check_id(item_id: str) -> str:
+    """Ids name folders on disk: letters, digits, '-' and '_' only."""
+    if not item_id or not re.fullmatch(r"[A-Za-z0-9_-]+", item_id):
+        raise ValueError(f"Id inválido: '{item_id}' (usa letras, números, '-' o '_')")
+    return item_id
+
+
+def parse_products_file(file_path: str) -> list[dict]:
+    """``code,quantity`` per line (quantity defaults to 1), same format as /api/load-products-file."""
+    products = []
+    with open(file_path, "r") as f:
+        for line in f:
+            parts = [p.strip() for p in line.strip().split(",")]
+            if not parts[0]:
+                continue
+            products.append({"code": parts[0], "quantity": int(parts[1]) if len(parts) >= 2 and parts[1] else 1})
+    return products
+
+
+class FlowRegistry:
+    """``compile_flow`` turns a stored flow dict into the runnable object (e.g. a validated payload)."""
+
+    def __init__(self, root: str = DEFAULT_ROOT, compile_flow: Callable[[dict], object] = None):
+        self.root = root
+        self.compile_flow = compile_flow or (lambda d: d)
+        self._lock = threading.Lock()
+        # kind -> id -> {"latest": version, "versions": {version: {"content", "registered_at"}}}
+        self._entries: dict = {FLOWS: {}, CATALOGS: {}}
+        self._compiled: dict = {}        # (flow_id, version) -> compiled flow
+        self._file_catalogs: dict = {}   # (path, mtime, size) -> catalog version
+        self.compiles = 0
+        self.cache_hits = 0
+        self._loaded = False
+
+    # ── Storage ─────────────────────────────────────────
+
+    def load(self):
+        """Read previously registered versions from disk (latest = most recently written)."""
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            for kind in (FLOWS, CATALOGS):
+                base = os.path.join(self.root, kind)
+                if not os.path.isdir(base):
+                    continue
+                for item_id in os.listdir(base):
+                    folder = os.path.join(base, item_id)
+                    files = sorted((os.path.getmtime(os.path.join(folder, f)), f)
+                                   for f in os.listdir(folder) if f.endswith(".json"))
+                    for mtime, name in files:
+                        with open(os.path.join(folder, name), "r", encoding="utf-8") as fh:
+                            content = json.load(fh)
+                        self._remember(kind, item_id, name[:-5], content, mtime)
+        logger.info(f"[REGISTRY] {len(self._entries[FLOWS])} flujos y {len(self._entries[CATALOGS])} catálogos")
+
+    def _remember(self, kind: str, item_id: str, version: str, content, registered_at: float):
+        entry = self._entries[kind].setdefault(item_id, {"latest": None, "versions": {}})
+        entry["versions"].setdefault(version, {"content": content, "registered_at": registered_at})
+        entry["latest"] = version
+
+    def _register(self, kind: str, item_id: str, content) -> dict:
+        check_id(item_id)
+        self.load()
+        version = content_version(content)
+        with self._lock:
+            entry = self._entries[kind].get(item_id)
+            is_new = entry is None or version not in entry["versions"]
+            self._remember(kind, item_id, version, content, time.time())
+        if is_new:
+            folder = os.path.join(self.root, kind, item_id)
+            os.makedirs(folder, exist_ok=True)
+            with open(os.path.join(folder, f"{version}.json"), "w", encoding="utf-8") as fh:
+                json.dump(content, fh, ensure_ascii=False)
+            label = "Flujo" if kind == FLOWS else "Catálogo"
+            logger.info(f"[REGISTRY] {label} '{item_id}' versión {version} registrado")
+        return {"id": item_id, "version": version, "new": is_new}
+
+    def _get(self, kind: str, item_id: str, version: str = None) -> tuple:
+        self.load()
+        with self._lock:
+            entry = self._entries[kind].get(item_id)
+            if entry is None:
+                raise KeyError(f"{'Flujo' if kind == FLOWS else 'Catálogo'} '{item_id}' no registrado")
+            version = version or entry["latest"]
+            if version not in entry["versions"]:
+                raise KeyError(f"Versión '{version}' de '{item_id}' no encontrada")
+            return version, entry["versions"][version]["content"]
+
+    # ── Catalogs ────────────────────────────────────────
+
+    def register_catalog(self, catalog_id: str, products: list[dict] = None, file_path: str = None) -> dict:
+        if products is None:
+            if not file_path or not os.path.exists(file_path):
+                raise FileNotFoundError(f"Archivo de productos no encontrado: {file_path}")
+            # Re-parse a file only when it changed on disk
+            st = os.stat(file_path)
+            key = (os.path.abspath(file_path), st.st_mtime, st.st_size)
+            cached = self._file_catalogs.get((catalog_id, key))
+            if cached:
+                self.cache_hits += 1
+                return {"id": catalog_id, "version": cached, "new": False, "count": len(self.catalog(catalog_id, cached))}
+            products = parse_products_file(file_path)
+            result = self._register(CATALOGS, catalog_id, products)
+            self._file_catalogs[(catalog_id, key)] = result["version"]
+        else:
+            result = self._register(CATALOGS, catalog_id, products)
+        return {**result, "count": len(products)}
+
+    def catalog(self, catalog_id: str, version: str = None) -> list[dict]:
+        return self._get(CATALOGS, catalog_id, version)[1]
+
+    # ── Flows ───────────────────────────────────────────
+
+    def register_flow(self, flow: dict, flow_id: str = None) -> dict:
+        """Store a flow. Its product list, if any, becomes a catalog under the same id."""
+        flow_id = flow_id or slugify(flow.get("name", ""))
+        flow = json.loads(json.dumps(flow))  # private copy
+        config = flow.setdefault("config", {})
+        catalog = None
+        if config.get("products"):
+            catalog = self.register_catalog(flow_id, config["products"])
+            config["products"] = []
+            flow["catalog_id"] = flow_id
+        result = self._register(FLOWS, flow_id, flow)
+        if catalog:
+            result["catalog"] = catalog
+        return result
+
+    def flow(self, flow_id: str, version: str = None) -> tuple:
+        """``(version, compiled)``; compiled once per version and reused."""
+        version, content = self._get(FLOWS, flow_id, version)
+        key = (flow_id, version)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            compiled = self.compile_flow({k: v for k, v in content.items() if k != "catalog_id"})
+            self._compiled[key] = compiled
+            self.compiles += 1
+        else:
+            self.cache_hits += 1
+        return version, compiled
+
+    def flow_catalog_id(self, flow_id: str, version: str = None) -> Optional[str]:
+        return self._get(FLOWS, flow_id, version)[1].get("catalog_id")
+
+    def listing(self) -> dict:
+        self.load()
+        with self._lock:
+            return {
+                kind: [
+                    {"id": item_id, "latest": entry["latest"], "versions": len(entry["versions"])}
+                    for item_id, entry in items.items()
+                ]
+                for kind, items in self._entries.items()
+            }
+
+    def stats(self) -> dict:
+        return {"compiled": len(self._compiled), "compiles": self.compiles, "cache_hits": self.cache_hits}
@@ -0,0 +1,84 @@
+"""
+ImportProfile — Import-time profiling report for API startup.
+Runs ``python -X importtime -c "import <target>"`` in a fresh interpreter and
+summarizes the slowest modules and whether any heavy driver/window/input
+backend (appium, selenium, pygetwindow, pynput, pywinauto, comtypes) was
+pulled in at import time. Those must stay lazy.
+
+Usage: python -m services.import_profile [target]
+"""
+import os
+import subprocess
+import sys
+import logging
+
+logger = logging.getLogger("import_profile")
+
+HEAVY_BACKENDS = ("appium", "selenium", "pygetwindow", "pynput", "pywinauto", "comtypes")
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _parse_importtime(stderr: str) -> list[dict]:
+    """Parse ``-X importtime`` lines into {module, self_us, cumulative_us} dicts."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        self_us, cumulative_us, module = parts
+        try:
+            rows.append({
+                "module": module.strip(),
+                "self_us": int(self_us.strip()),
+                "cumulative_us": int(cumulative_us.strip()),
+            })
+        except ValueError:
+            continue
+    return rows
+
+
+def profile_imports(target: str = "main", top: int = 15, timeout: float = 60) -> dict:
+    """Import ``target`` in a subprocess and report import-time costs."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=timeout,
+    )
+    rows = _parse_importtime(proc.stderr)
+    target_row = next((r for r in rows if r["module"] == target), None)
+    root_modules = {r["module"].split(".")[0] for r in rows}
+
+    report = {
+        "target": target,
+        "ok": proc.returncode == 0,
+        "total_ms": round(target_row["cumulative_us"] / 1000, 1) if target_row else None,
+        "slowest": [
+            {"module": r["module"], "cumulative_ms": round(r["cumulative_us"] / 1000, 1),
+             "self_ms": round(r["self_us"] / 1000, 1)}
+            for r in sorted(rows, key=lambda r: r["self_us"], reverse=True)[:top]
+        ],
+        "services": [
+            {"module": r["module"], "cumulative_ms": round(r["cumulative_us"] / 1000, 1)}
+            for r in rows if r["module"].startswith("services.")
+        ],
+        "heavy_backends_loaded": sorted(b for b in HEAVY_BACKENDS if b in root_modules),
+    }
+    if proc.returncode != 0:
+        report["error"] = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed"
+    return report
+
+
+if __name__ == "__main__":
+    result = profile_imports(sys.argv[1] if len(sys.argv) > 1 else "main")
+    print(f"Import of '{result['target']}': {result['total_ms']} ms (ok={result['ok']})")
+    if result.get("error"):
+        print(f"  error: {result['error']}")
+    print(f"Heavy backends loaded at import: {', '.join(result['heavy_backends_loaded']) or 'none'}")
+    print("Slowest modules (self time):")
+    for row in result["slowest"]:
+        print(f"  {row['self_ms']:>8.1f} ms  {row['module']}")
+    print("Services:")
+    for row in result["services"]:
+        print(f"  {row['cumulative_ms']:>8.1f} ms  {row['module']}")
@@ -0,0 +1,92 @@
+"""
+InitPipeline — Event-driven, parallel initialization sequence.
+Runs independent phases concurrently (Appium status check, product catalog
+load, application launch), then connects the session and clears the previous
+order. Every phase reports its status through a callback and its duration.
+"""
+import asyncio
+import time
+import logging
+import urllib.request
+from typing import Awaitable, Callable
+
+logger = logging.getLogger("init_pipeline")
+
+# (step_id, status, message) -> awaitable; status is running/success/error
+PhaseReporter = Callable[[str, str, str], Awaitable[None]]
+
+
+class InitPhaseError(Exception):
+    """A required initialization phase failed."""
+
+    def __init__(self, step_id: str, error: Exception):
+        super().__init__(str(error))
+        self.step_id = step_id
+        self.error = error
+
+
+def check_appium_status(appium_url: str, timeout: float = 5):
+    """Blocking GET {appium_url}/status; raises if the server is not reachable."""
+    req = urllib.request.Request(f"{appium_url}/status", method="GET")
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        if resp.status != 200:
+            raise RuntimeError(f"Appium respondió con status {resp.status}")
+
+
+class InitPipeline:
+    def __init__(self, appium_service, report: PhaseReporter, driver_call=None):
+        self.appium_service = appium_service
+        self.report = report
+        # Runs phases that use the driver session (e.g. through the driver actor)
+        self.driver_call = driver_call or asyncio.to_thread
+        self.results: list[dict] = []
+
+    async def _phase(self, step_id: str, fn, *args, message=None, driver: bool = False):
+        """Run a blocking phase in a worker thread, timing and reporting it."""
+        await self.report(step_id, "running", "")
+        started = time.perf_counter()
+        try:
+            value = await (self.driver_call if driver else asyncio.to_thread)(fn, *args)
+        except Exception as e:
+            elapsed_ms = round((time.perf_counter() - started) * 1000)
+            self.results.append({"step": step_id, "status": "error", "duration_ms": elapsed_ms, "error": str(e)})
+            await self.report(step_id, "error", str(e))
+            raise InitPhaseError(step_id, e)
+        elapsed_ms = round((time.perf_counter() - started) * 1000)
+        entry = {"step": step_id, "status": "success", "duration_ms": elapsed_ms}
+        if isinstance(value, int) and not isinstance(value, bool):
+            entry["count"] = value
+        self.results.append(entry)
+        await self.report(step_id, "success", message(value) if message else "OK")
+        logger.info(f"[INIT] {step_id} completado en {elapsed_ms}ms")
+        return value
+
+    def _connect_and_wait_ready(self, appium_url: str, app_path: str):
+        self.appium_service.connect(appium_url, app_path)
+        self.appium_service.wait_for_ui_ready()
+
+    async def run(self, config) -> dict:
+        """Run the pipeline. Raises InitPhaseError on the first failed phase."""
+        started = time.perf_counter()
+
+        # Independent phases run concurrently
+        outcomes = await asyncio.gather(
+            self._phase("check_appium", check_appium_status, config.appium_url),
+            self._phase("load_products", self.appium_service.load_products, config.products_file, config.products,
+                        message=lambda count: f"{count} productos"),
+            self._phase("open_app", self.appium_service.open_application, config.app_path),
+            return_exceptions=True,
+        )
+        for outcome in outcomes:
+            if isinstance(outcome, InitPhaseError):
+                raise outcome
+            if isinstance(outcome, BaseException):
+                raise outcome
+
+        await self._phase("connect_appium", self._connect_and_wait_ready, config.appium_url, config.app_path,
+                          driver=True)
+        await self._phase("clear_order", self.appium_service.clear_order, driver=True)
+
+        total_ms = round((time.perf_counter() - started) * 1000)
+        logger.info(f"[INIT] Inicialización completa en {total_ms}ms")
+        return {"results": self.results, "total_ms": total_ms, "product_count": outcomes[1]}
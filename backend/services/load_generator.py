@@ -0,0 +1,229 @@
+"""
+LoadGenerator — Open-loop sale generator with target sales-per-hour pacing.
+Sale starts are scheduled from an arrival profile (constant, ramp, step,
+Poisson) independently of how fast the POS completes them, and dispatched to
+one worker per available session. A slow POS therefore shows up as queueing
+delay and late starts instead of silently lowering the offered load.
+"""
+import asyncio
+import math
+import random
+import logging
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger("load_generator")
+
+PROFILES = ("constant", "ramp", "step", "poisson")
+
+
+# ── Arrival schedules (offsets in seconds from the start) ─
+
+def constant_arrivals(rate_per_hour: float, duration_s: float) -> list[float]:
+    if rate_per_hour <= 0:
+        return []
+    interval = 3600.0 / rate_per_hour
+    return [k * interval for k in range(int(math.ceil(duration_s / interval))) if k * interval < duration_s]
+
+
+def ramp_arrivals(start_per_hour: float, end_per_hour: float, duration_s: float) -> list[float]:
+    """Linear rate ramp: the n-th arrival is where the integrated rate reaches n."""
+    r0, r1 = start_per_hour / 3600.0, end_per_hour / 3600.0
+    slope = (r1 - r0) / duration_s if duration_s else 0.0
+    total = r0 * duration_s + slope * duration_s ** 2 / 2
+    arrivals = []
+    for n in range(int(total) + 1):
+        if abs(slope) < 1e-12:
+            t = n / r0 if r0 else duration_s
+        else:
+            # Solve r0*t + slope*t^2/2 = n for t >= 0
+            t = (-r0 + math.sqrt(max(r0 * r0 + 2 * slope * n, 0.0))) / slope
+        if t < duration_s:
+            arrivals.append(t)
+    return arrivals
+
+
+def step_arrivals(steps: list[dict]) -> list[float]:
+    """Piecewise-constant rate: ``[{"rate_per_hour": 60, "duration_s": 300}, ...]``."""
+    arrivals, offset = [], 0.0
+    for step in steps:
+        duration = float(step["duration_s"])
+        arrivals.extend(offset + t for t in constant_arrivals(float(step["rate_per_hour"]), duration))
+        offset += duration
+    return arrivals
+
+
+def poisson_arrivals(rate_per_hour: float, duration_s: float, seed: Optional[int] = None) -> list[float]:
+    rng = random.Random(seed)
+    rate = rate_per_hour / 3600.0
+    arrivals, t = [], 0.0
+    if rate <= 0:
+        return arrivals
+    while True:
+        t += rng.expovariate(rate)
+        if t >= duration_s:
+            return arrivals
+        arrivals.append(t)
+
+
+def profile_duration(profile: dict) -> float:
+    if profile.get("kind") == "step":
+        return sum(float(s["duration_s"]) for s in profile.get("steps") or [])
+    return float(profile.get("duration_s") or 0)
+
+
+def build_schedule(profile: dict) -> list[float]:
+    kind = profile.get("kind", "constant")
+    duration = float(profile.get("duration_s") or 0)
+    rate = float(profile.get("rate_per_hour") or 0)
+    if kind == "constant":
+        return constant_arrivals(rate, duration)
+    if kind == "ramp":
+        return ramp_arrivals(rate, float(profile.get("end_rate_per_hour") or rate), duration)
+    if kind == "step":
+        return step_arrivals(profile.get("steps") or [])
+    if kind == "poisson":
+        return poisson_arrivals(rate, duration, profile.get("seed"))
+    raise ValueError(f"Perfil de carga desconocido: '{kind}' (usa {', '.join(PROFILES)})")
+
+
+def _percentile(values: list[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))], 1)
+
+
+# ── Generator ───────────────────────────────────────────
+
+class LoadGenerator:
+    """``executors``: one async callable per session, ``execute(flow) -> dict`` with a ``status`` key."""
+
+    def __init__(self, executors: list[Callable[[object], Awaitable[dict]]], schedule: list[float],
+                 mix: list[tuple], late_threshold_ms: float = 1000, max_queue: Optional[int] = None,
+                 seed: Optional[int] = None, duration_s: Optional[float] = None):
+        if not executors:
+            raise ValueError("Se requiere al menos una sesión para generar carga")
+        if not mix or sum(w for _, w in mix) <= 0:
+            raise ValueError("La mezcla de flujos necesita al menos un flujo con peso positivo")
+        self.executors = executors
+        self.schedule = sorted(schedule)
+        # Offered-rate window; defaults to the last scheduled start
+        self.duration_s = duration_s or (self.schedule[-1] if self.schedule else 0.0)
+        self.mix = mix
+        self.late_threshold_ms = late_threshold_ms
+        self.max_queue = max_queue
+        self._rng = random.Random(seed)
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._stop = asyncio.Event()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.arrivals: list[dict] = []
+        self.running = False
+        # Sales currently executing (workers between arrivals are idle)
+        self.in_flight = 0
+
+    def _pick_flow(self):
+        flows, weights = zip(*self.mix)
+        return self._rng.choices(flows, weights=weights, k=1)[0]
+
+    async def _dispatch(self):
+        """Release arrivals on the wall clock, regardless of how busy the workers are."""
+        loop = asyncio.get_running_loop()
+        for i, offset in enumerate(self.schedule):
+            delay = self.started_at + offset - loop.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._stop.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+            if self._stop.is_set():
+                break
+            flow = self._pick_flow()
+            arrival = {
+                "id": i,
+                "flow": getattr(flow, "name", str(flow)),
+                "scheduled_s": round(offset, 3),
+                "dispatch_lag_ms": round((loop.time() - self.started_at - offset) * 1000, 1),
+                "status": "queued",
+            }
+            self.arrivals.append(arrival)
+            if self.max_queue is not None and self._queue.qsize() >= self.max_queue:
+                arrival["status"] = "dropped"
+                continue
+            self._queue.put_nowait((arrival, flow))
+        for _ in self.executors:
+            self._queue.put_nowait(None)
+
+    async def _worker(self, session: int, execute):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            arrival, flow = item
+            if self._stop.is_set():
+                arrival["status"] = "cancelled"
+                continue
+            start = loop.time()
+            arrival["session"] = session
+            arrival["queue_delay_ms"] = round((start - self.started_at - arrival["scheduled_s"]) * 1000, 1)
+            arrival["late"] = arrival["queue_delay_ms"] > self.late_threshold_ms
+            arrival["status"] = "running"
+            self.in_flight += 1
+            try:
+                result = await execute(flow)
+                arrival["status"] = "completed" if result.get("status") == "completed" else "failed"
+                if arrival["status"] == "failed":
+                    arrival["error"] = result.get("error")
+            except Exception as e:
+                arrival["status"] = "failed"
+                arrival["error"] = str(e)
+            finally:
+                self.in_flight -= 1
+            arrival["service_ms"] = round((loop.time() - start) * 1000, 1)
+
+    async def run(self) -> dict:
+        loop = asyncio.get_running_loop()
+        self.running = True
+        self.started_at = loop.time()
+        logger.info(f"[LOAD] {len(self.schedule)} ventas programadas en {len(self.executors)} sesión(es)")
+        try:
+            await asyncio.gather(self._dispatch(), *(self._worker(i, ex) for i, ex in enumerate(self.executors)))
+        finally:
+            self.running = False
+            self.finished_at = loop.time()
+        summary = self.summary()
+        logger.info(f"[LOAD] Terminado: ofrecido {summary['offered_per_hour']}/h, "
+                    f"logrado {summary['achieved_per_hour']}/h, {summary['late_starts']} inicios tardíos")
+        return summary
+
+    def stop(self):
+        self._stop.set()
+
+    def summary(self) -> dict:
+        now = self.finished_at or asyncio.get_event_loop().time()
+        elapsed = max((now - self.started_at) if self.started_at else 0.0, 1e-9)
+        window = min(elapsed, self.duration_s) if self.duration_s else elapsed
+        started = [a for a in self.arrivals if "queue_delay_ms" in a]
+        completed = [a for a in self.arrivals if a["status"] == "completed"]
+        delays = [a["queue_delay_ms"] for a in started]
+        service = [a["service_ms"] for a in self.arrivals if "service_ms" in a]
+        by_status = {}
+        for a in self.arrivals:
+            by_status[a["status"]] = by_status.get(a["status"], 0) + 1
+        return {
+            "running": self.running,
+            "scheduled": len(self.schedule),
+            "released": len(self.arrivals),
+            "by_status": by_status,
+            "queued": self._queue.qsize(),
+            "elapsed_s": round(elapsed, 1),
+            "offered_per_hour": round(len(self.arrivals) / window * 3600, 1) if self.arrivals else 0.0,
+            "achieved_per_hour": round(len(completed) / elapsed * 3600, 1),
+            "late_starts": sum(1 for a in started if a.get("late")),
+            "queue_delay_ms": {"avg": round(sum(delays) / len(delays), 1) if delays else None,
+                               "p95": _percentile(delays, 0.95), "max": max(delays) if delays else None},
+            "service_ms": {"avg": round(sum(service) / len(service), 1) if service else None,
+                           "p95": _percentile(service, 0.95)},
+            "arrivals": self.arrivals[-50:],
+        }
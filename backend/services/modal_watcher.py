@@ -0,0 +1,215 @@
+"""
+ModalWatcher — Declarative modal/popup handling over UI snapshots.
+A rule table (match → click target) replaces the separate modal probes
+("Aceptar", "Sin conexión", "Oportunidad"/"Recomendación" windows). All rules
+are evaluated against one snapshot per check; a check on a clean screen costs
+a single page-source read instead of several find_element waits. Click targets
+are looked up inside the modal's own window (the nearest window/dialog above
+the node that matched), never elsewhere on the main screen.
+"""
+import time
+import logging
+from collections import Counter
+from typing import Iterable, Optional
+
+from services.ui_snapshot import UISnapshot, UINode
+
+logger = logging.getLogger("modal_watcher")
+
+# Checkpoints in the flow where the watcher runs
+ANY = "any"
+BEFORE_SEARCH = "before_search"
+AFTER_ADD = "after_add"
+PAYMENT = "payment"
+
+ACCEPT_BUTTONS = ("Aceptar", "Accept", "Aprobar", "OK", "Continuar", "Sí", "Si", "Agregar")
+REJECT_BUTTONS = ("Rechazar", "Reject", "Cancelar", "No", "Siguiente")
+# Labels the main POS screen also has: only clicked when the modal's window is known
+GENERIC_BUTTONS = {"agregar", "continuar", "siguiente", "sí", "si", "no", "cancelar"}
+# Control types (tag or localized) that delimit a modal's subtree
+WINDOW_TYPES = {"window", "ventana", "dialog", "diálogo", "cuadro de diálogo"}
+
+
+def modal_root(snap: UISnapshot, node: UINode) -> Optional[UINode]:
+    """Nearest window/dialog containing ``node`` (itself included) below the top-level window, or None."""
+    current = node
+    while current is not None and current.parent is not None:
+        if current.control_type.lower() in WINDOW_TYPES:
+            return current
+        current = snap.nodes[current.parent]
+    return None
+
+
+def subtree(snap: UISnapshot, root: UINode) -> list[UINode]:
+    """``root`` and its descendants (nodes are in pre-order, so a contiguous run)."""
+    nodes = [root]
+    for node in snap.nodes[root.index + 1:]:
+        if node.depth <= root.depth:
+            break
+        nodes.append(node)
+    return nodes
+
+
+class ModalRule:
+    """``match`` criteria: ``name`` (exact) and/or ``name_contains`` (case-insensitive), each a str or list."""
+
+    def __init__(self, name: str, match: dict, click: Iterable[str], points: Iterable[str] = (ANY,),
+                 reject: Iterable[str] = None):
+        self.name = name
+        self.match = {k: ([v] if isinstance(v, str) else list(v)) for k, v in match.items()}
+        self.click = list(click)
+        self.reject = list(reject) if reject else None
+        self.points = set(points)
+
+    def applies_at(self, point: str) -> bool:
+        return point == ANY or ANY in self.points or point in self.points
+
+    def trigger(self, snap: UISnapshot) -> Optional[UINode]:
+        """First visible node matching the rule."""
+        exact = set(self.match.get("name", []))
+        contains = [c.lower() for c in self.match.get("name_contains", [])]
+        for node in snap.nodes:
+            if not node.visible or not node.name:
+                continue
+            if node.name in exact:
+                return node
+            lowered = node.name.lower()
+            if any(c in lowered for c in contains):
+                return node
+        return None
+
+    def matches(self, snap: UISnapshot) -> bool:
+        return self.trigger(snap) is not None
+
+    def target(self, snap: UISnapshot, reject: bool = False) -> Optional[UINode]:
+        """First visible, enabled node named like a click target (targets in priority order).
+
+        Searched inside the modal's window; when that window cannot be told
+        apart, generic labels the main screen also uses are not clicked.
+        """
+        trigger = self.trigger(snap)
+        root = modal_root(snap, trigger) if trigger is not None else None
+        candidates = subtree(snap, root) if root is not None else snap.nodes
+        by_name = {}
+        for node in candidates:
+            if not node.visible or not node.enabled or not node.name:
+                continue
+            if root is None and node.name.lower() in GENERIC_BUTTONS:
+                continue
+            by_name.setdefault(node.name.lower(), node)
+        for wanted in (self.reject if reject and self.reject else self.click):
+            node = by_name.get(wanted.lower())
+            if node is not None:
+                return node
+        return None
+
+
+DEFAULT_RULES = [
+    ModalRule("no_internet", {"name_contains": ["Sin conexión"]}, ["Aceptar"]),
+    ModalRule("recommendation", {"name_contains": ["Oportunidad", "Recomendación"]}, ACCEPT_BUTTONS,
+              points=(BEFORE_SEARCH, AFTER_ADD), reject=REJECT_BUTTONS),
+    ModalRule("accept", {"name": "Aceptar"}, ["Aceptar"]),
+]
+
+
+class ModalWatcher:
+    def __init__(self, rules: list[ModalRule] = None, max_rounds: int = 10, settle: float = 0.3):
+        self.rules = list(rules if rules is not None else DEFAULT_RULES)
+        self.max_rounds = max_rounds
+        self.settle = settle
+        self.hits: Counter = Counter()
+        self.checks = 0
+        self.snapshots = 0
+        self.check_ms = 0.0
+
+    def match(self, snap: UISnapshot, point: str = ANY) -> Optional[ModalRule]:
+        """First rule (table order) matching the snapshot at this checkpoint."""
+        for rule in self.rules:
+            if rule.applies_at(point) and rule.matches(snap):
+                return rule
+        return None
+
+    def _locate(self, driver, snap: UISnapshot, node: UINode):
+        """The live element for ``node``: by name when unique on screen, else within its modal window."""
+        if sum(1 for n in snap.nodes if n.name == node.name) == 1:
+            return driver.find_element("name", node.name)
+        root = modal_root(snap, node)
+        if root is None or root is node:
+            return None
+        if root.automation_id:
+            container = driver.find_element("accessibility id", root.automation_id)
+        elif root.name:
+            container = driver.find_element("name", root.name)
+        else:
+            return None
+        return container.find_element("name", node.name)
+
+    def act(self, driver, snap: UISnapshot, rule: ModalRule, reject: bool = False) -> Optional[UINode]:
+        """Click the rule's target; returns the clicked node (None when there is nothing safe to click)."""
+        node = rule.target(snap, reject)
+        if node is None:
+            logger.warning(f"[MODAL] '{rule.name}' detectado sin botón de acción")
+            return None
+        element = self._locate(driver, snap, node)
+        if element is None:
+            logger.warning(f"[MODAL] '{rule.name}': '{node.name}' no se puede ubicar solo dentro del modal")
+            return None
+        element.click()
+        self.hits[rule.name] += 1
+        logger.info(f"[MODAL] '{rule.name}' → clic en '{node.name}'")
+        return node
+
+    def check(self, driver, point: str = ANY, snapshot: UISnapshot = None, recommendation: str = "accept") -> list[str]:
+        """Handle every blocking modal at a checkpoint. Returns the handled rule names in order.
+
+        ``recommendation`` ("accept"/"reject") picks the button set for
+        recommendation windows. A provided ``snapshot`` is used for the first
+        round; later rounds re-read the UI after each click.
+        """
+        started = time.perf_counter()
+        handled = []
+        self.checks += 1
+        snap = snapshot
+        last = None
+        for _ in range(self.max_rounds):
+            if snap is None:
+                try:
+                    snap = UISnapshot.capture(driver)
+                except Exception as e:
+                    logger.info(f"[MODAL] No se pudo leer la UI: {e}")
+                    break
+                self.snapshots += 1
+            rule = self.match(snap, point)
+            if rule is None:
+                break
+            target = rule.target(snap, reject=recommendation == "reject")
+            if target is not None and last == (rule.name, target.name, target.index):
+                # Same button on the same spot right after clicking it: the click had no effect
+                logger.warning(f"[MODAL] '{rule.name}' sigue visible tras clic en '{target.name}'; se abandona")
+                break
+            try:
+                clicked = self.act(driver, snap, rule, reject=recommendation == "reject")
+            except Exception as e:
+                logger.info(f"[MODAL] Clic en '{rule.name}' falló: {e}")
+                break
+            if clicked is None:
+                break
+            last = (rule.name, clicked.name, clicked.index)
+            handled.append(rule.name)
+            time.sleep(self.settle)
+            snap = None
+        self.check_ms += (time.perf_counter() - started) * 1000
+        return handled
+
+    def stats(self) -> dict:
+        return {
+            "rules": [r.name for r in self.rules],
+            "checks": self.checks,
+            "snapshots": self.snapshots,
+            "hits": dict(self.hits),
+            "avg_check_ms": round(self.check_ms / self.checks, 1) if self.checks else None,
+        }
+
+
+# Shared watcher for the flow runner and the legacy scripts
+default_watcher = ModalWatcher()
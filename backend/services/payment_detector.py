@@ -0,0 +1,139 @@
+"""
+PaymentDetector — Event-based detection of a completed payment.
+After "Cobrar" is pressed, watches the completion signals (the amount field
+and "Métodos de pago" gone with no pending modal, a success dialog once the
+payment screen is gone, a POS window change) and returns as soon as the first
+one fires, measuring the latency from the charge to the detection. The UI is
+polled on the calling thread (the driver actor's job), so no driver command
+outlives ``wait``; only the window check, which does not use the driver, runs
+alongside it.
+"""
+import threading
+import time
+import logging
+from collections import Counter, deque
+from typing import Callable, Optional
+
+from services.ui_snapshot import UISnapshot
+from services.window_locator import WindowLocator, default_locator
+
+logger = logging.getLogger("payment_detector")
+
+AMOUNT_INPUT_ID = "InputBox"
+PAYMENT_METHODS_TEXT = "Métodos de pago"
+PENDING_MODAL = "Aceptar"
+SUCCESS_TEXTS = ("exitoso", "completado", "éxito")
+
+# Signals
+SUCCESS_DIALOG = "success_dialog"
+PAYMENT_SCREEN_GONE = "payment_screen_gone"
+WINDOW_CHANGE = "window_change"
+# Not a completion: a modal needs handling first, so waiting longer is pointless
+MODAL_PENDING = "modal_pending"
+
+# Recent detections, for the debug endpoint
+detections: deque = deque(maxlen=200)
+
+
+def evaluate_snapshot(snap: UISnapshot) -> Optional[str]:
+    """Completion signal (or MODAL_PENDING) visible in one snapshot, or None."""
+    if snap.has(automation_id=AMOUNT_INPUT_ID) or snap.has(name_contains=PAYMENT_METHODS_TEXT):
+        # Still on the payment screen: a status label there saying "completado" is not a paid sale
+        return MODAL_PENDING if snap.has(name=PENDING_MODAL) else None
+    for node in snap.nodes:
+        if node.visible and node.name and any(t in node.name.lower() for t in SUCCESS_TEXTS):
+            return SUCCESS_DIALOG
+    if snap.has(name=PENDING_MODAL):
+        return MODAL_PENDING
+    return PAYMENT_SCREEN_GONE
+
+
+class PaymentDetector:
+    def __init__(self, driver, window_locator: WindowLocator = None, poll: float = 0.1,
+                 snapshot: Callable[[], UISnapshot] = None):
+        self.driver = driver
+        self.window_locator = window_locator or default_locator
+        self.poll = poll
+        self._snapshot = snapshot or (lambda: UISnapshot.capture(self.driver))
+        self._armed_at: Optional[float] = None
+        self._windows_before: Optional[set] = None
+
+    def arm(self):
+        """Call right before the charge click: marks t0 and the current POS windows."""
+        self._armed_at = time.perf_counter()
+        try:
+            self._windows_before = self.window_locator.handles()
+        except Exception:
+            self._windows_before = None  # no window backend: UI signals only
+        return self
+
+    def wait(self, timeout: float = 10) -> dict:
+        """Block until the first completion signal fires or ``timeout`` passes."""
+        if self._armed_at is None:
+            self.arm()
+        fired = threading.Event()
+        lock = threading.Lock()
+        result = {"completed": False, "signal": None, "latency_ms": None, "snapshots": 0}
+
+        def fire(signal: str):
+            with lock:
+                if result["signal"] is None:
+                    result.update(completed=signal != MODAL_PENDING, signal=signal,
+                                  latency_ms=round((time.perf_counter() - self._armed_at) * 1000, 1))
+            fired.set()
+
+        def watch_windows():
+            while not fired.is_set():
+                try:
+                    if self.window_locator.handles() != self._windows_before:
+                        self.window_locator.invalidate()
+                        fire(WINDOW_CHANGE)
+                        return
+                except Exception:
+                    return
+                fired.wait(self.poll)
+
+        watcher = None
+        if self._windows_before:
+            watcher = threading.Thread(target=watch_windows, name="payment-windows", daemon=True)
+            watcher.start()
+        deadline = time.perf_counter() + timeout
+        while not fired.is_set() and time.perf_counter() < deadline:
+            try:
+                snap = self._snapshot()
+                with lock:
+                    result["snapshots"] += 1
+                signal = evaluate_snapshot(snap)
+                if signal:
+                    fire(signal)
+                    break
+            except Exception as e:
+                logger.debug(f"[PAYMENT] Lectura de UI falló: {e}")
+            fired.wait(min(self.poll, max(0.0, deadline - time.perf_counter())))
+        fired.set()  # ends the window watcher
+        if watcher:
+            watcher.join(timeout=1)
+
+        with lock:
+            outcome = dict(result)
+        detections.append({"at": time.time(), **outcome})
+        if outcome["signal"] == MODAL_PENDING:
+            logger.info(f"[PAYMENT] Modal pendiente tras el cobro ({outcome['latency_ms']}ms)")
+        elif outcome["completed"]:
+            logger.info(f"[PAYMENT] Pago detectado por '{outcome['signal']}' en {outcome['latency_ms']}ms")
+        else:
+            logger.info(f"[PAYMENT] Sin señal de pago completado tras {timeout}s")
+        return outcome
+
+
+def detection_summary() -> dict:
+    history = list(detections)
+    latencies = sorted(d["latency_ms"] for d in history if d["completed"])
+    return {
+        "detections": len(history),
+        "completed": len(latencies),
+        "by_signal": dict(Counter(d["signal"] for d in history if d["completed"])),
+        "avg_latency_ms": round(sum(latencies) / len(latencies), 1) if latencies else None,
+        "p95_latency_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None,
+        "recent": history[-10:],
+    }
@@ -1,37 +1,55 @@
 """
 RecorderService — Records user interactions with the POS application.
 Uses pynput for mouse/keyboard detection and pywinauto for element identification.
+
+The pynput hooks only enqueue timestamped raw events; a dedicated worker thread
+owns a long-lived UIA desktop, resolves elements and emits steps in order.
+With a snapshot source, the worker refreshes a spatial index of the screen while
+idle and resolves clicks from it, falling back to UIA ``from_point`` when the
+index is missing, outdated or has no identified element there.
 """
+import queue
 import threading
 import time
 import logging
-import ctypes
-import ctypes.wintypes as wintypes
+from collections import deque
 from typing import Callable, Optional, List
-from pynput import mouse, keyboard
+
+from services.selector_scoring import generate_candidates, score_candidates_live, rank_candidates, fallback_entries
+from services.spatial_index import SpatialIndex
+from services.ui_snapshot import UISnapshot
 
 logger = logging.getLogger("recorder_service")
 
-# Windows API for element identification
-try:
-    import comtypes
-    from comtypes import CLSCTX_INPROC_SERVER
-    import comtypes.client
-    HAS_COMTYPES = True
-except ImportError:
-    HAS_COMTYPES = False
+
+def _load_input_backend():
+    """Import the pynput input hooks on first use (Windows/X11 only)."""
+    from pynput import mouse, keyboard
+    return mouse, keyboard
+
+
+def _load_comtypes():
+    """comtypes (COM apartment setup for UIA), or None when unavailable."""
+    try:
+        import comtypes
+        return comtypes
+    except ImportError:
+        return None
 
 
 class RecordedStep:
     def __init__(self, action_type: str, description: str,
                  selector_type: str = None, selector_value: str = None,
-                 value: str = None, wait_time: int = None):
+                 value: str = None, wait_time: int = None,
+                 fallback_selectors: list = None, timestamp_ms: int = None):
         self.action_type = action_type
         self.description = description
         self.selector_type = selector_type
         self.selector_value = selector_value
         self.value = value
         self.wait_time = wait_time
+        self.fallback_selectors = fallback_selectors
+        self.timestamp_ms = timestamp_ms
 
     def to_dict(self):
         d = {
@@ -47,30 +65,82 @@ class RecordedStep:
             d["value"] = self.value
         if self.wait_time:
             d["wait_time"] = self.wait_time
+        if self.fallback_selectors:
+            d["fallback_selectors"] = self.fallback_selectors
+        if self.timestamp_ms is not None:
+            d["timestamp_ms"] = self.timestamp_ms
         return d
 
 
+def _summarize_ms(samples) -> dict:
+    """Summarize a sequence of millisecond samples (count, avg, p95, max)."""
+    values = sorted(samples)
+    if not values:
+        return {"count": 0, "avg_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+    p95_index = min(len(values) - 1, int(round(0.95 * (len(values) - 1))))
+    return {
+        "count": len(values),
+        "avg_ms": round(sum(values) / len(values), 3),
+        "p95_ms": round(values[p95_index], 3),
+        "max_ms": round(values[-1], 3),
+    }
+
+
 class RecorderService:
+    # Samples kept per metric (rolling window)
+    METRICS_WINDOW = 1000
+    # Idle time after a step before re-reading the screen, and the oldest index still trusted
+    INDEX_SETTLE_S = 0.4
+    INDEX_MAX_AGE_S = 5.0
+
     def __init__(self):
         self.recording = False
         self.steps: List[RecordedStep] = []
         self._on_step: Optional[Callable] = None
-        self._mouse_listener: Optional[mouse.Listener] = None
-        self._kb_listener: Optional[keyboard.Listener] = None
+        self._mouse = None
+        self._keyboard = None
+        self._mouse_listener = None
+        self._kb_listener = None
         self._appium_driver = None
         self._last_click_time = 0
         self._typing_buffer = ""
+        self._typing_started = None
         self._typing_element_info = None
         self._last_action_time = 0
+        self._recording_started = 0
         self._target_window_rect = None
         self._target_window_handle = None
-
-    def start(self, appium_driver, on_step: Callable, window_handle=None):
-        """Start recording user interactions."""
+        self._events: "queue.Queue" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._desktop = None
+        self.score_selectors = False
+        self._driver_call: Callable = lambda fn, *args: fn(*args)
+        self._hook_ms: deque = deque(maxlen=self.METRICS_WINDOW)
+        self._resolve_ms: deque = deque(maxlen=self.METRICS_WINDOW)
+        self._event_to_step_ms: deque = deque(maxlen=self.METRICS_WINDOW)
+        self._snapshot_source: Optional[Callable[[], UISnapshot]] = None
+        self._index: Optional[SpatialIndex] = None
+        self._index_at = 0.0
+        self._index_offset = (0, 0)
+        self._last_step_at = 0.0
+        self._index_ms: deque = deque(maxlen=self.METRICS_WINDOW)
+        self._resolved_by = {"index": 0, "uia": 0}
+
+    def start(self, appium_driver, on_step: Callable, window_handle=None, score_selectors: bool = False,
+              snapshot_source: Callable[[], UISnapshot] = None, driver_call: Callable = None):
+        """Start recording user interactions.
+
+        With ``score_selectors`` the worker times candidate selectors against
+        the live driver and keeps the fastest unique one plus ranked fallbacks.
+        ``snapshot_source`` returns the current UI snapshot; clicks are then
+        resolved against a spatial index of it instead of UIA. ``driver_call(fn, *args)``
+        runs driver work from the worker thread (e.g. through the driver actor).
+        """
         if self.recording:
             logger.warning("[RECORDER] Already recording")
             return
 
+        self._mouse, self._keyboard = _load_input_backend()
         self.recording = True
         self.steps = []
         self._appium_driver = appium_driver
@@ -78,17 +148,33 @@ class RecorderService:
         self._typing_buffer = ""
         self._typing_element_info = None
         self._last_action_time = time.time()
+        self._recording_started = self._last_action_time
         self._target_window_handle = window_handle
+        self.score_selectors = score_selectors
+        self._driver_call = driver_call or (lambda fn, *args: fn(*args))
+        self._events = queue.Queue()
+        self._hook_ms.clear()
+        self._resolve_ms.clear()
+        self._event_to_step_ms.clear()
+        self._snapshot_source = snapshot_source
+        self._index = None
+        self._last_step_at = 0.0
+        self._index_ms.clear()
+        self._resolved_by = {"index": 0, "uia": 0}
 
         # Get target window bounds if possible
         self._update_window_rect()
 
+        # Start the element-resolution worker before the hooks can enqueue events
+        self._worker = threading.Thread(target=self._worker_loop, name="recorder-worker", daemon=True)
+        self._worker.start()
+
         # Start mouse listener
-        self._mouse_listener = mouse.Listener(on_click=self._on_mouse_click)
+        self._mouse_listener = self._mouse.Listener(on_click=self._on_mouse_click)
         self._mouse_listener.start()
 
         # Start keyboard listener
-        self._kb_listener = keyboard.Listener(
+        self._kb_listener = self._keyboard.Listener(
             on_press=self._on_key_press,
             on_release=self._on_key_release
         )
@@ -99,10 +185,7 @@ class RecorderService:
     def stop(self):
         """Stop recording and return captured steps."""
         if not self.recording:
-            return self.steps
-
-        # Flush any pending typing
-        self._flush_typing_buffer()
+            return [s.to_dict() for s in self.steps]
 
         self.recording = False
 
@@ -114,6 +197,18 @@ class RecorderService:
             self._kb_listener.stop()
             self._kb_listener = None
 
+        # Drain queued events, then flush any pending typing; the worker owns the
+        # typing buffer, so the flush runs there as the last queued item
+        self._events.put(("flush", None, None))
+        self._events.put(None)
+        if self._worker:
+            self._worker.join(timeout=10)
+            if self._worker.is_alive():
+                logger.warning("[RECORDER] Worker still resolving events after 10s; the remaining steps follow when it finishes")
+            self._worker = None
+        else:
+            self._flush_typing_buffer(self._typing_started)
+
         logger.info(f"[RECORDER] Recording stopped. {len(self.steps)} steps captured.")
         return [s.to_dict() for s in self.steps]
 
@@ -137,9 +232,10 @@ class RecorderService:
         return (r.get('x', 0) <= x <= r.get('x', 0) + r.get('width', 9999) and
                 r.get('y', 0) <= y <= r.get('y', 0) + r.get('height', 9999))
 
-    def _add_wait_if_needed(self):
+    def _add_wait_if_needed(self, now: float = None):
         """Add a wait step if significant time passed between actions."""
-        now = time.time()
+        if now is None:
+            now = time.time()
         elapsed_ms = int((now - self._last_action_time) * 1000)
         if elapsed_ms > 2000:  # More than 2 seconds gap
             wait_step = RecordedStep(
@@ -147,9 +243,8 @@ class RecorderService:
                 description=f"Esperar {elapsed_ms}ms",
                 wait_time=min(elapsed_ms, 10000)  # Cap at 10s
             )
-            self.steps.append(wait_step)
-            if self._on_step:
-                self._on_step(wait_step.to_dict())
+            wait_step.timestamp_ms = int((self._last_action_time - self._recording_started) * 1000)
+            self._emit_step(wait_step)
         self._last_action_time = now
 
     def _get_element_at_point(self, x: int, y: int) -> dict:
@@ -165,11 +260,22 @@ class RecorderService:
             if not self._appium_driver:
                 return element_info
 
-            # Use pywinauto to get element at point
-            from pywinauto import Desktop
-            desktop = Desktop(backend="uia")
+            started = time.perf_counter()
+            node = self._index_lookup(x, y)
+            if node is not None:
+                self._resolve_ms.append((time.perf_counter() - started) * 1000)
+                self._resolved_by["index"] += 1
+                element_info.update(name=node.name, automation_id=node.automation_id,
+                                    class_name=node.class_name, control_type=node.control_type)
+                logger.info(f"[RECORDER] Element at ({x},{y}) (índice): name='{node.name}', "
+                            f"aid='{node.automation_id}', type='{node.control_type}'")
+                return element_info
 
+            desktop = self._get_desktop()
+            started = time.perf_counter()
             element = desktop.from_point(x, y)
+            self._resolve_ms.append((time.perf_counter() - started) * 1000)
+            self._resolved_by["uia"] += 1
             if element:
                 wrapper = element
                 element_info["name"] = str(getattr(wrapper, 'element_info', wrapper).name or "")
@@ -186,6 +292,46 @@ class RecorderService:
 
         return element_info
 
+    def _refresh_index(self):
+        """Re-read the screen into the spatial index (worker thread, while idle)."""
+        started = time.perf_counter()
+        try:
+            snapshot = self._snapshot_source()
+        except Exception as e:
+            logger.info(f"[RECORDER] No se pudo actualizar el índice espacial: {e}")
+            self._index = None
+            self._index_at = time.time()  # do not retry on every idle tick
+            return
+        root = snapshot.nodes[0] if snapshot.nodes else None
+        rect = self._target_window_rect or {}
+        # Page-source coordinates may be window-relative; the hooks report screen coordinates
+        self._index_offset = (rect.get("x", 0) - root.x, rect.get("y", 0) - root.y) if root and rect else (0, 0)
+        self._index = SpatialIndex.from_snapshot(snapshot)
+        self._index_at = time.time()
+        self._index_ms.append((time.perf_counter() - started) * 1000)
+
+    def _index_due(self) -> bool:
+        if self._snapshot_source is None or not self.recording:
+            return False
+        now = time.time()
+        if now - self._last_step_at < self.INDEX_SETTLE_S:
+            return False
+        return self._index is None or now - self._index_at > self.INDEX_MAX_AGE_S
+
+    def _index_lookup(self, x: int, y: int):
+        """Identified element under a screen point from a fresh-enough index, or None."""
+        if self._index is None or time.time() - self._index_at > self.INDEX_MAX_AGE_S:
+            return None
+        dx, dy = self._index_offset
+        return self._index.at(x - dx, y - dy, identified=True)
+
+    def _get_desktop(self):
+        """Long-lived UIA desktop, created once in the worker thread."""
+        if self._desktop is None:
+            from pywinauto import Desktop
+            self._desktop = Desktop(backend="uia")
+        return self._desktop
+
     def _determine_selector(self, element_info: dict) -> tuple:
         """Determine best selector type and value for an element."""
         # Priority: automation_id > name > class_name
@@ -197,6 +343,27 @@ class RecorderService:
             return "class_name", element_info["class_name"]
         return None, None
 
+    def _select_for(self, element_info: dict) -> tuple:
+        """Selector type, value and ranked fallbacks for an element (worker thread)."""
+        selector_type, selector_value = self._determine_selector(element_info)
+        if not self.score_selectors or not self._appium_driver or not selector_type:
+            return selector_type, selector_value, None
+
+        try:
+            ranked = rank_candidates(self._driver_call(
+                score_candidates_live, self._appium_driver, generate_candidates(element_info),
+            ))
+        except Exception as e:  # actor timeout or cancel: keep the plain selector rather than lose the step
+            logger.warning(f"[RECORDER] No se pudieron puntuar los selectores: {e}")
+            return selector_type, selector_value, None
+        if not ranked:
+            return selector_type, selector_value, None
+        best = ranked[0]
+        fallbacks = fallback_entries(ranked[1:])
+        logger.info(f"[RECORDER] Selector elegido [{best['selector_type']}] {best['selector_value']} "
+                    f"({best['latency_ms']}ms, único={best['unique']}), {len(fallbacks)} alternativas")
+        return best["selector_type"], best["selector_value"], fallbacks
+
     def _determine_action_type(self, element_info: dict) -> str:
         """Determine action type based on element control type."""
         control_type = element_info.get("control_type", "").lower()
@@ -213,29 +380,91 @@ class RecorderService:
         return "click"
 
     def _on_mouse_click(self, x: int, y: int, button, pressed: bool):
-        """Handle mouse click events."""
-        if not self.recording or not pressed or button != mouse.Button.left:
-            return
-
-        # Debounce — ignore clicks within 300ms
-        now = time.time()
-        if now - self._last_click_time < 0.3:
-            return
-        self._last_click_time = now
-
-        # Check if click is in target window
-        if not self._is_in_target_window(x, y):
-            return
+        """Mouse hook: only filter and enqueue a timestamped raw event."""
+        started = time.perf_counter()
+        try:
+            if not self.recording or not pressed or button != self._mouse.Button.left:
+                return
+
+            # Debounce — ignore clicks within 300ms
+            now = time.time()
+            if now - self._last_click_time < 0.3:
+                return
+            self._last_click_time = now
+
+            # Check if click is in target window
+            if not self._is_in_target_window(x, y):
+                return
+
+            self._events.put(("click", now, (x, y)))
+        finally:
+            self._hook_ms.append((time.perf_counter() - started) * 1000)
+
+    def _worker_loop(self):
+        """Resolve queued raw events in order, off the input hooks."""
+        comtypes = _load_comtypes()
+        if comtypes:
+            try:
+                comtypes.CoInitialize()
+            except Exception as e:
+                logger.warning(f"[RECORDER] CoInitialize failed: {e}")
+
+        while True:
+            try:
+                event = self._events.get(timeout=self.INDEX_SETTLE_S if self._snapshot_source else None)
+            except queue.Empty:
+                if self._index_due():
+                    self._refresh_index()
+                continue
+            if event is None:
+                break
+            kind, timestamp, payload = event
+            try:
+                if kind == "click":
+                    self._handle_click(payload[0], payload[1], timestamp)
+                elif kind == "key":
+                    self._handle_key(payload, timestamp)
+                elif kind == "flush":
+                    # Stamped with when the typing started, without adding a wait for the time until stop
+                    self._flush_typing_buffer(self._typing_started)
+            except Exception as e:
+                logger.warning(f"[RECORDER] Error processing {kind} event: {e}")
+
+        self._desktop = None
+        if comtypes:
+            try:
+                comtypes.CoUninitialize()
+            except Exception:
+                pass
+
+    def _emit_step(self, step: RecordedStep, timestamp: float = None, started: float = None):
+        """Store a step, notify the listener and record event-to-step latency.
+
+        ``timestamp`` is the time of the originating input event; ``started``
+        (or ``timestamp``) is saved as an offset from the start of the
+        recording for timing-faithful replay.
+        """
+        self.steps.append(step)
+        if step.action_type != "wait":
+            # The screen may change after this action: the spatial index no longer applies
+            self._index = None
+            self._last_step_at = time.time()
+        if timestamp is not None:
+            step.timestamp_ms = int(((started or timestamp) - self._recording_started) * 1000)
+            self._event_to_step_ms.append((time.time() - timestamp) * 1000)
+        if self._on_step:
+            self._on_step(step.to_dict())
 
+    def _handle_click(self, x: int, y: int, timestamp: float):
+        """Turn a queued click into a step (runs in the worker thread)."""
         # Flush any pending typing first
-        self._flush_typing_buffer()
+        self._flush_typing_buffer(timestamp)
 
         # Add wait if needed
-        self._add_wait_if_needed()
+        self._add_wait_if_needed(timestamp)
 
         # Get element at click position
         element_info = self._get_element_at_point(x, y)
-        selector_type, selector_value = self._determine_selector(element_info)
         action_type = self._determine_action_type(element_info)
 
         # If it's a text field, start capturing typing instead of click
@@ -248,48 +477,52 @@ class RecorderService:
         # Build description
         el_name = element_info.get("name", "") or element_info.get("automation_id", "") or f"({x},{y})"
         description = f"Clic en '{el_name}'"
+        selector_type, selector_value, fallbacks = self._select_for(element_info)
 
         step = RecordedStep(
             action_type=action_type,
             description=description,
             selector_type=selector_type,
             selector_value=selector_value,
+            fallback_selectors=fallbacks,
         )
-        self.steps.append(step)
-
         logger.info(f"[RECORDER] Step recorded: {step.to_dict()}")
-
-        if self._on_step:
-            self._on_step(step.to_dict())
+        self._emit_step(step, timestamp)
 
     def _on_key_press(self, key):
-        """Handle keyboard press events."""
-        if not self.recording:
-            return
-
+        """Keyboard hook: only enqueue a timestamped raw event."""
+        started = time.perf_counter()
+        try:
+            if not self.recording:
+                return
+            self._events.put(("key", time.time(), key))
+        finally:
+            self._hook_ms.append((time.perf_counter() - started) * 1000)
+
+    def _handle_key(self, key, timestamp: float):
+        """Turn a queued key press into typing or a send_keys step (worker thread)."""
         try:
             # Special keys
-            if isinstance(key, keyboard.Key):
+            if isinstance(key, self._keyboard.Key):
                 key_name = key.name.capitalize()
 
                 # If typing, flush buffer before recording special key
                 if key_name in ("Enter", "Tab", "Escape", "F5", "Backspace", "Delete"):
-                    self._flush_typing_buffer()
-                    self._add_wait_if_needed()
+                    self._flush_typing_buffer(timestamp)
+                    self._add_wait_if_needed(timestamp)
 
                     step = RecordedStep(
                         action_type="send_keys",
                         description=f"Presionar tecla {key_name}",
                         value=key_name,
                     )
-                    self.steps.append(step)
-
-                    if self._on_step:
-                        self._on_step(step.to_dict())
+                    self._emit_step(step, timestamp)
                     return
 
             # Regular character — add to typing buffer
             if hasattr(key, 'char') and key.char:
+                if not self._typing_buffer:
+                    self._typing_started = timestamp
                 self._typing_buffer += key.char
 
         except Exception as e:
@@ -299,15 +532,15 @@ class RecorderService:
         """Handle keyboard release events (unused but required by pynput)."""
         pass
 
-    def _flush_typing_buffer(self):
+    def _flush_typing_buffer(self, timestamp: float = None):
         """Flush accumulated typing as a single 'type' step."""
         if not self._typing_buffer:
             return
 
-        self._add_wait_if_needed()
+        self._add_wait_if_needed(timestamp)
 
         el_info = self._typing_element_info or {}
-        selector_type, selector_value = self._determine_selector(el_info)
+        selector_type, selector_value, fallbacks = self._select_for(el_info)
         el_name = el_info.get("name", "") or el_info.get("automation_id", "") or "campo"
 
         step = RecordedStep(
@@ -316,17 +549,26 @@ class RecorderService:
             selector_type=selector_type,
             selector_value=selector_value,
             value=self._typing_buffer,
+            fallback_selectors=fallbacks,
         )
-        self.steps.append(step)
-
         logger.info(f"[RECORDER] Typing step recorded: {step.to_dict()}")
-
-        if self._on_step:
-            self._on_step(step.to_dict())
+        self._emit_step(step, timestamp, started=self._typing_started)
 
         self._typing_buffer = ""
+        self._typing_started = None
         self._typing_element_info = None
 
     def get_steps(self) -> list:
         """Get all recorded steps."""
         return [s.to_dict() for s in self.steps]
+
+    def get_metrics(self) -> dict:
+        """Hook callback time and element-resolution latency statistics."""
+        return {
+            "hook_callback": _summarize_ms(list(self._hook_ms)),
+            "element_resolution": _summarize_ms(list(self._resolve_ms)),
+            "event_to_step": _summarize_ms(list(self._event_to_step_ms)),
+            "index_refresh": _summarize_ms(list(self._index_ms)),
+            "resolved_by": dict(self._resolved_by),
+            "queued_events": self._events.qsize(),
+        }
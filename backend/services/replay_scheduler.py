@@ -0,0 +1,86 @@
+"""
+ReplayScheduler — Timing-faithful replay of recorded flows.
+Schedules steps against a monotonic clock using the per-step timestamps saved
+by RecorderService, scaled by a speed factor (0 = as fast as possible,
+1 = real time, 2 = double speed). Steps are placed on an absolute timeline,
+so a slow command shortens the wait before the next one (drift compensation).
+Time the run spends outside the recording (pauses, failure decisions, retries)
+is taken out of the timeline with ``shift``/``rebase`` so the remaining steps
+keep their recorded spacing.
+"""
+import asyncio
+import time
+import logging
+from typing import Optional
+
+logger = logging.getLogger("replay_scheduler")
+
+
+class ReplayScheduler:
+    def __init__(self, speed: float):
+        if speed < 0:
+            raise ValueError("La velocidad de reproducción no puede ser negativa")
+        self.speed = speed
+        self._origin: Optional[float] = None
+        self._base_offset_ms = 0
+        self.scheduled_steps = 0
+        self.late_steps = 0
+        self.total_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.total_wait_ms = 0.0
+
+    @property
+    def realtime(self) -> bool:
+        return self.speed > 0
+
+    def delay_for(self, offset_ms: Optional[int]) -> float:
+        """Seconds to wait before a step recorded at ``offset_ms`` (negative = late)."""
+        if offset_ms is None or not self.realtime:
+            return 0.0
+        now = time.monotonic()
+        if self._origin is None:
+            self._origin = now
+            self._base_offset_ms = offset_ms
+            return 0.0
+        target = self._origin + (offset_ms - self._base_offset_ms) / 1000 / self.speed
+        return target - now
+
+    def shift(self, seconds: float):
+        """Move the rest of the timeline ``seconds`` later (e.g. after a pause)."""
+        if self._origin is not None and seconds > 0:
+            self._origin += seconds
+
+    def rebase(self, offset_ms: Optional[int]):
+        """Re-anchor the timeline so the step recorded at ``offset_ms`` is due now."""
+        if self._origin is None or offset_ms is None or not self.realtime:
+            return
+        self._origin = time.monotonic() - (offset_ms - self._base_offset_ms) / 1000 / self.speed
+
+    def _record(self, delay: float):
+        self.scheduled_steps += 1
+        if delay < 0:
+            lag_ms = -delay * 1000
+            self.late_steps += 1
+            self.total_lag_ms += lag_ms
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+        else:
+            self.total_wait_ms += delay * 1000
+
+    async def wait_until(self, offset_ms: Optional[int]):
+        """Sleep until the step's scheduled time; never sleeps when already late."""
+        if offset_ms is None:
+            return
+        delay = self.delay_for(offset_ms)
+        self._record(delay)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            "speed": self.speed,
+            "scheduled_steps": self.scheduled_steps,
+            "late_steps": self.late_steps,
+            "avg_lag_ms": round(self.total_lag_ms / self.late_steps, 1) if self.late_steps else 0.0,
+            "max_lag_ms": round(self.max_lag_ms, 1),
+            "total_wait_ms": round(self.total_wait_ms, 1),
+        }
@@ -0,0 +1,172 @@
+"""
+RunAnalytics — Latency distributions and regression detection over stored runs.
+Groups step durations from the run store per step, computes percentiles from
+one sort per series, compares a baseline against a candidate (two runs or two
+time windows) with a Mann-Whitney U test, and flags steps whose p95 regressed
+beyond a threshold. Pure standard library: numpy is not a dependency here.
+"""
+import math
+import os
+import time
+import logging
+from collections import defaultdict
+from typing import Optional
+
+from services.run_store import RunStore
+
+logger = logging.getLogger("run_analytics")
+
+PERCENTILES = (50, 90, 95, 99)
+TOTAL_KEY = "__run_total__"
+MIN_SAMPLES = 5  # per side, before the significance test is meaningful
+
+
+def percentiles(values: list[float], qs: tuple = PERCENTILES) -> dict:
+    """Linear-interpolated percentiles, all from a single sort."""
+    if not values:
+        return {f"p{q}": None for q in qs}
+    ordered = sorted(values)
+    last = len(ordered) - 1
+    out = {}
+    for q in qs:
+        pos = last * q / 100
+        lo = int(pos)
+        hi = min(lo + 1, last)
+        out[f"p{q}"] = round(ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo), 1)
+    return out
+
+
+def distribution(values: list[float]) -> dict:
+    if not values:
+        return {"n": 0, "mean": None, "max": None, **percentiles(values)}
+    return {
+        "n": len(values),
+        "mean": round(sum(values) / len(values), 1),
+        "max": round(max(values), 1),
+        **percentiles(values),
+    }
+
+
+def mann_whitney(a: list[float], b: list[float]) -> Optional[float]:
+    """Two-sided p-value (normal approximation, tie-corrected); None with too few samples."""
+    n1, n2 = len(a), len(b)
+    if n1 < MIN_SAMPLES or n2 < MIN_SAMPLES:
+        return None
+    pooled = sorted([(v, 0) for v in a] + [(v, 1) for v in b])
+    ranks = [0.0] * len(pooled)
+    tie_term = 0.0
+    i = 0
+    while i < len(pooled):
+        j = i
+        while j + 1 < len(pooled) and pooled[j + 1][0] == pooled[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        t = j - i + 1
+        tie_term += t ** 3 - t
+        i = j + 1
+    r1 = sum(r for r, (_, side) in zip(ranks, pooled) if side == 0)
+    u1 = r1 - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))))
+    if sigma == 0:
+        return 1.0
+    z = (u1 - n1 * n2 / 2) / sigma
+    return round(math.erfc(abs(z) / math.sqrt(2)), 4)
+
+
+def group_samples(rows: list[dict]) -> dict:
+    """``{step_key: [duration_ms, ...]}`` plus the per-run total under TOTAL_KEY."""
+    series = defaultdict(list)
+    totals = {}
+    for row in rows:
+        series[f"{row['step_index']}:{row['action_type']}:{row['description']}"].append(row["duration_ms"])
+        if row.get("total_ms") is not None:
+            totals[row["run_id"]] = row["total_ms"]
+    if totals:
+        series[TOTAL_KEY] = list(totals.values())
+    return dict(series)
+
+
+def _select(store: RunStore, selection: dict, flow_name: str = None) -> list[dict]:
+    """``selection``: ``{"run_id"}``, ``{"run_ids": [...]}`` or ``{"since", "until"}`` (epoch seconds)."""
+    run_ids = selection.get("run_ids") or ([selection["run_id"]] if selection.get("run_id") else None)
+    if not run_ids and selection.get("since") is None and selection.get("until") is None:
+        raise ValueError("Cada lado de la comparación necesita run_id, run_ids o una ventana since/until")
+    return store.step_samples(run_ids, selection.get("since"), selection.get("until"), flow_name)
+
+
+def step_distributions(store: RunStore, selection: dict, flow_name: str = None) -> dict:
+    return {key: distribution(values) for key, values in group_samples(_select(store, selection, flow_name)).items()}
+
+
+def compare(store: RunStore, baseline: dict, candidate: dict, flow_name: str = None,
+            threshold_pct: float = 20.0, alpha: float = 0.05) -> dict:
+    """Per-step baseline vs candidate: distributions, p95 change, significance and a regression flag.
+
+    A step regresses when its p95 grows more than ``threshold_pct`` and the
+    difference is significant, or when there are too few samples to test.
+    """
+    base = group_samples(_select(store, baseline, flow_name))
+    cand = group_samples(_select(store, candidate, flow_name))
+    steps = []
+    for key in sorted(set(base) | set(cand), key=lambda k: (k == TOTAL_KEY, k)):
+        b, c = base.get(key, []), cand.get(key, [])
+        b_dist, c_dist = distribution(b), distribution(c)
+        delta = None
+        if b_dist["p95"] and c_dist["p95"] is not None:
+            delta = round((c_dist["p95"] - b_dist["p95"]) / b_dist["p95"] * 100, 1)
+        p_value = mann_whitney(b, c)
+        significant = None if p_value is None else p_value < alpha
+        steps.append({
+            "step": key,
+            "baseline": b_dist,
+            "candidate": c_dist,
+            "p95_change_pct": delta,
+            "p_value": p_value,
+            "significant": significant,
+            "regressed": delta is not None and delta > threshold_pct and significant is not False,
+        })
+    regressions = [s["step"] for s in steps if s["regressed"]]
+    if regressions:
+        logger.info(f"[ANALYTICS] {len(regressions)} paso(s) con p95 > +{threshold_pct}%: {', '.join(regressions)}")
+    return {
+        "generated_at": time.time(),
+        "baseline": baseline,
+        "candidate": candidate,
+        "flow_name": flow_name,
+        "threshold_pct": threshold_pct,
+        "alpha": alpha,
+        "regressions": regressions,
+        "steps": steps,
+    }
+
+
+def _fmt(value) -> str:
+    return "—" if value is None else str(value)
+
+
+def write_report(result: dict, directory: str) -> str:
+    """Markdown report of a comparison; returns the file path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"compare-{time.strftime('%Y%m%d-%H%M%S', time.localtime(result['generated_at']))}.md")
+    lines = [
+        "# Comparación de ejecuciones",
+        "",
+        f"- Base: `{result['baseline']}`",
+        f"- Candidata: `{result['candidate']}`",
+        f"- Umbral p95: +{result['threshold_pct']}% (α = {result['alpha']})",
+        f"- Regresiones: {', '.join(result['regressions']) or 'ninguna'}",
+        "",
+        "| Paso | n base | n cand | p95 base (ms) | p95 cand (ms) | Δ p95 | p | Regresión |",
+        "|------|--------|--------|---------------|---------------|-------|---|-----------|",
+    ]
+    for s in result["steps"]:
+        change = "—" if s["p95_change_pct"] is None else f"{s['p95_change_pct']:+}%"
+        lines.append(
+            f"| {s['step']} | {s['baseline']['n']} | {s['candidate']['n']} | {_fmt(s['baseline']['p95'])} | "
+            f"{_fmt(s['candidate']['p95'])} | {change} | {_fmt(s['p_value'])} | {'⚠' if s['regressed'] else ''} |"
+        )
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
@@ -0,0 +1,250 @@
+"""
+RunStore — Persistent run results (SQLite, WAL mode).
+Records every flow run with its steps, products added, retries, selector and
+click-strategy fallbacks and timings. Writes are queued and flushed in batches
+by a background writer thread, so recording never blocks the flow runner;
+reads use their own connection, which WAL keeps from blocking the writer.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+import logging
+from typing import Optional
+
+logger = logging.getLogger("run_store")
+
+DEFAULT_PATH = os.environ.get(
+    "POS_RUNS_DB", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "runs.db")
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    flow_name TEXT,
+    source TEXT,
+    started_at REAL,
+    finished_at REAL,
+    status TEXT,
+    steps_executed INTEGER,
+    failed_step INTEGER,
+    error TEXT,
+    total_ms REAL
+);
+CREATE TABLE IF NOT EXISTS steps (
+    run_id TEXT,
+    step_index INTEGER,
+    action_type TEXT,
+    description TEXT,
+    selector_type TEXT,
+    selector_value TEXT,
+    status TEXT,
+    attempt INTEGER,
+    lookup_attempts INTEGER,
+    fallback_selector TEXT,
+    click_strategy TEXT,
+    strategy_fallbacks INTEGER,
+    started_at REAL,
+    duration_ms REAL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS products (
+    run_id TEXT,
+    step_index INTEGER,
+    code TEXT,
+    quantity INTEGER,
+    status TEXT,
+    duration_ms REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_started ON runs(started_at);
+CREATE INDEX IF NOT EXISTS idx_steps_run ON steps(run_id);
+CREATE INDEX IF NOT EXISTS idx_products_run ON products(run_id);
+"""
+
+STEP_COLUMNS = (
+    "run_id", "step_index", "action_type", "description", "selector_type", "selector_value", "status",
+    "attempt", "lookup_attempts", "fallback_selector", "click_strategy", "strategy_fallbacks",
+    "started_at", "duration_ms", "error",
+)
+PRODUCT_COLUMNS = ("run_id", "step_index", "code", "quantity", "status", "duration_ms", "error")
+
+
+def _insert(table: str, columns: tuple) -> str:
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+
+INSERT_STEP = _insert("steps", STEP_COLUMNS)
+INSERT_PRODUCT = _insert("products", PRODUCT_COLUMNS)
+INSERT_RUN = "INSERT INTO runs (id, flow_name, source, started_at, status) VALUES (?, ?, ?, ?, 'running')"
+FINISH_RUN = ("UPDATE runs SET finished_at = ?, status = ?, steps_executed = ?, failed_step = ?, error = ?, "
+              "total_ms = ? WHERE id = ?")
+
+
+class RunStore:
+    def __init__(self, path: str = DEFAULT_PATH, batch_size: int = 200, flush_interval: float = 0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._started: dict = {}   # run_id -> perf_counter at start, for total_ms
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+
+    # ── Lifecycle ───────────────────────────────────────
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            conn = self._connect()
+            conn.executescript(SCHEMA)
+            conn.close()
+            self._thread = threading.Thread(target=self._writer, name="run-store-writer", daemon=True)
+            self._thread.start()
+        logger.info(f"[RUNS] Almacén de resultados en {self.path}")
+
+    def _writer(self):
+        conn = self._connect()
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            # Gather more writes for one transaction, up to batch_size or flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(conn, batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write(self, conn: sqlite3.Connection, batch: list):
+        # Group consecutive writes of the same statement into executemany, keeping order
+        groups = []
+        for sql, params in batch:
+            if groups and groups[-1][0] == sql:
+                groups[-1][1].append(params)
+            else:
+                groups.append((sql, [params]))
+        try:
+            with conn:
+                for sql, rows in groups:
+                    conn.executemany(sql, rows)
+            self.written += len(batch)
+            self.batches += 1
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.error(f"[RUNS] No se pudo escribir un lote de {len(batch)} registros: {e}")
+
+    def flush(self):
+        """Block until every queued write is on disk (used before reads that must see them)."""
+        if self._thread and self._thread.is_alive():
+            self._queue.join()
+
+    # ── Recording (non-blocking) ────────────────────────
+
+    def _put(self, sql: str, params: tuple):
+        self.start()
+        self._queue.put((sql, params))
+
+    def start_run(self, flow_name: str, source: str = "api") -> str:
+        run_id = uuid.uuid4().hex
+        self._started[run_id] = time.perf_counter()
+        self._put(INSERT_RUN, (run_id, flow_name, source, time.time()))
+        return run_id
+
+    def record_step(self, run_id: str, step_index: int, **fields):
+        row = {"run_id": run_id, "step_index": step_index, **fields}
+        self._put(INSERT_STEP, tuple(row.get(c) for c in STEP_COLUMNS))
+
+    def record_product(self, run_id: str, step_index: int, **fields):
+        row = {"run_id": run_id, "step_index": step_index, **fields}
+        self._put(INSERT_PRODUCT, tuple(row.get(c) for c in PRODUCT_COLUMNS))
+
+    def finish_run(self, run_id: str, status: str, steps_executed: int = None, failed_step: int = None,
+                   error: str = None):
+        started = self._started.pop(run_id, None)
+        total_ms = round((time.perf_counter() - started) * 1000, 1) if started else None
+        self._put(FINISH_RUN, (time.time(), status, steps_executed, failed_step, error, total_ms, run_id))
+
+    # ── Queries ─────────────────────────────────────────
+
+    def _query(self, sql: str, params: tuple = ()) -> list[dict]:
+        self.start()
+        conn = self._connect()
+        try:
+            return [dict(row) for row in conn.execute(sql, params).fetchall()]
+        finally:
+            conn.close()
+
+    def recent_runs(self, limit: int = 20, flow_name: str = None) -> list[dict]:
+        self.flush()
+        if flow_name:
+            return self._query("SELECT * FROM runs WHERE flow_name = ? ORDER BY started_at DESC LIMIT ?",
+                               (flow_name, limit))
+        return self._query("SELECT * FROM runs ORDER BY started_at DESC LIMIT ?", (limit,))
+
+    def get_run(self, run_id: str) -> Optional[dict]:
+        self.flush()
+        runs = self._query("SELECT * FROM runs WHERE id = ?", (run_id,))
+        if not runs:
+            return None
+        run = runs[0]
+        run["steps"] = self._query("SELECT * FROM steps WHERE run_id = ? ORDER BY rowid", (run_id,))
+        run["products"] = self._query("SELECT * FROM products WHERE run_id = ? ORDER BY rowid", (run_id,))
+        return run
+
+    def step_samples(self, run_ids: list[str] = None, since: float = None, until: float = None,
+                     flow_name: str = None) -> list[dict]:
+        """Successful step durations for a set of runs or a time window (run start time)."""
+        self.flush()
+        where, params = ["s.status = 'ok'", "s.duration_ms IS NOT NULL"], []
+        if run_ids:
+            where.append(f"r.id IN ({', '.join('?' * len(run_ids))})")
+            params.extend(run_ids)
+        if since is not None:
+            where.append("r.started_at >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("r.started_at < ?")
+            params.append(until)
+        if flow_name:
+            where.append("r.flow_name = ?")
+            params.append(flow_name)
+        return self._query(
+            "SELECT s.run_id, s.step_index, s.action_type, s.description, s.duration_ms, r.total_ms "
+            f"FROM steps s JOIN runs r ON r.id = s.run_id WHERE {' AND '.join(where)} ORDER BY s.rowid",
+            tuple(params),
+        )
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "pending": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "errors": self.errors,
+        }
+
+
+# Shared store for the flow runner and the API
+run_store = RunStore()
@@ -0,0 +1,286 @@
+"""
+SaleCycle — Explicit state machine for the POS sale lifecycle.
+Models the screens a sale moves through (cart, payment methods, amount
+captured, paid, continue, ready, plus blocking modals). Each tick identifies
+the current state from one UI snapshot, performs the single action that moves
+it forward and records the time spent in every state. Replaces the separate
+wait/retry loops of clear_order, process_payment and continue_sale.
+"""
+import time
+import logging
+from collections import Counter, defaultdict
+from typing import Callable, Optional
+
+from services.ui_snapshot import UISnapshot
+from services.modal_watcher import default_watcher, PAYMENT
+from services.payment_detector import PaymentDetector
+
+logger = logging.getLogger("sale_cycle")
+
+# States
+CART = "cart"
+PAYMENT_METHODS = "payment_methods"
+AMOUNT_CAPTURED = "amount_captured"
+PAID = "paid"
+CONTINUE = "continue"
+READY = "ready"
+MODAL = "modal"
+UNKNOWN = "unknown"
+
+# POS element names
+SEARCH_FIELD = "Buscar producto"
+CLEAR_BUTTON = "Borrar pedido"
+PAYMENT_METHODS_TEXT = "Métodos de pago"
+AMOUNT_INPUT_ID = "InputBox"
+CHARGE_BUTTON = "Cobrar"
+CART_CHARGE_ID = "BtnCobro"
+CONTINUE_BUTTON = "Continuar"
+
+
+class SaleCycleError(Exception):
+    """The sale cycle could not reach its goal."""
+
+    def __init__(self, message: str, report: dict = None):
+        super().__init__(message)
+        self.report = report or {}
+
+
+class SaleCycle:
+    # State -> action that moves the sale forward (None: wait for the POS)
+    TRANSITIONS = {
+        MODAL: "accept_modal",
+        PAYMENT_METHODS: "capture_amount",
+        AMOUNT_CAPTURED: "charge",
+        CONTINUE: "click_continue",
+        CART: None,  # "open_payment" when the goal needs the sale paid, see _action_for
+        PAID: None,
+        UNKNOWN: None,
+    }
+
+    def __init__(self, driver, amount: float = None, clear: bool = False, tick: float = 0.2,
+                 timeout: float = 60, max_actions: int = 20, retry_after: float = 2.0,
+                 snapshot: Callable[[], UISnapshot] = None, should_stop: Callable[[], bool] = None,
+                 connectivity=None, modals=None):
+        self.driver = driver
+        self.amount = amount
+        self.clear = clear
+        self.tick = tick
+        self.timeout = timeout
+        self.max_actions = max_actions
+        self.retry_after = retry_after
+        self._snapshot = snapshot or (lambda: UISnapshot.capture(self.driver))
+        self._should_stop = should_stop or (lambda: False)
+        self.connectivity = connectivity
+        self.modals = modals or default_watcher
+        self._snap: Optional[UISnapshot] = None
+        self.goal: Optional[str] = None
+        self.payment_detection: Optional[dict] = None
+
+        self._captured = False
+        self._charged = False
+        self._paid = False
+        self._cleared = False
+
+        self.state: Optional[str] = None
+        self._state_since: Optional[float] = None
+        self.time_in_state_ms: dict = defaultdict(float)
+        self.path: list[str] = []
+        self.actions: list[dict] = []
+        self.ticks = 0
+        self.snapshot_ms = 0.0
+        self._last_action: Optional[tuple] = None
+
+    # ── State identification ────────────────────────────
+
+    def identify(self, snap: UISnapshot) -> str:
+        """Current state from one snapshot (highest-priority signal wins)."""
+        if self.modals.match(snap, PAYMENT):
+            return MODAL
+
+        amount_input = snap.first(automation_id=AMOUNT_INPUT_ID)
+        if amount_input is not None:
+            if self._amount_matches(amount_input.value) or (amount_input.value is None and self._captured):
+                return AMOUNT_CAPTURED
+            return PAYMENT_METHODS
+        if snap.has(name_contains=PAYMENT_METHODS_TEXT):
+            return PAYMENT_METHODS
+
+        if snap.has(name=CONTINUE_BUTTON):
+            return CONTINUE
+        if snap.has(name=SEARCH_FIELD):
+            return READY if (self._charged or self._cleared) else CART
+        if self._charged:
+            # Payment screen is gone and nothing else is up yet
+            return PAID
+        return UNKNOWN
+
+    def _amount_matches(self, value: Optional[str]) -> bool:
+        if value is None or self.amount is None:
+            return False
+        try:
+            return float(str(value).replace(",", "").strip() or "nan") == float(self.amount)
+        except ValueError:
+            return False
+
+    def _enter(self, state: str):
+        now = time.perf_counter()
+        if self.state is not None:
+            self.time_in_state_ms[self.state] += (now - self._state_since) * 1000
+        if state != self.state:
+            self.path.append(state)
+            if self.state is not None:
+                logger.info(f"[SALE] {self.state} → {state}")
+            if self._charged and state in (CONTINUE, READY, PAID):
+                self._paid = True
+        self.state = state
+        self._state_since = now
+
+    # ── Goals ───────────────────────────────────────────
+
+    def _reached(self, goal: str, state: str) -> bool:
+        if goal == PAID:
+            return self._paid
+        if goal == CONTINUE:
+            # Past the continue screen: the button is gone (or was never up)
+            return state not in (CONTINUE, MODAL)
+        return state == goal
+
+    # ── Actions ─────────────────────────────────────────
+
+    def _action_for(self, state: str) -> Optional[str]:
+        if state == CART:
+            if self.clear and not self._cleared:
+                return "clear_order"
+            if self.goal in (PAID, READY) and not self._charged:
+                return "open_payment"
+        return self.TRANSITIONS.get(state)
+
+    def _click_name(self, name: str):
+        self.driver.find_element("name", name).click()
+
+    def _amount_input(self):
+        return self.driver.find_element("accessibility id", AMOUNT_INPUT_ID)
+
+    def accept_modal(self):
+        rule = self.modals.match(self._snap, PAYMENT)
+        if rule is None or not self.modals.act(self.driver, self._snap, rule):
+            raise RuntimeError("Modal sin botón de acción")
+
+    def capture_amount(self):
+        if self.amount is None:
+            raise SaleCycleError("Pantalla de cobro sin monto configurado")
+        field = self._amount_input()
+        field.click()
+        field.clear()
+        field.send_keys(str(self.amount))
+        self._captured = True
+
+    def open_payment(self):
+        if self.amount is None:
+            raise SaleCycleError("Carrito sin monto configurado para cobrar")
+        try:
+            self.driver.find_element("accessibility id", CART_CHARGE_ID).click()
+        except Exception:
+            self._click_name(CHARGE_BUTTON)
+
+    def charge(self):
+        detector = PaymentDetector(self.driver, snapshot=self._snapshot).arm()
+        try:
+            self._click_name(CHARGE_BUTTON)
+        except Exception:
+            # No "Cobrar" button on this screen: Enter on the amount field charges
+            from selenium.webdriver.common.keys import Keys
+            self._amount_input().send_keys(Keys.ENTER)
+        self._charged = True
+        # Return the moment a completion signal fires instead of waiting out the tick
+        self.payment_detection = detector.wait(timeout=self.retry_after)
+
+    def click_continue(self):
+        # The POS only accepts 'Continuar' online; block until the monitor sees the network
+        if self.connectivity is not None and not self.connectivity.online:
+            logger.warning("[SALE] Sin conexión a internet. Esperando reconexión para continuar...")
+            self.connectivity.wait_until_online(timeout=self.timeout)
+        self._click_name(CONTINUE_BUTTON)
+
+    def clear_order(self):
+        self._click_name(CLEAR_BUTTON)
+        self._cleared = True
+
+    def _settling(self, action: str, state: str) -> bool:
+        if self._last_action is None:
+            return False
+        last_action, last_state, at = self._last_action
+        return last_action == action and last_state == state and time.monotonic() - at < self.retry_after
+
+    def _perform(self, action: str, state: str):
+        started = time.perf_counter()
+        self._last_action = (action, state, time.monotonic())
+        ok = True
+        try:
+            getattr(self, action)()
+        except SaleCycleError:
+            raise
+        except Exception as e:
+            ok = False
+            logger.info(f"[SALE] Acción '{action}' en estado {state} falló: {e}")
+        self.actions.append({
+            "action": action, "state": state, "ok": ok,
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+
+    # ── Loop ────────────────────────────────────────────
+
+    def run(self, goal: str = READY) -> dict:
+        """Drive the POS until ``goal`` (READY, PAID or CONTINUE) is reached.
+
+        Raises SaleCycleError on timeout, stop request or when the action
+        budget is exhausted; the error carries the partial report.
+        """
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        self.goal = goal
+        while True:
+            snap = self._snap = self._snapshot()
+            self.ticks += 1
+            self.snapshot_ms += snap.capture_ms or 0
+            state = self.identify(snap)
+            self._enter(state)
+            if self._reached(goal, state):
+                break
+
+            if self._should_stop():
+                raise SaleCycleError("Ciclo de venta detenido por el usuario", self.report(started))
+            if time.monotonic() >= deadline:
+                raise SaleCycleError(f"Ciclo de venta sin alcanzar '{goal}' en {self.timeout}s (estado: {state})",
+                                     self.report(started))
+
+            action = self._action_for(state)
+            if action and self._settling(action, state):
+                # Same action on the same screen: give the POS time to react before repeating it
+                action = None
+            if action:
+                if len(self.actions) >= self.max_actions:
+                    raise SaleCycleError(f"Ciclo de venta sin alcanzar '{goal}' tras {self.max_actions} acciones "
+                                         f"(estado: {state})", self.report(started))
+                self._perform(action, state)
+            time.sleep(self.tick)
+
+        self._enter(state)
+        report = self.report(started)
+        logger.info(f"[SALE] '{goal}' alcanzado en {report['total_ms']}ms "
+                    f"({report['ticks']} lecturas, {len(self.actions)} acciones): {' → '.join(self.path)}")
+        return report
+
+    def report(self, started: float = None) -> dict:
+        counts = Counter(a["action"] for a in self.actions)
+        return {
+            "final_state": self.state,
+            "path": list(self.path),
+            "ticks": self.ticks,
+            "actions": list(self.actions),
+            "action_counts": dict(counts),
+            "time_in_state_ms": {k: round(v, 1) for k, v in self.time_in_state_ms.items()},
+            "snapshot_ms": round(self.snapshot_ms, 1),
+            "payment_detection": self.payment_detection,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1) if started else None,
+        }
@@ -4,22 +4,17 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 
+from services.modal_watcher import default_watcher, BEFORE_SEARCH, AFTER_ADD
+
 class SearchProductError(Exception):
     """Excepción personalizada para errores al buscar un producto."""
     pass
 
 def close_possible_modals(driver):
-    """Cierra posibles modales que puedan bloquear la búsqueda."""
-    try:
-        modal = driver.find_element(By.NAME, "Aceptar")
-        modal.click()
-        time.sleep(1)  # Espera un segundo para asegurarse de que el modal se cierre
-        modal = driver.find_element(By.NAME, "Aceptar")
-        modal.click()
-        print("[INFO] Modal 'Aceptar' cerrado antes de buscar producto.")
-        time.sleep(1)
-    except Exception:
-        pass  # No hay modal
+    """Cierra posibles modales que puedan bloquear la búsqueda (reglas del watcher de modales)."""
+    handled = default_watcher.check(driver, BEFORE_SEARCH)
+    if handled:
+        print(f"[INFO] Modales cerrados antes de buscar producto: {', '.join(handled)}")
 
 def find_available_buttons(driver, timeout=5):
     """Encuentra todos los botones disponibles en la pantalla después de buscar un producto."""
@@ -308,225 +303,14 @@ def find_and_click_add_button(driver, product_code, max_retries=3):
 
 def handle_recommendation_window(driver, action="accept", max_retries=3):
     """Maneja la ventana de recomendación que aparece después de agregar un producto."""
-    print("[INFO] Buscando ventana de recomendación...")
-    
-    recommendation_count = 0
-    max_recommendations = 5  # Limitar a 5 recomendaciones para evitar bucles infinitos
-    
-    # Primero intentamos encontrar elementos con "OPORTUNIDAD" - esta es la parte crítica
-    opportunity_elements = driver.find_elements(By.XPATH, "//*[contains(@Name, 'Oportunidad') or contains(@Name, 'oportunidad') or contains(@Name, 'Recomendación') or contains(@Name, 'recomendación')]") 
-    
-    # Si encontramos ventanas emergentes, procesarlas
-    if opportunity_elements:
-        print(f"[INFO] Ventana de recomendación encontrada")
-        
-        # Procesar cada ventana de recomendación encontrada (máximo max_recommendations veces)
-        for i in range(max_recommendations):
-            # Volver a buscar ventanas emergentes para cada iteración
-            try:
-                opportunity_elements = driver.find_elements(By.XPATH, "//*[contains(@Name, 'Oportunidad') or contains(@Name, 'oportunidad') or contains(@Name, 'Recomendación') or contains(@Name, 'recomendación')]") 
-                
-                if not opportunity_elements:
-                    print("[INFO] No hay más ventanas de recomendación")
-                    break
-                    
-                recommendation_count += 1
-                print(f"[INFO] Procesando ventana de recomendación #{recommendation_count}")
-                
-                # Buscar botones de acción dentro de esta ventana
-                action_buttons = []
-                
-                # Intentar encontrar botones específicos para aceptar o rechazar
-                if action.lower() == "accept":
-                    # Buscar botón de "Aceptar", "Accept", "Aprobar", etc.
-                    accept_keywords = ["aceptar", "accept", "aprobar", "ok", "continuar", "sí", "si"]
-                    for keyword in accept_keywords:
-                        try:
-                            btn = WebDriverWait(driver, 2).until(
-                                EC.element_to_be_clickable((By.NAME, keyword))
-                            )
-                            action_buttons.append(btn)
-                            print(f"[INFO] Botón de aceptación encontrado: '{keyword}'")
-                            break  # Encontramos uno, salir del bucle
-                        except Exception:
-                            continue
-                elif action.lower() == "reject":
-                    # Buscar botón de "Rechazar", "Reject", etc.
-                    reject_keywords = ["rechazar", "reject", "cancelar", "no"]
-                    for keyword in reject_keywords:
-                        try:
-                            btn = WebDriverWait(driver, 2).until(
-                                EC.element_to_be_clickable((By.NAME, keyword))
-                            )
-                            action_buttons.append(btn)
-                            print(f"[INFO] Botón de rechazo encontrado: '{keyword}'")
-                            break  # Encontramos uno, salir del bucle
-                        except Exception:
-                            continue
-                
-                # Si no encontramos botones específicos, intentar encontrar elementos que puedan ser botones
-                if not action_buttons:
-                    print("[INFO] No se encontraron botones específicos, buscando elementos que puedan actuar como botones...")
-                    
-                    # Primero, buscar directamente los elementos "Agregar" y "Rechazar"
-                    try:
-                        agregar_elements = driver.find_elements(By.XPATH, "//*[contains(@Name, 'Agregar') or contains(@Text, 'Agregar')]")
-                        rechazar_elements = driver.find_elements(By.XPATH, "//*[contains(@Name, 'Rechazar') or contains(@Text, 'Rechazar')]")
-                        
-                        for element in agregar_elements:
-                            if element.is_displayed():
-                                action_buttons.append(element)
-                                print(f"[INFO] Botón 'Agregar' encontrado directamente")
-                                break
-                                
-                        for element in rechazar_elements:
-                            if element.is_displayed():
-                                action_buttons.append(element)
-                                print(f"[INFO] Botón 'Rechazar' encontrado directamente")
-                                break
-                    except Exception as e:
-                        print(f"[INFO] Error al buscar elementos directos: {e}")
-                    
-                    # Si aún no encontramos botones, intentar búsqueda más rápida
-                    if not action_buttons:
-                        # Primero intentar encontrar los botones "Siguiente" o similares (más rápido)
-                        try:
-                            siguiente_elements = driver.find_elements(By.XPATH, "//*[contains(@Name, 'Siguiente') or contains(@Text, 'Siguiente')]")
-                            for element in siguiente_elements:
-                                if element.is_displayed():
-                                    action_buttons.append(element)
-                                    print(f"[INFO] Botón 'Siguiente' encontrado para acción")
-                                    break
-                        except Exception as e:
-                            print(f"[INFO] Error al buscar botones 'Siguiente': {e}")
-                
-                # Si encontramos botones de acción, hacer clic en el primero
-                if action_buttons:
-                    action_button = action_buttons[0]
-                    try:
-                        action_button.click()
-                        print(f"[ÉXITO] Acción '{action}' realizada en ventana de recomendación #{recommendation_count}")
-                    except Exception as click_error:
-                        print(f"[ERROR] No se pudo hacer clic en el botón de acción: {click_error}")
-                else:
-                    print("[ADVERTENCIA] No se encontraron botones de acción en la ventana de recomendación")
-                    break  # Si no hay botones, salir del bucle
-                    
-            except Exception as e:
-                print(f"[INFO] Error procesando ventana de recomendación #{i+1}: {e}")
-                break  # Si hay error, salir del bucle para evitar bucles infinitos
-    
-    else:
-        print("[INFO] No se encontró ventana de recomendación")
-    
-    print(f"[INFO] Procesadas {recommendation_count} recomendaciones en total")
-    return True
+    return handle_all_recommendations(driver, action)
 
 def handle_all_recommendations(driver, action="accept"):
-    """Maneja todas las ventanas de recomendación que puedan aparecer después de agregar un producto."""
-    print("[INFO] Manejando todas las recomendaciones posibles...")
-    
-    # Bucle para continuar procesando recomendaciones mientras existan
-    max_iterations = 10  # Límite máximo para evitar bucles infinitos
-    iteration = 0
-    
-    while iteration < max_iterations:
-        try:
-            # Primero verificamos si existe una ventana de oportunidad
-            opportunity_elements = driver.find_elements(By.XPATH, "//*[contains(@Name, 'Oportunidad') or contains(@Name, 'oportunidad') or contains(@Name, 'Recomendación') or contains(@Name, 'recomendación')]") 
-            
-            if not opportunity_elements:
-                print("[INFO] No se encontró ventana de recomendación")
-                break  # Si no hay más ventanas, salir del bucle
-            
-            # Si hay ventana de oportunidad, procesarla
-            print(f"[INFO] Ventana de recomendación encontrada, procesando...")
-            
-            # Buscar botones de acción dentro de esta ventana
-            action_buttons = []
-            
-            # Intentar encontrar botones específicos para aceptar o rechazar
-            if action.lower() == "accept":
-                # Buscar botón de "Aceptar", "Accept", "Aprobar", etc.
-                accept_keywords = ["aceptar", "accept", "aprobar", "ok", "continuar", "sí", "si"]
-                for keyword in accept_keywords:
-                    try:
-                        btn = WebDriverWait(driver, 2).until(
-                            EC.element_to_be_clickable((By.NAME, keyword))
-                        )
-                        action_buttons.append(btn)
-                        print(f"[INFO] Botón de aceptación encontrado: '{keyword}'")
-                        break  # Encontramos uno, salir del bucle
-                    except Exception:
-                        continue
-            elif action.lower() == "reject":
-                # Buscar botón de "Rechazar", "Reject", etc.
-                reject_keywords = ["rechazar", "reject", "cancelar", "no"]
-                for keyword in reject_keywords:
-                    try:
-                        btn = WebDriverWait(driver, 2).until(
-                            EC.element_to_be_clickable((By.NAME, keyword))
-                        )
-                        action_buttons.append(btn)
-                        print(f"[INFO] Botón de rechazo encontrado: '{keyword}'")
-                        break  # Encontramos uno, salir del bucle
-                    except Exception:
-                        continue
-            
-            # Si no encontramos botones específicos, intentar encontrar elementos que puedan ser botones
-            if not action_buttons:
-                print("[INFO] No se encontraron botones específicos, buscando elementos que puedan actuar como botones...")
-                
-                # Primero, buscar directamente los elementos "Agregar" y "Rechazar"
-                try:
-                    agregar_elements = driver.find_elements(By.XPATH, "//*[contains(@Name, 'Agregar') or contains(@Text, 'Agregar')]")
-                    rechazar_elements = driver.find_elements(By.XPATH, "//*[contains(@Name, 'Rechazar') or contains(@Text, 'Rechazar')]")
-                    
-                    for element in agregar_elements:
-                        if element.is_displayed():
-                            action_buttons.append(element)
-                            print(f"[INFO] Botón 'Agregar' encontrado directamente")
-                            break
-                            
-                    for element in rechazar_elements:
-                        if element.is_displayed():
-                            action_buttons.append(element)
-                            print(f"[INFO] Botón 'Rechazar' encontrado directamente")
-                            break
-                except Exception as e:
-                    print(f"[INFO] Error al buscar elementos directos: {e}")
-                
-                # Si aún no encontramos botones, intentar búsqueda más rápida
-                if not action_buttons:
-                    # Primero intentar encontrar los botones "Siguiente" o similares (más rápido)
-                    try:
-                        siguiente_elements = driver.find_elements(By.XPATH, "//*[contains(@Name, 'Siguiente') or contains(@Text, 'Siguiente')]")
-                        for element in siguiente_elements:
-                            if element.is_displayed():
-                                action_buttons.append(element)
-                                print(f"[INFO] Botón 'Siguiente' encontrado para acción")
-                                break
-                    except Exception as e:
-                        print(f"[INFO] Error al buscar botones 'Siguiente': {e}")
-            
-            # Si encontramos botones de acción, hacer clic en el primero
-            if action_buttons:
-                action_button = action_buttons[0]
-                try:
-                    action_button.click()
-                    print(f"[ÉXITO] Acción '{action}' realizada en ventana de recomendación")
-                except Exception as click_error:
-                    print(f"[ERROR] No se pudo hacer clic en el botón de acción: {click_error}")
-            else:
-                print("[ADVERTENCIA] No se encontraron botones de acción en la ventana de recomendación")
-                break  # Si no hay botones, salir del bucle
-                
-            iteration += 1
-            time.sleep(0.5)  # Pequeño retraso entre iteraciones
-            
-        except Exception as e:
-            print(f"[ERROR] Error procesando recomendación: {e}")
-            break  # Si hay error, salir del bucle para evitar bucles infinitos
-    
-    print(f"[INFO] Procesadas {iteration} recomendaciones en total")
+    """Maneja todas las ventanas de recomendación que puedan aparecer después de agregar un producto.
+
+    Una sola lectura de la UI por ronda; las reglas del watcher deciden el botón
+    ('accept' o 'reject') en lugar de esperar por cada palabra clave.
+    """
+    handled = default_watcher.check(driver, AFTER_ADD, recommendation=action.lower())
+    print(f"[INFO] Procesadas {handled.count('recommendation')} recomendaciones en total")
     return True
@@ -0,0 +1,124 @@
+"""
+SelectorCompiler — Rewrites slow step selectors into native lookups, proven on snapshots.
+A flow selector such as ``//*[@AutomationId='BtnCobro']`` is resolved by
+walking the whole UI tree server-side, and ``_find_element`` only tries the
+accessibility id after the primary 5s wait has already failed. At flow load,
+each step selector is checked against recent UI snapshots from the selector
+lab; when it matches exactly one element and a cheaper native strategy
+(accessibility id, then name) matches that same element and nothing else on
+every snapshot, the step is rewritten and the original selector is kept as its
+first fallback. Decisions are cached per selector and snapshot set.
+"""
+import threading
+import logging
+
+from services.selector_lab import SelectorLab, selector_lab, estimate_cost_ms
+from services.selector_scoring import ESTIMATED_COST_MS
+
+logger = logging.getLogger("selector_compiler")
+
+# Cheapest first: selector type -> UINode attribute holding its value
+NATIVE_STRATEGIES = (("accessibility_id", "automation_id"), ("name", "name"))
+DEFAULT_SNAPSHOTS = 8
+MAX_DECISIONS = 2000
+
+
+class SelectorCompiler:
+    def __init__(self, lab: SelectorLab = None, snapshots: int = DEFAULT_SNAPSHOTS):
+        self.lab = lab or selector_lab
+        self.snapshots = snapshots
+        self._decisions: dict = {}  # (type, value, snapshot ids) -> decision
+        self._lock = threading.Lock()
+        self.rewrites = 0
+
+    def _decide(self, selector_type: str, selector_value: str, snapshot_ids: tuple) -> dict:
+        decision = {"selector_type": selector_type, "selector_value": selector_value, "rewritten_to": None}
+        cost = ESTIMATED_COST_MS.get("accessibility_id" if selector_type == "id" else selector_type, 400)
+        cheaper = [(t, attr) for t, attr in NATIVE_STRATEGIES if ESTIMATED_COST_MS[t] < cost]
+        if not cheaper:
+            return {**decision, "reason": "ya usa la estrategia más barata"}
+        # Per snapshot: the single node the original selector resolves to (None when it is absent)
+        targets = []
+        for snapshot_id in snapshot_ids:
+            snapshot, indexes = self.lab.matches(snapshot_id, selector_type, selector_value)
+            if len(indexes) > 1:
+                return {**decision, "reason": f"ambiguo: {len(indexes)} coincidencias en {snapshot_id}"}
+            targets.append((snapshot_id, snapshot, indexes[0] if indexes else None))
+        found = [(sid, snapshot, index) for sid, snapshot, index in targets if index is not None]
+        if not found:
+            return {**decision, "reason": "no aparece en ningún snapshot"}
+
+        for candidate_type, attr in cheaper:
+            values = {getattr(snapshot.nodes[index], attr) for _, snapshot, index in found}
+            if len(values) != 1 or not next(iter(values)):
+                continue
+            value = values.pop()
+            # Equivalent: the same single node where the original matches, nothing where it does not
+            if all(self.lab.matches(sid, candidate_type, value)[1] == ([] if index is None else [index])
+                   for sid, _, index in targets):
+                _, snapshot, _ = found[0]
+                nodes = len(snapshot.nodes)
+                return {
+                    **decision,
+                    "rewritten_to": {"selector_type": candidate_type, "selector_value": value},
+                    "reason": f"único en {len(found)} de {len(targets)} snapshot(s)",
+                    "saved_ms": round(estimate_cost_ms(selector_type, selector_value, nodes, 1)
+                                      - estimate_cost_ms(candidate_type, value, nodes, 1), 1),
+                }
+        return {**decision, "reason": "sin estrategia nativa equivalente y única"}
+
+    def decide(self, selector_type: str, selector_value: str, snapshot_ids: tuple) -> dict:
+        key = (selector_type, selector_value, snapshot_ids)
+        with self._lock:
+            cached = self._decisions.get(key)
+        if cached is None:
+            try:
+                cached = self._decide(selector_type, selector_value, snapshot_ids)
+            except (KeyError, ValueError) as e:  # snapshot trimmed meanwhile, invalid or unsupported selector
+                cached = {"selector_type": selector_type, "selector_value": selector_value,
+                          "rewritten_to": None,
+                          "reason": str(e).strip("'\"") if isinstance(e, KeyError) else str(e)}
+            with self._lock:
+                if len(self._decisions) >= MAX_DECISIONS:
+                    self._decisions.clear()
+                self._decisions[key] = cached
+        return cached
+
+    def compile_steps(self, steps: list[dict], snapshot_ids: list[str] = None) -> tuple:
+        """``(steps, report)``: rewritten step dicts (originals untouched) and one report entry per selector step.
+
+        A rewritten step keeps the original selector as its first fallback and
+        in ``compiled_from``.
+        """
+        snapshot_ids = tuple(snapshot_ids or self.lab.recent_ids(self.snapshots))
+        if not snapshot_ids:
+            return steps, []
+        compiled, report = [], []
+        for i, step in enumerate(steps):
+            selector_type, selector_value = step.get("selector_type"), step.get("selector_value")
+            if not selector_type or not selector_value or step.get("compiled_from"):
+                compiled.append(step)
+                continue
+            decision = self.decide(selector_type, selector_value, snapshot_ids)
+            report.append({"step_index": i, "description": step.get("description"), **decision})
+            target = decision["rewritten_to"]
+            if target is None:
+                compiled.append(step)
+                continue
+            original = {"selector_type": selector_type, "selector_value": selector_value}
+            fallbacks = [original] + [f for f in step.get("fallback_selectors") or []
+                                      if (f.get("selector_type"), f.get("selector_value"))
+                                      != (target["selector_type"], target["selector_value"])]
+            compiled.append({**step, **target, "fallback_selectors": fallbacks, "compiled_from": original})
+        rewritten = sum(1 for r in report if r["rewritten_to"])
+        if rewritten:
+            self.rewrites += rewritten
+            logger.info(f"[COMPILE] {rewritten}/{len(report)} selector(es) reescritos a estrategias nativas")
+        return compiled, report
+
+    def stats(self) -> dict:
+        return {"cached_decisions": len(self._decisions), "rewrites": self.rewrites, "snapshots": self.snapshots}
+
+
+# Shared compiler used when flows are loaded
+selector_compiler = SelectorCompiler()
@@ -0,0 +1,360 @@
+"""
+SelectorLab — Offline selector evaluation over stored UI snapshots.
+Keeps page-source snapshots (from step failures, recordings or on demand) and
+evaluates any selector type against them locally in milliseconds: how many
+elements match, whether the match is unique, which elements they are and an
+estimate of what the lookup would cost live. XPath is evaluated with lxml when
+it is installed, otherwise with a built-in evaluator for the subset flows use
+(``/``, ``//``, tag or ``*`` tests, ``@Attr='v'``, ``!=``, ``contains()``,
+``starts-with()``, ``and``/``or`` and positions).
+"""
+import gzip
+import json
+import os
+import re
+import threading
+import time
+import uuid
+import logging
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from typing import Optional
+
+from services.selector_scoring import ESTIMATED_COST_MS
+from services.ui_snapshot import UISnapshot
+
+logger = logging.getLogger("selector_lab")
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "snapshots")
+
+# Live-cost model: XPath is resolved by walking the tree server-side, and a
+# miss waits out AppiumService._find_element's 5s wait before failing
+XPATH_SCAN_MS_PER_NODE = 0.3
+MISS_WAIT_MS = 5000
+MAX_ELEMENTS = 10
+
+# Selector type -> page-source attribute for the attribute strategies
+ATTRIBUTE_SELECTORS = {
+    "name": "Name",
+    "accessibility_id": "AutomationId",
+    "id": "RuntimeId",
+    "class_name": "ClassName",
+}
+
+
+class UnsupportedSelector(ValueError):
+    pass
+
+
+# ── XPath subset ────────────────────────────────────────
+
+def _split_top(text: str, separator: str) -> list[str]:
+    """Split on ``separator`` outside quotes, brackets and parentheses."""
+    parts, depth, quote, start, i = [], 0, None, 0, 0
+    while i < len(text):
+        ch = text[i]
+        if quote:
+            if ch == quote:
+                quote = None
+        elif depth == 0 and text.startswith(separator, i):
+            parts.append(text[start:i])
+            i += len(separator)
+            start = i
+            continue
+        elif ch in "'\"":
+            quote = ch
+        elif ch in "[(":
+            depth += 1
+        elif ch in "])":
+            depth -= 1
+        i += 1
+    parts.append(text[start:])
+    return parts
+
+
+def _literal(text: str) -> str:
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in "'\"":
+        return text[1:-1]
+    if text.startswith("concat(") and text.endswith(")"):
+        return "".join(_literal(p) for p in _split_top(text[7:-1], ","))
+    raise UnsupportedSelector(f"Literal XPath no soportado: {text}")
+
+
+_ATTR_CMP = re.compile(r"^@([\w.\-]+)\s*(!=|=)\s*(.+)$", re.S)
+_ATTR_FN = re.compile(r"^(contains|starts-with)\(\s*@([\w.\-]+)\s*,\s*(.+)\)$", re.S)
+_ATTR_EXISTS = re.compile(r"^@([\w.\-]+)$")
+
+
+def _predicate(text: str):
+    """Compile one ``[...]`` body into ``test(element) -> bool`` or a 1-based position (int, -1 = last)."""
+    text = text.strip()
+    if text.isdigit():
+        return int(text)
+    if text == "last()":
+        return -1
+    alternatives = []
+    for alternative in _split_top(text, " or "):
+        terms = []
+        for term in _split_top(alternative, " and "):
+            term = term.strip()
+            if term.startswith("(") and term.endswith(")"):
+                terms.append(_predicate(term[1:-1]))
+                continue
+            m = _ATTR_CMP.match(term)
+            if m:
+                attr, op, value = m.group(1), m.group(2), _literal(m.group(3))
+                terms.append((lambda el, a=attr, v=value: el.get(a) == v) if op == "="
+                             else (lambda el, a=attr, v=value: el.get(a) != v))
+                continue
+            m = _ATTR_FN.match(term)
+            if m:
+                fn, attr, value = m.group(1), m.group(2), _literal(m.group(3))
+                terms.append((lambda el, a=attr, v=value: v in (el.get(a) or "")) if fn == "contains"
+                             else (lambda el, a=attr, v=value: (el.get(a) or "").startswith(v)))
+                continue
+            m = _ATTR_EXISTS.match(term)
+            if m:
+                terms.append(lambda el, a=m.group(1): a in el.attrib)
+                continue
+            raise UnsupportedSelector(f"Predicado XPath no soportado: {term}")
+        alternatives.append(terms)
+    return lambda el: any(all(t(el) for t in terms) for terms in alternatives)
+
+
+def _compile_xpath(xpath: str) -> list[tuple]:
+    """``[(axis, tag, predicates)]`` with axis ``"child"`` or ``"descendant"``."""
+    path = xpath.strip()
+    if path.startswith("."):
+        path = path[1:]
+    if not path.startswith("/"):
+        path = "//" + path
+    steps = []
+    for i, chunk in enumerate(_split_top(path, "/")):
+        if i == 0:
+            continue  # text before the leading "/"
+        steps.append(chunk)
+    compiled, descendant = [], False
+    for chunk in steps:
+        if chunk == "":
+            descendant = True
+            continue
+        m = re.match(r"^([\w*.\-]+)(.*)$", chunk, re.S)
+        if not m:
+            raise UnsupportedSelector(f"Paso XPath no soportado: {chunk}")
+        tag, rest = m.group(1), m.group(2).strip()
+        predicates = []
+        while rest:
+            if not rest.startswith("["):
+                raise UnsupportedSelector(f"Paso XPath no soportado: {chunk}")
+            body = _split_top(rest[1:], "]")[0]
+            predicates.append(_predicate(body))
+            rest = rest[len(body) + 2:].strip()
+        compiled.append(("descendant" if descendant else "child", tag, predicates))
+        descendant = False
+    if not compiled:
+        raise UnsupportedSelector(f"XPath vacío: {xpath}")
+    return compiled
+
+
+def _xpath_select(root: ET.Element, xpath: str) -> list[ET.Element]:
+    order = {id(el): i for i, el in enumerate(root.iter())}
+    document = ET.Element("#document")
+    document.append(root)
+    try:
+        contexts = [document]
+        for axis, tag, predicates in _compile_xpath(xpath):
+            selected, seen = [], set()
+            for ctx in contexts:
+                parents = ctx.iter() if axis == "descendant" else [ctx]
+                for parent in parents:
+                    candidates = [c for c in parent if tag == "*" or c.tag == tag]
+                    for predicate in predicates:
+                        if predicate == -1:
+                            candidates = candidates[-1:]
+                        elif isinstance(predicate, int):
+                            candidates = candidates[predicate - 1:predicate]
+                        else:
+                            candidates = [c for c in candidates if predicate(c)]
+                    for c in candidates:
+                        if id(c) not in seen:
+                            seen.add(id(c))
+                            selected.append(c)
+            # Results in document order, like XPath node-sets
+            contexts = sorted(selected, key=lambda el: order.get(id(el), -1))
+        return contexts
+    finally:
+        document.remove(root)
+
+
+# ── Evaluation ──────────────────────────────────────────
+
+class _Parsed:
+    """A snapshot plus its element tree, with element → node index mapping."""
+
+    def __init__(self, xml: str):
+        self.xml = xml
+        self.snapshot = UISnapshot.from_page_source(xml)
+        self.root = ET.fromstring(xml)
+        # Same pre-order walk as UISnapshot.from_page_source
+        self.index = {id(el): i for i, el in enumerate(self.root.iter())}
+
+
+def estimate_cost_ms(selector_type: str, selector_value: str, node_count: int, matches: int) -> float:
+    base = ESTIMATED_COST_MS.get("accessibility_id" if selector_type == "id" else selector_type, 400)
+    if selector_type == "xpath":
+        base += XPATH_SCAN_MS_PER_NODE * node_count
+    return round(base + (MISS_WAIT_MS if matches == 0 else 0), 1)
+
+
+def _match_indexes(parsed: _Parsed, selector_type: str, selector_value: str) -> list[int]:
+    """Node indexes (document order) the selector matches; raises on unsupported or invalid selectors."""
+    if selector_type == "xpath":
+        try:
+            from lxml import etree  # optional: full XPath 1.0
+        except ImportError:
+            return [parsed.index[id(el)] for el in _xpath_select(parsed.root, selector_value)]
+        tree = etree.fromstring(parsed.xml.encode("utf-8"))
+        order = {el: i for i, el in enumerate(tree.iter())}
+        return [order[el] for el in tree.xpath(selector_value) if el in order]
+    if selector_type in ATTRIBUTE_SELECTORS:
+        attr = ATTRIBUTE_SELECTORS[selector_type]
+        return [i for i, el in enumerate(parsed.root.iter()) if el.get(attr) == selector_value]
+    raise UnsupportedSelector(f"El driver de Windows no resuelve selectores '{selector_type}'")
+
+
+def _evaluate(parsed: _Parsed, selector_type: str, selector_value: str) -> dict:
+    started = time.perf_counter()
+    result = {"selector_type": selector_type, "selector_value": selector_value}
+    nodes = parsed.snapshot.nodes
+    try:
+        indexes = _match_indexes(parsed, selector_type, selector_value)
+    except (UnsupportedSelector, SyntaxError) as e:
+        return {**result, "error": str(e), "matches": None, "unique": False,
+                "eval_ms": round((time.perf_counter() - started) * 1000, 2)}
+    except Exception as e:  # lxml XPath syntax errors and the like
+        return {**result, "error": f"XPath inválido: {e}", "matches": None, "unique": False,
+                "eval_ms": round((time.perf_counter() - started) * 1000, 2)}
+    matched = [nodes[i] for i in indexes]
+    return {
+        **result,
+        "matches": len(matched),
+        "unique": len(matched) == 1,
+        "visible_matches": sum(1 for n in matched if n.visible),
+        "elements": [n.to_dict() for n in matched[:MAX_ELEMENTS]],
+        "estimated_live_ms": estimate_cost_ms(selector_type, selector_value, len(nodes), len(matched)),
+        "eval_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def evaluate_selector(page_source: str, selector_type: str, selector_value: str) -> dict:
+    """Evaluate one selector against a page source (WinAppDriver XML)."""
+    return _evaluate(_Parsed(page_source), selector_type, selector_value)
+
+
+# ── Snapshot store ──────────────────────────────────────
+
+class SelectorLab:
+    """Bounded on-disk store of page-source snapshots plus an in-memory cache of parsed ones."""
+
+    def __init__(self, root: str = DEFAULT_ROOT, keep: int = 100, parsed_cache: int = 8):
+        self.root = root
+        self.keep = keep
+        self._parsed: OrderedDict = OrderedDict()
+        self._parsed_cache = parsed_cache
+        self._lock = threading.Lock()
+
+    def _path(self, snapshot_id: str, ext: str) -> Optional[str]:
+        if not snapshot_id or not re.fullmatch(r"[\w-]+", snapshot_id):
+            return None
+        return os.path.join(self.root, f"{snapshot_id}.{ext}")
+
+    def add(self, page_source: str, source: str = "manual", label: str = None, **meta) -> dict:
+        """Store a snapshot; returns its metadata (with ``id``)."""
+        ET.fromstring(page_source)  # reject malformed XML up front
+        now = time.time()
+        snapshot_id = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}{int(now * 1000) % 1000:03d}-{uuid.uuid4().hex[:6]}"
+        info = {"id": snapshot_id, "source": source, "label": label, "at": now,
+                "nodes": sum(1 for _ in ET.fromstring(page_source).iter()), **meta}
+        os.makedirs(self.root, exist_ok=True)
+        with gzip.open(self._path(snapshot_id, "xml.gz"), "wb") as f:
+            f.write(page_source.encode("utf-8"))
+        with open(self._path(snapshot_id, "json"), "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False)
+        self._trim()
+        logger.info(f"[LAB] Snapshot {snapshot_id} guardado ({source}, {info['nodes']} nodos)")
+        return info
+
+    def _trim(self):
+        ids = sorted(n[:-5] for n in os.listdir(self.root) if n.endswith(".json"))
+        for old in ids[:max(0, len(ids) - self.keep)]:
+            for ext in ("json", "xml.gz"):
+                try:
+                    os.remove(self._path(old, ext))
+                except OSError:
+                    pass
+
+    def listing(self, source: str = None) -> list[dict]:
+        if not os.path.isdir(self.root):
+            return []
+        items = []
+        for name in sorted(os.listdir(self.root), reverse=True):
+            if name.endswith(".json"):
+                with open(os.path.join(self.root, name), "r", encoding="utf-8") as f:
+                    info = json.load(f)
+                if source is None or info.get("source") == source:
+                    items.append(info)
+        return items
+
+    def page_source(self, snapshot_id: str) -> str:
+        path = self._path(snapshot_id, "xml.gz")
+        if not path or not os.path.exists(path):
+            raise KeyError(f"Snapshot '{snapshot_id}' no encontrado")
+        with gzip.open(path, "rb") as f:
+            return f.read().decode("utf-8")
+
+    def _get_parsed(self, snapshot_id: str) -> _Parsed:
+        with self._lock:
+            parsed = self._parsed.get(snapshot_id)
+            if parsed is not None:
+                self._parsed.move_to_end(snapshot_id)
+                return parsed
+        parsed = _Parsed(self.page_source(snapshot_id))
+        with self._lock:
+            self._parsed[snapshot_id] = parsed
+            while len(self._parsed) > self._parsed_cache:
+                self._parsed.popitem(last=False)
+        return parsed
+
+    def recent_ids(self, count: int) -> list[str]:
+        return [info["id"] for info in self.listing()[:count]]
+
+    def matches(self, snapshot_id: str, selector_type: str, selector_value: str) -> tuple:
+        """``(snapshot, node indexes)`` for one selector on one snapshot; raises ValueError if invalid."""
+        parsed = self._get_parsed(snapshot_id)
+        try:
+            return parsed.snapshot, _match_indexes(parsed, selector_type, selector_value)
+        except UnsupportedSelector:
+            raise
+        except Exception as e:
+            raise ValueError(f"XPath inválido: {e}") from e
+
+    def evaluate(self, selectors: list[dict], snapshot_ids: list[str] = None) -> list[dict]:
+        """Evaluate selectors (``{selector_type, selector_value}``) on snapshots (default: the latest)."""
+        if not snapshot_ids:
+            latest = self.listing()[:1]
+            if not latest:
+                raise KeyError("No hay snapshots guardados")
+            snapshot_ids = [latest[0]["id"]]
+        results = []
+        for snapshot_id in snapshot_ids:
+            parsed = self._get_parsed(snapshot_id)
+            for selector in selectors:
+                results.append({"snapshot_id": snapshot_id, **_evaluate(
+                    parsed, selector.get("selector_type") or "name", selector.get("selector_value") or "",
+                )})
+        return results
+
+
+# Shared lab for the API
+selector_lab = SelectorLab()
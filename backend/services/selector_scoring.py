@@ -0,0 +1,174 @@
+"""
+SelectorScoring — Candidate selector generation and ranking.
+Builds several selectors per element, checks each for uniqueness and lookup
+latency (live against the driver, or offline against a captured snapshot)
+and keeps the fastest unique one, with the other unique ones as ranked fallbacks.
+"""
+import time
+import logging
+from typing import Optional
+
+logger = logging.getLogger("selector_scoring")
+
+# Rough live cost per strategy, used when scoring offline (no driver to time)
+ESTIMATED_COST_MS = {
+    "accessibility_id": 40,
+    "name": 60,
+    "class_name": 80,
+    "xpath": 400,
+}
+
+# Same mapping AppiumService uses for selector types
+BY_MAP = {
+    "name": "name",
+    "xpath": "xpath",
+    "id": "id",
+    "accessibility_id": "accessibility id",
+    "css": "css selector",
+    "class_name": "class name",
+}
+
+
+def _xpath_literal(value: str) -> str:
+    """Quote a string for use inside an XPath expression."""
+    if "'" not in value:
+        return f"'{value}'"
+    if '"' not in value:
+        return f'"{value}"'
+    parts = value.split("'")
+    return "concat(" + ", \"'\", ".join(f"'{p}'" for p in parts) + ")"
+
+
+def normalize_element_info(element: dict) -> dict:
+    """Accept recorder (snake_case) or picker (camelCase) element dicts."""
+    return {
+        "name": element.get("name") or "",
+        "automation_id": element.get("automation_id") or element.get("automationId") or "",
+        "class_name": element.get("class_name") or element.get("className") or "",
+        "control_type": element.get("control_type") or element.get("controlType") or "",
+    }
+
+
+def generate_candidates(element: dict) -> list[dict]:
+    """Generate candidate selectors for an element.
+
+    Each candidate carries the attribute filter it represents (``attrs``) so it
+    can also be evaluated against a snapshot without a driver.
+    """
+    info = normalize_element_info(element)
+    aid, name, cls = info["automation_id"], info["name"], info["class_name"]
+    candidates = []
+
+    if aid:
+        candidates.append({"selector_type": "accessibility_id", "selector_value": aid,
+                           "attrs": {"automation_id": aid}})
+    if name:
+        candidates.append({"selector_type": "name", "selector_value": name,
+                           "attrs": {"name": name}})
+    if aid and name:
+        candidates.append({
+            "selector_type": "xpath",
+            "selector_value": f"//*[@AutomationId={_xpath_literal(aid)} and @Name={_xpath_literal(name)}]",
+            "attrs": {"automation_id": aid, "name": name},
+        })
+    if cls and name:
+        candidates.append({
+            "selector_type": "xpath",
+            "selector_value": f"//*[@ClassName={_xpath_literal(cls)} and @Name={_xpath_literal(name)}]",
+            "attrs": {"class_name": cls, "name": name},
+        })
+    if cls:
+        candidates.append({"selector_type": "class_name", "selector_value": cls,
+                           "attrs": {"class_name": cls}})
+    return candidates
+
+
+def _matches(element: dict, attrs: dict) -> bool:
+    info = normalize_element_info(element)
+    return all(info.get(key) == value for key, value in attrs.items())
+
+
+def score_candidates_live(driver, candidates: list[dict]) -> list[dict]:
+    """Time each candidate against the live driver and count its matches."""
+    scored = []
+    for candidate in candidates:
+        by = BY_MAP.get(candidate["selector_type"], "name")
+        started = time.perf_counter()
+        try:
+            count = len(driver.find_elements(by, candidate["selector_value"]))
+        except Exception as e:
+            logger.info(f"[SCORE] Candidato [{candidate['selector_type']}] {candidate['selector_value']} falló: {e}")
+            count = 0
+        latency_ms = (time.perf_counter() - started) * 1000
+        scored.append({**candidate, "matches": count, "unique": count == 1,
+                       "latency_ms": round(latency_ms, 1), "measured": True})
+    return scored
+
+
+def score_candidates_offline(elements: list[dict], candidates: list[dict]) -> list[dict]:
+    """Count candidate matches in a captured snapshot; latency is estimated per strategy."""
+    scored = []
+    for candidate in candidates:
+        count = sum(1 for el in elements if _matches(el, candidate.get("attrs", {})))
+        scored.append({**candidate, "matches": count, "unique": count == 1,
+                       "latency_ms": ESTIMATED_COST_MS.get(candidate["selector_type"], 400),
+                       "measured": False})
+    return scored
+
+
+def rank_candidates(scored: list[dict]) -> list[dict]:
+    """Unique candidates first, then ambiguous ones; fastest first within each group."""
+    found = [c for c in scored if c["matches"] > 0]
+    return sorted(found, key=lambda c: (not c["unique"], c["latency_ms"]))
+
+
+def fallback_entries(candidates: list[dict]) -> list[dict]:
+    """Fallback selectors to record: only unique candidates, an ambiguous one could hit the wrong element."""
+    return [
+        {"selector_type": c["selector_type"], "selector_value": c["selector_value"],
+         "latency_ms": c["latency_ms"], "unique": c["unique"]}
+        for c in candidates if c["unique"]
+    ]
+
+
+def apply_ranking(step: dict, ranked: list[dict]) -> dict:
+    """Store the best candidate as the step selector and keep the other unique ones as fallbacks."""
+    if not ranked:
+        return step
+    best, rest = ranked[0], ranked[1:]
+    updated = dict(step)
+    original = (step.get("selector_type"), step.get("selector_value"))
+    updated["selector_type"] = best["selector_type"]
+    updated["selector_value"] = best["selector_value"]
+    fallbacks = fallback_entries(rest)
+    if original[0] and original[1] and original != (best["selector_type"], best["selector_value"]) \
+            and not any((f["selector_type"], f["selector_value"]) == original for f in fallbacks):
+        fallbacks.append({"selector_type": original[0], "selector_value": original[1],
+                          "latency_ms": None, "unique": None})
+    updated["fallback_selectors"] = fallbacks
+    return updated
+
+
+def find_in_snapshot(elements: list[dict], selector_type: str, selector_value: str) -> Optional[dict]:
+    """Locate the snapshot element a simple (non-xpath) selector refers to."""
+    key = {"accessibility_id": "automation_id", "id": "automation_id",
+           "name": "name", "class_name": "class_name"}.get(selector_type)
+    if not key:
+        return None
+    for el in elements:
+        if normalize_element_info(el).get(key) == selector_value:
+            return el
+    return None
+
+
+def score_steps_offline(steps: list[dict], elements: list[dict]) -> list[dict]:
+    """Offline pass: re-rank the selectors of recorded steps against a snapshot."""
+    result = []
+    for step in steps:
+        element = find_in_snapshot(elements, step.get("selector_type"), step.get("selector_value"))
+        if element is None:
+            result.append(step)
+            continue
+        ranked = rank_candidates(score_candidates_offline(elements, generate_candidates(element)))
+        result.append(apply_ranking(step, ranked))
+    return result
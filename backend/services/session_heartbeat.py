@@ -0,0 +1,107 @@
+"""
+SessionHeartbeat — Background liveness probe for the Appium session.
+Probes the session on a configurable interval, backs off while a run is
+sending commands (successful commands already prove liveness) and publishes a
+cached status with a timestamp, so health endpoints become O(1) reads.
+"""
+import threading
+import time
+import logging
+from typing import Callable, Optional
+
+logger = logging.getLogger("session_heartbeat")
+
+
+class SessionHeartbeat:
+    def __init__(self, probe: Callable[[], bool], interval: float = 5.0):
+        self._probe = probe
+        self.interval = interval
+        self._alive = False
+        self._checked_at: Optional[float] = None
+        self._source = "none"
+        self._last_activity = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.probes = 0
+        self.skipped_probes = 0
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="session-heartbeat", daemon=True)
+        self._thread.start()
+        logger.info(f"[HEARTBEAT] Iniciado (intervalo {self.interval}s)")
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def set_interval(self, interval: float):
+        """Change the probe interval; takes effect immediately."""
+        if interval <= 0:
+            raise ValueError("El intervalo del heartbeat debe ser positivo")
+        self.interval = interval
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            # Back off while a run is proving liveness with real commands
+            if time.monotonic() - self._last_activity < self.interval:
+                self.skipped_probes += 1
+                continue
+            self.refresh()
+
+    def refresh(self) -> bool:
+        """Probe now (blocking) and update the cache."""
+        try:
+            alive = bool(self._probe())
+        except Exception as e:
+            logger.warning(f"[HEARTBEAT] Error en sondeo: {e}")
+            alive = False
+        self.probes += 1
+        self._publish(alive, "probe")
+        return alive
+
+    def note_activity(self):
+        """A driver command just succeeded: the session is alive."""
+        self._last_activity = time.monotonic()
+        self._publish(True, "activity")
+
+    def mark_dead(self):
+        self._publish(False, "disconnect")
+
+    def _publish(self, alive: bool, source: str):
+        with self._lock:
+            if self._alive != alive:
+                logger.info(f"[HEARTBEAT] Sesión {'activa' if alive else 'caída'} ({source})")
+            self._alive = alive
+            self._checked_at = time.time()
+            self._source = source
+
+    def is_fresh(self, max_age: float = None) -> bool:
+        """True if the cached status is younger than ``max_age`` (default 2x interval)."""
+        max_age = max_age if max_age is not None else 2 * self.interval
+        with self._lock:
+            return self._checked_at is not None and time.time() - self._checked_at <= max_age
+
+    @property
+    def alive(self) -> bool:
+        return self._alive
+
+    def status(self) -> dict:
+        with self._lock:
+            checked_at = self._checked_at
+            return {
+                "alive": self._alive,
+                "checked_at": checked_at,
+                "age_ms": round((time.time() - checked_at) * 1000) if checked_at else None,
+                "source": self._source,
+                "interval": self.interval,
+            }
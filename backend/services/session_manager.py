@@ -0,0 +1,164 @@
+"""
+SessionManager — Hot-standby Appium session and fast failover.
+Keeps a pre-created standby WebDriver session attached to the POS window (kept
+alive below newCommandTimeout) plus the last good reconnect parameters, so a
+dead active session can be replaced in milliseconds instead of rediscovering
+the window and building a new session inline.
+"""
+import threading
+import time
+import logging
+from collections import deque
+from typing import Optional
+
+logger = logging.getLogger("session_manager")
+
+
+class SessionManager:
+    # Keep the idle standby below Appium's newCommandTimeout (300s)
+    KEEPALIVE_INTERVAL = 120
+
+    def __init__(self, appium_service, keep_standby: bool = True):
+        self.appium_service = appium_service
+        self.keep_standby = keep_standby
+        self.standby_driver = None
+        self._appium_url: Optional[str] = None
+        self._handle: Optional[str] = None
+        self._lock = threading.Lock()
+        self._preparing = False
+        self._keepalive: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.failovers: deque = deque(maxlen=50)
+
+    # ── Lifecycle ───────────────────────────────────────
+
+    def on_connected(self, appium_url: str = None, handle: str = None):
+        """Remember the reconnect parameters of a good session and warm a standby."""
+        self._appium_url = appium_url or self.appium_service.appium_url
+        self._handle = handle or self.appium_service.handle
+        if self.keep_standby:
+            self.prepare_standby()
+            self._start_keepalive()
+
+    def prepare_standby(self):
+        """Create a standby session in the background (no-op if one exists or is being built)."""
+        with self._lock:
+            if self.standby_driver is not None or self._preparing or not (self._appium_url and self._handle):
+                return
+            self._preparing = True
+        threading.Thread(target=self._build_standby, name="standby-session", daemon=True).start()
+
+    def _build_standby(self):
+        started = time.perf_counter()
+        try:
+            driver = self.appium_service.create_session(self._appium_url, self._handle)
+            with self._lock:
+                self.standby_driver = driver
+            logger.info(f"[STANDBY] Sesión en espera lista ({(time.perf_counter() - started) * 1000:.0f}ms). "
+                        f"Sesión: {driver.session_id}")
+        except Exception as e:
+            logger.warning(f"[STANDBY] No se pudo crear la sesión en espera: {e}")
+        finally:
+            with self._lock:
+                self._preparing = False
+
+    def _start_keepalive(self):
+        if self._keepalive and self._keepalive.is_alive():
+            return
+        self._stop.clear()
+        self._keepalive = threading.Thread(target=self._keepalive_loop, name="standby-keepalive", daemon=True)
+        self._keepalive.start()
+
+    def _keepalive_loop(self):
+        while not self._stop.wait(self.KEEPALIVE_INTERVAL):
+            with self._lock:
+                driver = self.standby_driver
+            if driver is None:
+                self.prepare_standby()
+                continue
+            try:
+                driver.title
+            except Exception:
+                logger.info("[STANDBY] Sesión en espera expirada. Recreando...")
+                with self._lock:
+                    if self.standby_driver is driver:
+                        self.standby_driver = None
+                self.prepare_standby()
+
+    def shutdown(self):
+        """Stop the keepalive and close the standby session."""
+        self._stop.set()
+        with self._lock:
+            driver, self.standby_driver = self.standby_driver, None
+        if driver:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+    # ── Failover ────────────────────────────────────────
+
+    def failover(self) -> bool:
+        """Replace the dead active session. Returns False if no fast path is available.
+
+        Order: promote the standby session, else reconnect with the cached
+        handle/URL (skips window rediscovery). The caller falls back to a full
+        window search when this returns False.
+        """
+        started = time.perf_counter()
+        with self._lock:
+            standby, self.standby_driver = self.standby_driver, None
+
+        old_driver = self.appium_service.driver
+        mode = None
+        if standby is not None:
+            try:
+                standby.title  # one round trip: the standby may have expired
+                self.appium_service.driver = standby
+                self.appium_service.handle = self._handle
+                mode = "standby"
+            except Exception as e:
+                logger.warning(f"[FAILOVER] Sesión en espera no válida: {e}")
+                threading.Thread(target=self._quit_quietly, args=(standby,), daemon=True).start()
+        if mode is None and self._appium_url and self._handle:
+            try:
+                self.appium_service.driver = self.appium_service.create_session(self._appium_url, self._handle)
+                self.appium_service.handle = self._handle
+                mode = "cached_params"
+            except Exception as e:
+                logger.warning(f"[FAILOVER] Reconexión con parámetros en caché falló: {e}")
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if mode is None:
+            self.failovers.append({"at": time.time(), "mode": "unavailable", "ms": round(elapsed_ms, 1)})
+            return False
+
+        self.failovers.append({"at": time.time(), "mode": mode, "ms": round(elapsed_ms, 1)})
+        logger.info(f"[FAILOVER] Sesión reemplazada vía {mode} en {elapsed_ms:.1f}ms. "
+                    f"Sesión: {self.appium_service.driver.session_id}")
+
+        if old_driver is not None and old_driver is not self.appium_service.driver:
+            threading.Thread(target=self._quit_quietly, args=(old_driver,), daemon=True).start()
+        if self.keep_standby:
+            self.prepare_standby()
+        return True
+
+    @staticmethod
+    def _quit_quietly(driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def status(self) -> dict:
+        with self._lock:
+            standby = self.standby_driver
+            preparing = self._preparing
+        history = list(self.failovers)
+        return {
+            "standby_ready": standby is not None,
+            "standby_preparing": preparing,
+            "cached_handle": self._handle,
+            "failovers": history,
+            "last_failover_ms": history[-1]["ms"] if history else None,
+        }
@@ -0,0 +1,138 @@
+"""
+SpatialIndex — Point and rectangle queries over the element rectangles of a UI snapshot.
+Elements are bucketed into a uniform grid (POS screens are a few hundred
+rectangles, mostly small buttons inside a handful of large containers), so
+"which element is at (x, y)" only inspects the elements whose rectangles cover
+that cell. A point resolves to the deepest element containing it, then the
+smallest, then the one painted last; rectangle and neighbourhood queries
+return the smallest elements first. Built once per snapshot, read-only after.
+"""
+import math
+from typing import Optional
+
+from services.ui_snapshot import UISnapshot, UINode
+
+DEFAULT_CELL = 64
+# Rectangles spanning more than this many cells along both axes (window, panels) are
+# scanned linearly instead of being copied into every cell they cover
+LARGE_CELLS = 8
+
+
+def _area(node: UINode) -> int:
+    return node.width * node.height
+
+
+def _contains(node: UINode, x: float, y: float) -> bool:
+    return node.x <= x < node.x + node.width and node.y <= y < node.y + node.height
+
+
+def _contains_rect(outer: UINode, inner: UINode) -> bool:
+    return (outer.x <= inner.x and outer.y <= inner.y and
+            inner.x + inner.width <= outer.x + outer.width and inner.y + inner.height <= outer.y + outer.height)
+
+
+def _distance(a: UINode, b: UINode) -> float:
+    """Gap between two rectangles (0 when they touch or overlap)."""
+    dx = max(a.x - (b.x + b.width), b.x - (a.x + a.width), 0)
+    dy = max(a.y - (b.y + b.height), b.y - (a.y + a.height), 0)
+    return math.hypot(dx, dy)
+
+
+class SpatialIndex:
+    def __init__(self, nodes: list[UINode], cell: int = DEFAULT_CELL):
+        self.cell = cell
+        self.nodes = [n for n in nodes if n.width > 0 and n.height > 0]
+        self._grid: dict = {}
+        self._large: list[UINode] = []
+        # Occupied cell range (x0, y0, x1, y1): queries never walk cells outside it
+        self._extent: Optional[tuple] = None
+        for node in self.nodes:
+            x0, y0, x1, y1 = self._cells(node.x, node.y, node.width, node.height)
+            if x1 - x0 >= LARGE_CELLS and y1 - y0 >= LARGE_CELLS:
+                self._large.append(node)
+                continue
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    self._grid.setdefault((cx, cy), []).append(node)
+            if self._extent is None:
+                self._extent = (x0, y0, x1, y1)
+            else:
+                ex0, ey0, ex1, ey1 = self._extent
+                self._extent = (min(ex0, x0), min(ey0, y0), max(ex1, x1), max(ey1, y1))
+
+    @classmethod
+    def from_snapshot(cls, snapshot: UISnapshot, visible_only: bool = True, cell: int = DEFAULT_CELL) -> "SpatialIndex":
+        return cls([n for n in snapshot.nodes if n.visible or not visible_only], cell)
+
+    @classmethod
+    def from_elements(cls, elements: list[dict], cell: int = DEFAULT_CELL) -> "SpatialIndex":
+        """Index picker/capture element dicts (flat: every element has depth 0)."""
+        return cls(UISnapshot.from_elements(elements).nodes, cell)
+
+    def _cells(self, x: float, y: float, width: float, height: float) -> tuple:
+        """Grid cells covered by a rectangle: ``(x0, y0, x1, y1)``, inclusive."""
+        c = self.cell
+        # Last pixel covered (end-exclusive rectangle), at least the first one
+        last_x = max(math.ceil(x + width) - 1, math.floor(x))
+        last_y = max(math.ceil(y + height) - 1, math.floor(y))
+        return math.floor(x / c), math.floor(y / c), math.floor(last_x / c), math.floor(last_y / c)
+
+    def _candidates(self, x: float, y: float, width: float = 1, height: float = 1) -> list[UINode]:
+        seen, found = set(), []
+        if self._extent is None:
+            return found + self._large
+        x0, y0, x1, y1 = self._cells(x, y, width, height)
+        ex0, ey0, ex1, ey1 = self._extent
+        for cx in range(max(x0, ex0), min(x1, ex1) + 1):
+            for cy in range(max(y0, ey0), min(y1, ey1) + 1):
+                for node in self._grid.get((cx, cy), ()):
+                    if node.index not in seen:
+                        seen.add(node.index)
+                        found.append(node)
+        return found + self._large
+
+    # ── Queries ─────────────────────────────────────────
+
+    def all_at(self, x: float, y: float) -> list[UINode]:
+        """Every element containing the point, best match first."""
+        hits = [n for n in self._candidates(x, y) if _contains(n, x, y)]
+        # Deepest, then smallest, then the later one in document order (drawn on top)
+        return sorted(hits, key=lambda n: (-n.depth, _area(n), -n.index))
+
+    def at(self, x: float, y: float, identified: bool = False) -> Optional[UINode]:
+        """The element at a point; ``identified`` skips elements without a name or AutomationId."""
+        for node in self.all_at(x, y):
+            if not identified or node.name or node.automation_id:
+                return node
+        return None
+
+    def in_rect(self, x: float, y: float, width: float, height: float, contained: bool = False) -> list[UINode]:
+        """Elements overlapping the rectangle (or fully inside it with ``contained``), smallest first."""
+        right, bottom = x + width, y + height
+
+        def keep(n: UINode) -> bool:
+            if contained:
+                return n.x >= x and n.y >= y and n.x + n.width <= right and n.y + n.height <= bottom
+            return n.x < right and x < n.x + n.width and n.y < bottom and y < n.y + n.height
+
+        hits = [n for n in self._candidates(x, y, width, height) if keep(n)]
+        return sorted(hits, key=lambda n: (_area(n), -n.depth, n.index))
+
+    def near(self, node: UINode, radius: float = 50, limit: int = 10) -> list[tuple]:
+        """``(element, gap_px)`` for elements within ``radius`` of ``node``, closest first.
+
+        Containers of ``node`` and elements inside it are left out.
+        """
+        found = []
+        for other in self.in_rect(node.x - radius, node.y - radius, node.width + 2 * radius, node.height + 2 * radius):
+            if other.index == node.index or _contains_rect(other, node) or _contains_rect(node, other):
+                continue
+            gap = _distance(node, other)
+            if gap <= radius:
+                found.append((other, round(gap, 1)))
+        found.sort(key=lambda item: (item[1], _area(item[0])))
+        return found[:limit]
+
+    def stats(self) -> dict:
+        return {"elements": len(self.nodes), "cells": len(self._grid), "large": len(self._large), "cell_px": self.cell}
+
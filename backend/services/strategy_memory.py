@@ -0,0 +1,63 @@
+"""
+StrategyMemory — Learned ordering for multi-strategy actions.
+Records, per strategy, attempts, successes and latency, and remembers per
+(session, target) which strategy last succeeded so it can be tried first.
+Kept free of driver imports so the API can report it without loading selenium.
+"""
+import threading
+from collections import defaultdict
+
+
+class StrategyMemory:
+    """Remembers, per session and target, which strategy worked and how fast."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._preferred: dict = {}          # (session_id, target) -> strategy name
+        self._stats: dict = defaultdict(lambda: {"attempts": 0, "successes": 0, "total_ms": 0.0, "last_ms": None})
+
+    def order(self, session_id: str, target: str, strategies: list) -> list:
+        """Strategies with the last winner for this target first; the rest keep their order."""
+        with self._lock:
+            preferred = self._preferred.get((session_id, target))
+        if not preferred:
+            return list(strategies)
+        first = [s for s in strategies if s.__name__ == preferred]
+        return first + [s for s in strategies if s.__name__ != preferred]
+
+    def record(self, session_id: str, target: str, strategy: str, ok: bool, elapsed_ms: float):
+        with self._lock:
+            stats = self._stats[strategy]
+            stats["attempts"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["last_ms"] = round(elapsed_ms, 1)
+            if ok:
+                stats["successes"] += 1
+                self._preferred[(session_id, target)] = strategy
+
+    def forget_session(self, session_id: str):
+        with self._lock:
+            for key in [k for k in self._preferred if k[0] == session_id]:
+                del self._preferred[key]
+
+    def summary(self) -> dict:
+        with self._lock:
+            strategies = {
+                name: {
+                    "attempts": st["attempts"],
+                    "successes": st["successes"],
+                    "success_rate": round(st["successes"] / st["attempts"], 3) if st["attempts"] else None,
+                    "avg_ms": round(st["total_ms"] / st["attempts"], 1) if st["attempts"] else None,
+                    "last_ms": st["last_ms"],
+                }
+                for name, st in self._stats.items()
+            }
+            preferred = [
+                {"session_id": sid, "target": target, "strategy": name}
+                for (sid, target), name in self._preferred.items()
+            ]
+        return {"strategies": strategies, "preferred": preferred}
+
+
+# Shared by every ClickButtonService instance (one is created per click)
+strategy_memory = StrategyMemory()
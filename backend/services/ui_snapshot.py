@@ -0,0 +1,167 @@
+"""
+UISnapshot — One-round-trip view of the POS UI tree.
+Parses ``driver.page_source`` (WinAppDriver XML) into plain nodes so state
+checks can run locally against a single snapshot instead of issuing one
+``find_element`` per question, each of which costs a wait when it misses.
+"""
+import time
+import logging
+import xml.etree.ElementTree as ET
+from typing import Optional
+
+logger = logging.getLogger("ui_snapshot")
+
+# Attribute names under which WinAppDriver/Windows drivers expose a control's value
+VALUE_ATTRIBUTES = ("Value.Value", "Value", "LegacyIAccessible.Value")
+
+
+def _to_int(value, default: int = 0) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_bool(value, default: bool = False) -> bool:
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() == "true"
+
+
+class UINode:
+    """One element of the UI tree."""
+
+    def __init__(self, control_type: str = "", name: str = "", automation_id: str = "", class_name: str = "",
+                 enabled: bool = True, offscreen: bool = False, x: int = 0, y: int = 0,
+                 width: int = 0, height: int = 0, value: Optional[str] = None, depth: int = 0,
+                 parent: Optional[int] = None, index: int = 0):
+        self.control_type = control_type
+        self.name = name
+        self.automation_id = automation_id
+        self.class_name = class_name
+        self.enabled = enabled
+        self.offscreen = offscreen
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.value = value
+        self.depth = depth
+        self.parent = parent
+        self.index = index
+
+    @property
+    def visible(self) -> bool:
+        return not self.offscreen
+
+    def to_dict(self) -> dict:
+        """Picker-compatible element dict."""
+        return {
+            "name": self.name,
+            "automationId": self.automation_id,
+            "className": self.class_name,
+            "controlType": self.control_type,
+            "text": self.value or "",
+            "enabled": self.enabled,
+            "x": self.x,
+            "y": self.y,
+            "width": self.width,
+            "height": self.height,
+        }
+
+
+class UISnapshot:
+    def __init__(self, nodes: list[UINode], captured_at: float = None, capture_ms: float = None,
+                 source: Optional[str] = None):
+        self.nodes = nodes
+        self.captured_at = captured_at if captured_at is not None else time.time()
+        self.capture_ms = capture_ms
+        self.source = source
+
+    # ── Construction ────────────────────────────────────
+
+    @classmethod
+    def from_page_source(cls, xml: str, capture_ms: float = None) -> "UISnapshot":
+        root = ET.fromstring(xml)
+        nodes: list[UINode] = []
+
+        def walk(el, depth: int, parent: Optional[int]):
+            attrs = el.attrib
+            value = next((attrs[a] for a in VALUE_ATTRIBUTES if a in attrs), None)
+            node = UINode(
+                control_type=attrs.get("LocalizedControlType") or el.tag,
+                name=attrs.get("Name", ""),
+                automation_id=attrs.get("AutomationId", ""),
+                class_name=attrs.get("ClassName", ""),
+                enabled=_to_bool(attrs.get("IsEnabled"), True),
+                offscreen=_to_bool(attrs.get("IsOffscreen"), False),
+                x=_to_int(attrs.get("x")), y=_to_int(attrs.get("y")),
+                width=_to_int(attrs.get("width")), height=_to_int(attrs.get("height")),
+                value=value, depth=depth, parent=parent, index=len(nodes),
+            )
+            nodes.append(node)
+            for child in el:
+                walk(child, depth + 1, node.index)
+
+        walk(root, 0, None)
+        return cls(nodes, capture_ms=capture_ms, source=xml)
+
+    @classmethod
+    def from_elements(cls, elements: list[dict]) -> "UISnapshot":
+        """Build a flat snapshot from picker/capture element dicts (camelCase or snake_case)."""
+        nodes = []
+        for i, el in enumerate(elements):
+            nodes.append(UINode(
+                control_type=el.get("controlType") or el.get("control_type") or "",
+                name=el.get("name") or "",
+                automation_id=el.get("automationId") or el.get("automation_id") or "",
+                class_name=el.get("className") or el.get("class_name") or "",
+                enabled=_to_bool(el.get("enabled"), True),
+                offscreen=not _to_bool(el.get("displayed", el.get("visible")), True),
+                x=_to_int(el.get("x")), y=_to_int(el.get("y")),
+                width=_to_int(el.get("width")), height=_to_int(el.get("height")),
+                value=el.get("text") or None, index=i,
+            ))
+        return cls(nodes)
+
+    @classmethod
+    def capture(cls, driver) -> "UISnapshot":
+        """Read the whole UI tree in one driver round trip."""
+        started = time.perf_counter()
+        xml = driver.page_source
+        capture_ms = (time.perf_counter() - started) * 1000
+        snapshot = cls.from_page_source(xml, capture_ms=capture_ms)
+        logger.debug(f"[SNAPSHOT] {len(snapshot.nodes)} nodos en {capture_ms:.0f}ms")
+        return snapshot
+
+    # ── Queries ─────────────────────────────────────────
+
+    def find(self, name: str = None, automation_id: str = None, name_contains: str = None,
+             control_type: str = None, visible_only: bool = True) -> list[UINode]:
+        matches = []
+        for node in self.nodes:
+            if visible_only and not node.visible:
+                continue
+            if name is not None and node.name != name:
+                continue
+            if automation_id is not None and node.automation_id != automation_id:
+                continue
+            if name_contains is not None and name_contains not in node.name:
+                continue
+            if control_type is not None and node.control_type.lower() != control_type.lower():
+                continue
+            matches.append(node)
+        return matches
+
+    def first(self, **criteria) -> Optional[UINode]:
+        matches = self.find(**criteria)
+        return matches[0] if matches else None
+
+    def has(self, **criteria) -> bool:
+        return self.first(**criteria) is not None
+
+    @property
+    def age_ms(self) -> float:
+        return (time.time() - self.captured_at) * 1000
@@ -0,0 +1,228 @@
+"""
+WindowLocator — Shared, cached discovery of the POS window.
+One component for every "find the SimiPOS window" lookup: caches the handle,
+revalidates it cheaply instead of enumerating all windows, waits for readiness
+or for a window change against a deadline, and can be backed by a fake window
+source for tests.
+"""
+import time
+import logging
+import threading
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger("window_locator")
+
+POS_WINDOW_TITLE = "SimiPOS"
+
+
+class WindowInfo:
+    """Plain snapshot of one top-level window."""
+
+    def __init__(self, handle: int, title: str, visible: bool = True, minimized: bool = False,
+                 left: int = 0, top: int = 0, width: int = 0, height: int = 0):
+        self.handle = handle
+        self.title = title
+        self.visible = visible
+        self.minimized = minimized
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+
+    @property
+    def hex_handle(self) -> str:
+        return hex(self.handle)
+
+    @property
+    def rect(self) -> tuple:
+        return (self.left, self.top, self.width, self.height)
+
+    @property
+    def ready(self) -> bool:
+        return self.visible and not self.minimized and self.width > 0 and self.height > 0
+
+
+class PygetwindowSource:
+    """Window source backed by pygetwindow (imported lazily, Windows only)."""
+
+    def __init__(self):
+        self._gw = None
+
+    def _module(self):
+        if self._gw is None:
+            import pygetwindow
+            self._gw = pygetwindow
+        return self._gw
+
+    def list_windows(self, title: str) -> list[WindowInfo]:
+        windows = []
+        for win in self._module().getWindowsWithTitle(title):
+            try:
+                windows.append(WindowInfo(
+                    handle=win._hWnd, title=win.title, visible=bool(win.visible),
+                    minimized=bool(win.isMinimized), left=win.left, top=win.top,
+                    width=win.width, height=win.height,
+                ))
+            except Exception:
+                continue
+        return windows
+
+    def get_window(self, handle: int) -> Optional[WindowInfo]:
+        """Re-read one window by handle without enumerating all windows."""
+        try:
+            import ctypes
+            user32 = ctypes.windll.user32
+            if not user32.IsWindow(handle):
+                return None
+            win = self._module().Win32Window(handle)
+            return WindowInfo(
+                handle=handle, title=win.title, visible=bool(win.visible),
+                minimized=bool(win.isMinimized), left=win.left, top=win.top,
+                width=win.width, height=win.height,
+            )
+        except Exception:
+            return None
+
+
+class FakeWindowSource:
+    """In-memory window source for tests and non-Windows environments."""
+
+    def __init__(self, windows: Iterable[WindowInfo] = ()):
+        self._windows = {w.handle: w for w in windows}
+        self._lock = threading.Lock()
+        self.enumerations = 0
+
+    def set_windows(self, windows: Iterable[WindowInfo]):
+        with self._lock:
+            self._windows = {w.handle: w for w in windows}
+
+    def add(self, window: WindowInfo):
+        with self._lock:
+            self._windows[window.handle] = window
+
+    def remove(self, handle: int):
+        with self._lock:
+            self._windows.pop(handle, None)
+
+    def list_windows(self, title: str) -> list[WindowInfo]:
+        with self._lock:
+            self.enumerations += 1
+            return [w for w in self._windows.values() if title.lower() in w.title.lower()]
+
+    def get_window(self, handle: int) -> Optional[WindowInfo]:
+        with self._lock:
+            return self._windows.get(handle)
+
+
+class WindowLocator:
+    # Polling backoff for waits
+    POLL_INITIAL = 0.05
+    POLL_MAX = 0.5
+    POLL_FACTOR = 1.5
+
+    def __init__(self, source=None, title: str = POS_WINDOW_TITLE):
+        self.source = source or PygetwindowSource()
+        self.title = title
+        self._cached: Optional[WindowInfo] = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._cached = None
+
+    def windows(self) -> list[WindowInfo]:
+        """All titled windows matching the title (one enumeration)."""
+        return [w for w in self.source.list_windows(self.title) if w.title]
+
+    def handles(self) -> set:
+        return {w.handle for w in self.windows()}
+
+    def find(self, refresh: bool = False) -> Optional[WindowInfo]:
+        """The POS window. Revalidates the cached handle before enumerating again."""
+        with self._lock:
+            cached = self._cached
+        if cached is not None and not refresh:
+            current = self.source.get_window(cached.handle)
+            if current is not None and self.title.lower() in (current.title or "").lower():
+                with self._lock:
+                    self._cached = current
+                return current
+
+        windows = self.windows()
+        found = windows[0] if windows else None
+        with self._lock:
+            self._cached = found
+        if found:
+            logger.info(f"[WINDOW] Ventana '{found.title}' encontrada (handle: {found.hex_handle})")
+        return found
+
+    def _poll(self, check: Callable[[], Optional[object]], timeout: float):
+        """Call ``check`` with exponential backoff until it returns a value or the deadline passes."""
+        deadline = time.monotonic() + timeout
+        delay = self.POLL_INITIAL
+        while True:
+            result = check()
+            if result:
+                return result
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(delay, remaining))
+            delay = min(delay * self.POLL_FACTOR, self.POLL_MAX)
+
+    def wait_for_window(self, timeout: float = 30) -> Optional[WindowInfo]:
+        """Wait until the POS window exists, is visible and its rect is stable across two polls."""
+        last_rect = [None]
+
+        def check():
+            win = self.find()
+            if win is None:
+                last_rect[0] = None
+                return None
+            if win.ready and win.rect == last_rect[0]:
+                return win
+            last_rect[0] = win.rect
+            return None
+
+        return self._poll(check, timeout)
+
+    def wait_for_window_change(self, previous, timeout: float = 5) -> bool:
+        """Wait until the set of POS windows differs from ``previous``.
+
+        ``previous`` may be a list of WindowInfo, pygetwindow windows or raw
+        handles. Returns True on change, False when the deadline passes.
+        """
+        before = {_handle_of(w) for w in previous}
+
+        def check():
+            return self.handles() != before
+
+        changed = bool(self._poll(check, timeout))
+        if changed:
+            self.invalidate()
+            logger.info("[WINDOW] Cambio de ventana detectado")
+        else:
+            logger.info(f"[WINDOW] Sin cambio de ventana tras {timeout}s. Continuando...")
+        return changed
+
+
+def _handle_of(window) -> int:
+    if isinstance(window, int):
+        return window
+    if isinstance(window, WindowInfo):
+        return window.handle
+    return getattr(window, "_hWnd", window)
+
+
+# Shared locator for modules that are not handed one explicitly
+default_locator = WindowLocator()
+
+
+def get_current_windows() -> list[WindowInfo]:
+    """Current list of POS windows (shared locator)."""
+    return default_locator.windows()
+
+
+def wait_for_window_change(previous_windows, timeout: float = 5) -> bool:
+    """Module-level helper used by the payment and continue-sale scripts."""
+    return default_locator.wait_for_window_change(previous_windows, timeout=timeout)
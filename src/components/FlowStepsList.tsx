@@ -3,7 +3,7 @@ import { useConfigStore } from "@/lib/config-store";
 import { ACTION_LABELS, SELECTOR_LABELS } from "@/lib/automation-types";
 import {
   MousePointer2, Type, Keyboard, Clock, Trash2, GripVertical, Pencil, Check, X,
-  MousePointerClick, ListChecks, ArrowDownUp, Eraser, CircleDot, CheckCircle2, Search, Play,
+  MousePointerClick, ListChecks, ArrowDownUp, Eraser, CircleDot, CheckCircle2, Search, Play, Receipt,
 } from "lucide-react";
 import { Switch } from "@/components/ui/switch";
 import { Input } from "@/components/ui/input";
@@ -26,6 +26,7 @@ const actionIcons: Record<ActionType, React.ReactNode> = {
   scroll: <ArrowDownUp className="h-3.5 w-3.5" />,
   assert: <CheckCircle2 className="h-3.5 w-3.5" />,
   search_product: <Search className="h-3.5 w-3.5" />,
+  complete_sale: <Receipt className="h-3.5 w-3.5" />,
 };
 
 export function FlowStepsList() {
@@ -8,9 +8,18 @@ import {
   connectWebSocket,
   type WsMessage,
 } from "@/lib/api-client";
-import type { ActionType, SelectorType } from "@/lib/automation-types";
+import type { ActionType, FallbackSelector, SelectorType } from "@/lib/automation-types";
 import { generateId } from "@/lib/automation-types";
 
+/** Backend fallback selectors ({selector_type, selector_value}) in store form */
+function toFallbackSelectors(raw: unknown): FallbackSelector[] | undefined {
+  if (!Array.isArray(raw) || raw.length === 0) return undefined;
+  return raw.map((f: Record<string, unknown>) => ({
+    selectorType: f.selector_type as SelectorType,
+    selectorValue: f.selector_value as string,
+  }));
+}
+
 export function RecordButton() {
   const {
     isRecording,
@@ -61,6 +70,8 @@ export function RecordButton() {
               enabled: true,
               value: stepData.value as string | undefined,
               waitTime: stepData.wait_time as number | undefined,
+              timestampMs: stepData.timestamp_ms as number | undefined,
+              fallbackSelectors: toFallbackSelectors(stepData.fallback_selectors),
               elementSelector: selectorType && selectorValue
                 ? {
                     id: generateId(),
@@ -118,6 +129,8 @@ export function RecordButton() {
               enabled: true,
               value: stepData.value as string | undefined,
               waitTime: stepData.wait_time as number | undefined,
+              timestampMs: stepData.timestamp_ms as number | undefined,
+              fallbackSelectors: toFallbackSelectors(stepData.fallback_selectors),
               elementSelector: selectorType && selectorValue
                 ? {
                     id: generateId(),
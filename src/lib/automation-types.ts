@@ -1,4 +1,4 @@
-export type ActionType = "click" | "double_click" | "type" | "send_keys" | "wait" | "clear" | "select_combo" | "select_radio" | "scroll" | "assert" | "search_product";
+export type ActionType = "click" | "double_click" | "type" | "send_keys" | "wait" | "clear" | "select_combo" | "select_radio" | "scroll" | "assert" | "search_product" | "complete_sale";
 export type SelectorType = "name" | "xpath" | "id" | "accessibility_id" | "css" | "class_name";
 export type LogLevel = "info" | "success" | "warning" | "error";
 
@@ -10,13 +10,21 @@ export interface ElementSelector {
   description?: string;
 }
 
+export interface FallbackSelector {
+  selectorType: SelectorType;
+  selectorValue: string;
+}
+
 export interface FlowStep {
   id: string;
   order: number;
   actionType: ActionType;
   elementSelector?: ElementSelector;
+  fallbackSelectors?: FallbackSelector[];
   value?: string;
   waitTime?: number;
+  /** Offset from the start of the recording, used by timed replay */
+  timestampMs?: number;
   description: string;
   enabled: boolean;
 }
@@ -26,6 +34,8 @@ export interface AutomationFlow {
   name: string;
   description: string;
   steps: FlowStep[];
+  /** Replays recorded steps at their recorded times (1 = real time) */
+  replaySpeed?: number;
   createdAt: string;
   updatedAt: string;
 }
@@ -52,6 +62,7 @@ export const ACTION_LABELS: Record<ActionType, string> = {
   scroll: "Scroll",
   assert: "Verificar Elemento",
   search_product: "Buscar Productos (lista)",
+  complete_sale: "Completar Venta (cobro)",
 };
 
 export const SELECTOR_LABELS: Record<SelectorType, string> = {
@@ -89,8 +89,14 @@ export function useFlowRunner() {
           value: s.value,
           wait_time: s.waitTime,
           enabled: s.enabled,
+          timestamp_ms: s.timestampMs,
+          fallback_selectors: s.fallbackSelectors?.map((f) => ({
+            selector_type: f.selectorType,
+            selector_value: f.selectorValue,
+          })),
         })),
         iterations: config.iterations,
+        replay_speed: activeFlow.replaySpeed,
         start_from_step: startFrom,
         config: {
           app_path: config.appPath,